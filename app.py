@@ -1,16 +1,24 @@
 import os
 import anthropic
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, g, session
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, g, session, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf.csrf import CSRFProtect
 from sqlalchemy import func
-from models import db, Product, Tag, Collection, EnvVar, product_tags, Store
+from models import db, Product, Tag, Collection, EnvVar, product_tags, Store, ExportJob, Job
 from forms import ProductForm, EnvVarForm, CollectionForm, TagForm, AutoTagForm, CreateCollectionsForm, StoreForm, StoreSelectForm
 from claude_integration import ClaudeTaggingService
+from claude_telemetry import claude_call_context
 from shopify_integration import ShopifyIntegration
 from store_management import get_current_store, set_current_store, filter_query_by_store, get_all_stores
 from config import Config
 from auto_migrate import run_migrations
+from shopify_webhooks import SUPPORTED_TOPICS, WebhookProcessor, verify_webhook, enqueue_webhook
+from sync_outbox import pending_entries, mark_pushed
+from collection_export import export_collection
+from jobs import JobRunner, job_event_stream
+from claude_batches import ClaudeBatchPoller
+import tasks  # Registers the background job tasks
+from store_management import normalize_url
 import json
 
 def create_app():
@@ -26,8 +34,11 @@ def create_app():
     os.makedirs(app.instance_path, exist_ok=True)
     
     # Initialize services
-    claude_service = ClaudeTaggingService()
+    claude_service = ClaudeTaggingService(instance_path=app.instance_path)
     shopify_service = ShopifyIntegration()
+    webhook_processor = WebhookProcessor(app)
+    job_runner = JobRunner(app, claude=claude_service, shopify=shopify_service)
+    batch_poller = ClaudeBatchPoller(app, claude_service, job_runner)
     
     # Make Config, current_store, and get_all_stores available to all templates
     @app.context_processor
@@ -120,6 +131,15 @@ def create_app():
             elif env_var.key == 'DATABASE_URI':
                 Config.SQLALCHEMY_DATABASE_URI = env_var.value
     
+    # Apply queued Shopify webhook events in the background
+    webhook_processor.start()
+    
+    # Run long operations (auto-tagging, imports, bulk exports) on background workers
+    job_runner.start()
+    
+    # Run jobs waiting on a Claude batch again once the batch has ended
+    batch_poller.start()
+    
     @app.route('/')
     def index():
         """Home page."""
@@ -158,8 +178,12 @@ def create_app():
         auto_tag_form = AutoTagForm()
         create_collections_form = CreateCollectionsForm()
         
+        # Number of local changes waiting to be pushed to Shopify
+        pending_changes = pending_entries(g.current_store).count()
+        
         return render_template('products.html', products=products, pagination=pagination,
-                              auto_tag_form=auto_tag_form, create_collections_form=create_collections_form)
+                              auto_tag_form=auto_tag_form, create_collections_form=create_collections_form,
+                              pending_changes=pending_changes)
     
     @app.route('/products/add', methods=['GET', 'POST'])
     def add_product():
@@ -181,7 +205,8 @@ def create_app():
             
             # Auto-tag the product if Claude API key is available
             if Config.ANTHROPIC_API_KEY:
-                tags = claude_service.generate_tags(product)
+                with claude_call_context(store_id=product.store_id):
+                    tags = claude_service.generate_tags(product)
                 for tag_name in tags:
                     # Check if tag exists for this store, create if not
                     tag_query = Tag.query.filter_by(name=tag_name)
@@ -270,8 +295,9 @@ def create_app():
         return redirect(url_for('manage_product_tags', id=product_id))
     
     @app.route('/products/auto-tag', methods=['POST'])
-    async def auto_tag_products():
-        """Auto-tag selected products using Claude asynchronously."""
+    def auto_tag_products():
+        """Queue a job that auto-tags the selected products using Claude."""
+        form = AutoTagForm()
         product_ids = request.form.getlist('product_ids')
         
         if not product_ids:
@@ -282,92 +308,13 @@ def create_app():
             flash('Claude API key not set. Please set it in environment variables.', 'danger')
             return redirect(url_for('env_vars'))
         
-        # Get all products to tag (filtered by store)
-        products_query = Product.query.filter(Product.id.in_(product_ids))
-        if g.current_store:
-            products_query = products_query.filter_by(store_id=g.current_store.id)
-        
-        products = products_query.all()
-        
-        if not products:
-            flash('No valid products found for auto-tagging', 'warning')
-            return redirect(url_for('products'))
-        
-        flash(f'Started auto-tagging {len(products)} products. This may take a while for large batches...', 'info')
-        
-        # Process products in batches asynchronously
-        results = await claude_service.batch_generate_tags(products, batch_size=50)
-        
-        tagged_count = 0
-        total_tags_added = 0
-        
-        for product, tags in results:
-            if tags and tags != ["error_generating_tags"] and tags != ["api_key_missing"]:
-                print(f"Adding tags to product {product.id}: {tags}")
-                tags_added = 0
-                
-                for tag_name in tags:
-                    # Check if tag exists for this store, create if not
-                    tag_query = Tag.query.filter_by(name=tag_name)
-                    if g.current_store:
-                        tag_query = tag_query.filter_by(store_id=g.current_store.id)
-                    
-                    tag = tag_query.first()
-                    if not tag:
-                        # Double check if tag exists with this name for any store
-                        existing_tag = Tag.query.filter_by(name=tag_name).first()
-                        if existing_tag:
-                            # Tag exists but for a different store, create a new one for this store
-                            print(f"Tag {tag_name} exists for another store, creating for current store")
-                            tag = Tag(name=f"{tag_name}", store_id=g.current_store.id if g.current_store else None)
-                        else:
-                            print(f"Creating new tag: {tag_name}")
-                            tag = Tag(name=tag_name)
-                            if g.current_store:
-                                tag.store_id = g.current_store.id
-                        
-                        db.session.add(tag)
-                        try:
-                            db.session.flush()  # Flush to get the tag ID
-                        except Exception as e:
-                            print(f"Error creating tag {tag_name}: {str(e)}")
-                            db.session.rollback()
-                            continue
-                    
-                    # Add tag to product if not already added
-                    if tag not in product.tags:
-                        print(f"Adding tag {tag.name} to product {product.title}")
-                        product.tags.append(tag)
-                        tags_added += 1
-                
-                if tags_added > 0:
-                    tagged_count += 1
-                    total_tags_added += tags_added
-        
-        db.session.commit()
+        use_batch = bool(form.use_batch.data)
+        job = job_runner.enqueue('auto_tag', g.current_store, product_ids=product_ids, use_batch=use_batch)
         
-        # Export tagged products to Shopify
-        if Config.SHOPIFY_ACCESS_TOKEN and Config.SHOPIFY_STORE_URL:
-            export_count = 0
-            export_errors = 0
-            
-            flash(f'Exporting {tagged_count} tagged products to Shopify...', 'info')
-            
-            for product, _ in results:
-                if product.tags:  # Only export products that have tags
-                    result = shopify_service.export_product_to_shopify(product)
-                    if 'error' not in result:
-                        export_count += 1
-                    else:
-                        export_errors += 1
-            
-            if export_errors > 0:
-                flash(f'Warning: {export_errors} products failed to export to Shopify', 'warning')
-            
-            flash(f'Successfully auto-tagged {tagged_count} products and exported {export_count} to Shopify', 'success')
+        if use_batch:
+            flash(f'Submitted {len(product_ids)} products for batch auto-tagging (job {job.id}). Tags are applied when the batch ends, usually within a few hours.', 'info')
         else:
-            flash(f'Successfully auto-tagged {tagged_count} products. Shopify integration not configured, skipping export.', 'success')
-        
+            flash(f'Started auto-tagging {len(product_ids)} products (job {job.id}). Tagged products will be exported to Shopify when it finishes.', 'info')
         return redirect(url_for('products'))
     
     @app.route('/collections')
@@ -505,197 +452,18 @@ def create_app():
         return redirect(url_for('collections'))
     
     @app.route('/collections/create-from-tags', methods=['POST'])
-    async def create_collections_from_tags():
-        """Create collections from all tags asynchronously."""
+    def create_collections_from_tags():
+        """Queue a job that creates collections from tags and untagged products."""
         form = CreateCollectionsForm()
-        exclude_imported_tags = form.exclude_imported_tags.data
-        
-        if exclude_imported_tags:
-            print("Only using tags generated by Claude (excluding imported tags)")
-        
-        created_count = 0
-        skipped_count = 0
         
-        # Get tags with product counts (filtered by store)
-        tag_query = db.session.query(
-            Tag, func.count(product_tags.c.product_id).label('product_count')
-        ).outerjoin(product_tags).group_by(Tag.id)
-        
-        if g.current_store:
-            tag_query = tag_query.filter(Tag.store_id == g.current_store.id)
-        
-        tag_counts = tag_query.all()
-        
-        # First, create collections from existing tags
-        for tag, product_count in tag_counts:
-            # Skip tags with no products or only one product
-            if product_count <= 1:
-                print(f"Skipping tag '{tag.name}' with only {product_count} product(s)")
-                skipped_count += 1
-                continue
-            
-            # Skip tags that don't have at least 2 words
-            if len(tag.name.split()) < 2:
-                print(f"Skipping single-word tag: {tag.name}")
-                skipped_count += 1
-                continue
-            
-            # Skip tags that contain underscores
-            if '_' in tag.name:
-                print(f"Skipping tag with underscore: {tag.name}")
-                skipped_count += 1
-                continue
-            
-            # If exclude_imported_tags is True, skip tags that were imported from Shopify
-            if exclude_imported_tags and ('imported' in tag.name.lower() or 'shopify' in tag.name.lower()):
-                print(f"Skipping imported tag: {tag.name}")
-                skipped_count += 1
-                continue
-                
-            # Check if a collection already exists for this tag (filtered by store)
-            collection_query = Collection.query.filter_by(tag_id=tag.id)
-            if g.current_store:
-                collection_query = collection_query.filter_by(store_id=g.current_store.id)
-            
-            existing_collection = collection_query.first()
-            if not existing_collection:
-                # Generate SEO-friendly title
-                title = f"{tag.name.title()} Collection | Premium {tag.name.title()} Products"
-                
-                # Generate SEO-friendly slug
-                base_slug = tag.name.lower().replace(' ', '-')
-                slug = base_slug
-                
-                # Check if a collection with this slug already exists (across all stores)
-                # We need to check globally to avoid unique constraint violations
-                slug_query = Collection.query.filter_by(slug=slug)
-                
-                counter = 1
-                while slug_query.first():
-                    slug = f"{base_slug}-{counter}"
-                    counter += 1
-                    # Check the new slug
-                    slug_query = Collection.query.filter_by(slug=slug)
-                
-                # Get product titles for meta description
-                product_titles = [p.title for p in tag.products[:5]]
-                product_titles_text = ", ".join(product_titles)
-                if len(product_titles) < len(tag.products):
-                    product_titles_text += f", and {len(tag.products) - len(product_titles)} more"
-                
-                # Get product examples for description generation
-                product_examples = [
-                    {"title": p.title, "description": p.description} 
-                    for p in tag.products[:5]
-                ]
-                
-                # Use Claude to generate meta description and description
-                meta_description = f"Explore our {tag.name} collection featuring {product_titles_text}. Find the perfect {tag.name} for your needs."
-                
-                description = f"""
-                <p>Welcome to our curated collection of {tag.name} products. We've carefully selected {product_count} items that represent the best in quality and value.</p>
-                <p>Whether you're looking for {tag.name} for personal use or as a gift, our collection offers a variety of options to suit your needs.</p>
-                <h2>Why Choose Our {tag.name.title()} Products?</h2>
-                <ul>
-                    <li>Premium quality materials and craftsmanship</li>
-                    <li>Carefully selected for durability and performance</li>
-                    <li>Perfect for both everyday use and special occasions</li>
-                    <li>Backed by our satisfaction guarantee</li>
-                </ul>
-                <p>Browse our complete {tag.name} collection below and find the perfect item for you today!</p>
-                """
-                
-                collection = Collection(
-                    name=title,
-                    slug=slug,
-                    meta_description=meta_description,
-                    description=description,
-                    tag=tag
-                )
-                
-                # Associate with current store
-                if g.current_store:
-                    collection.store_id = g.current_store.id
-                
-                # We don't need to manually add products to the collection
-                # since it's a smart collection based on the tag
-                # The tag relationship will automatically include all products with this tag
-                
-                db.session.add(collection)
-                created_count += 1
-                print(f"Created collection for tag: {tag.name} with {product_count} products")
-        
-        db.session.commit()
-        
-        # Now, analyze products without tags to create new collections (filtered by store)
-        untagged_query = Product.query.filter(~Product.tags.any())
-        if g.current_store:
-            untagged_query = untagged_query.filter_by(store_id=g.current_store.id)
-        
-        untagged_products = untagged_query.all()
-        if untagged_products:
-            flash(f'Analyzing {len(untagged_products)} untagged products for collections. This may take a while...', 'info')
-            
-            # Process products in batches asynchronously
-            results = await claude_service.batch_analyze_products_for_collections(untagged_products, batch_size=50)
-            
-            # Group products by category
-            categories = {}
-            for product, category in results:
-                if category:
-                    if category not in categories:
-                        categories[category] = []
-                    categories[category].append(product)
-            
-            # Create collections for each category
-            for category, products in categories.items():
-                if len(products) > 0:
-                    # Check if a collection already exists for this category (filtered by store)
-                    collection_query = Collection.query.filter_by(name=f"{category.capitalize()} Collection")
-                    if g.current_store:
-                        collection_query = collection_query.filter_by(store_id=g.current_store.id)
-                    
-                    existing_collection = collection_query.first()
-                    if not existing_collection:
-                        # Generate SEO-friendly slug
-                        base_slug = category.lower().replace(' ', '-')
-                        slug = base_slug
-                        
-                        # Check if a collection with this slug already exists (across all stores)
-                        # We need to check globally to avoid unique constraint violations
-                        slug_query = Collection.query.filter_by(slug=slug)
-                        
-                        counter = 1
-                        while slug_query.first():
-                            slug = f"{base_slug}-{counter}"
-                            counter += 1
-                            # Check the new slug
-                            slug_query = Collection.query.filter_by(slug=slug)
-                        
-                        collection = Collection(
-                            name=f"{category.capitalize()} Collection",
-                            slug=slug,
-                            description=f"Collection of {len(products)} products categorized as '{category}'",
-                        )
-                        
-                        # Associate with current store
-                        if g.current_store:
-                            collection.store_id = g.current_store.id
-                        
-                        # Add all products with this category
-                        for product in products:
-                            collection.products.append(product)
-                        
-                        db.session.add(collection)
-                        created_count += 1
-            
-            db.session.commit()
+        job = job_runner.enqueue(
+            'create_collections_from_tags',
+            g.current_store,
+            exclude_imported_tags=bool(form.exclude_imported_tags.data),
+            use_batch=bool(form.use_batch.data)
+        )
         
-        if created_count > 0:
-            flash(f'Successfully created {created_count} new collections', 'success')
-        else:
-            flash('No new collections created. Collections already exist for all tags with products.', 'info')
-            
+        flash(f'Started creating collections from tags (job {job.id})', 'info')
         return redirect(url_for('collections'))
     
     @app.route('/collections/<int:id>/view')
@@ -901,6 +669,65 @@ def create_app():
         products = products_query.all()
         return jsonify([product.to_dict() for product in products])
     
+    @app.route('/api/jobs', methods=['GET'])
+    def api_jobs():
+        """List the most recent background jobs for the current store."""
+        jobs_query = Job.query
+        if g.current_store:
+            jobs_query = jobs_query.filter_by(store_id=g.current_store.id)
+        
+        jobs = jobs_query.order_by(Job.id.desc()).limit(50).all()
+        return jsonify([job.to_dict() for job in jobs])
+    
+    @app.route('/api/jobs/<int:id>', methods=['GET'])
+    def api_job(id):
+        """Report a background job's status, progress, timing and result."""
+        job = Job.query.get_or_404(id)
+        return jsonify(job.to_dict())
+    
+    @app.route('/api/jobs/<int:id>/events', methods=['GET'])
+    def api_job_events(id):
+        """Stream a background job's progress as server-sent events until it finishes."""
+        Job.query.get_or_404(id)
+        store_url = shopify_service.store_url if shopify_service.is_configured() else None
+        
+        return Response(
+            stream_with_context(job_event_stream(id, store_url=store_url)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    @app.route('/jobs')
+    def jobs():
+        """List recent background jobs with live progress."""
+        jobs_query = Job.query
+        if g.current_store:
+            jobs_query = jobs_query.filter_by(store_id=g.current_store.id)
+        
+        jobs = jobs_query.order_by(Job.id.desc()).limit(50).all()
+        return render_template('jobs.html', jobs=jobs)
+    
+    @app.route('/api/claude-cache', methods=['GET'])
+    def api_claude_cache():
+        """Report the Claude result cache's hit and miss counters and size."""
+        return jsonify(claude_service.cache.stats())
+    
+    @app.route('/api/claude-concurrency', methods=['GET'])
+    def api_claude_concurrency():
+        """Report the adaptive limit on Claude calls in flight and how calls have fared."""
+        return jsonify(claude_service.limiter.status())
+    
+    @app.route('/api/claude-usage', methods=['GET'])
+    def api_claude_usage():
+        """Report Claude calls, tokens, latency percentiles and cost, overall and by store, prompt kind and running job.
+        
+        ?store_id= limits the report to one store, and ?recent= adds that many of the latest calls as recorded.
+        """
+        return jsonify(claude_service.telemetry.summary(
+            store_id=request.args.get('store_id', type=int),
+            recent=request.args.get('recent', 0, type=int)
+        ))
+    
     @app.route('/api/collections', methods=['GET'])
     def api_collections():
         """API endpoint to get all collections."""
@@ -980,34 +807,75 @@ def create_app():
     # Shopify Integration Routes
     @app.route('/shopify/import-products', methods=['POST'])
     def import_products_from_shopify():
-        """Import products from Shopify."""
+        """Queue a job that imports products from Shopify."""
         if not shopify_service.is_configured():
             flash('Shopify integration not configured. Please set Shopify credentials in environment variables.', 'danger')
             return redirect(url_for('env_vars'))
         
-        result = shopify_service.import_products_from_shopify(db, current_store=g.current_store)
+        job = job_runner.enqueue('import_products', g.current_store)
         
-        if 'error' in result:
-            flash(f'Error importing products from Shopify: {result["error"]}', 'danger')
-        else:
-            flash(f'Successfully imported {result["imported"]} products from Shopify', 'success')
+        flash(f'Started importing products from Shopify (job {job.id})', 'info')
+        return redirect(url_for('products'))
+    
+    @app.route('/shopify/sync-products', methods=['POST'])
+    def sync_products_from_shopify():
+        """Queue a job that syncs products changed in Shopify since the last sync, or fully reconciles."""
+        if not shopify_service.is_configured():
+            flash('Shopify integration not configured. Please set Shopify credentials in environment variables.', 'danger')
+            return redirect(url_for('env_vars'))
+        
+        full = request.form.get('mode') == 'full'
+        job = job_runner.enqueue('sync_products', g.current_store, full=full)
+        
+        flash(f'Started {"reconciling" if full else "syncing"} products with Shopify (job {job.id})', 'info')
+        return redirect(url_for('products'))
+    
+    @app.route('/shopify/push-changes', methods=['POST'])
+    def push_changes_to_shopify():
+        """Queue a job that pushes products and collections changed locally since the last push."""
+        if not shopify_service.is_configured():
+            flash('Shopify integration not configured. Please set Shopify credentials in environment variables.', 'danger')
+            return redirect(url_for('env_vars'))
+        
+        job = job_runner.enqueue('push_changes', g.current_store)
         
+        flash(f'Started pushing local changes to Shopify (job {job.id})', 'info')
         return redirect(url_for('products'))
     
+    @app.route('/shopify/webhooks', methods=['POST'])
+    @csrf.exempt
+    def shopify_webhook():
+        """Receive a Shopify webhook and queue it for batched processing."""
+        raw_body = request.get_data()
+        
+        if not verify_webhook(raw_body, request.headers.get('X-Shopify-Hmac-Sha256')):
+            return jsonify({'error': 'Invalid webhook signature'}), 401
+        
+        topic = request.headers.get('X-Shopify-Topic', '')
+        if topic not in SUPPORTED_TOPICS:
+            # Acknowledge so Shopify does not keep retrying topics we don't handle
+            return jsonify({'status': 'ignored'})
+        
+        shop_domain = request.headers.get('X-Shopify-Shop-Domain', '')
+        store = Store.query.filter_by(url=normalize_url(shop_domain)).first()
+        if not store:
+            return jsonify({'error': f'Unknown shop: {shop_domain}'}), 404
+        
+        enqueue_webhook(store, topic, json.loads(raw_body))
+        webhook_processor.notify()
+        
+        return jsonify({'status': 'queued'})
+    
     @app.route('/shopify/import-collections', methods=['POST'])
     def import_collections_from_shopify():
-        """Import collections from Shopify."""
+        """Queue a job that imports collections from Shopify."""
         if not shopify_service.is_configured():
             flash('Shopify integration not configured. Please set Shopify credentials in environment variables.', 'danger')
             return redirect(url_for('env_vars'))
         
-        result = shopify_service.import_collections_from_shopify(db, current_store=g.current_store)
-        
-        if 'error' in result:
-            flash(f'Error importing collections from Shopify: {result["error"]}', 'danger')
-        else:
-            flash(f'Successfully imported {result["imported"]} collections and updated {result["updated"]} from Shopify', 'success')
+        job = job_runner.enqueue('import_collections', g.current_store)
         
+        flash(f'Started importing collections from Shopify (job {job.id})', 'info')
         return redirect(url_for('collections'))
     
     @app.route('/shopify/export-product/<int:id>', methods=['POST'])
@@ -1022,11 +890,15 @@ def create_app():
         
         if 'error' in result:
             flash(f'Error exporting product to Shopify: {result["error"]}', 'danger')
+        elif result.get('skipped'):
+            flash('Product is unchanged since the last sync with Shopify', 'info')
         else:
             # Update product with Shopify ID if it's a new product
             if 'product' in result and 'id' in result['product'] and not product.shopify_id:
                 product.shopify_id = str(result['product']['id'])
-                db.session.commit()
+            
+            # Save the sync snapshot recorded during export
+            db.session.commit()
             
             flash('Product successfully exported to Shopify', 'success')
         
@@ -1041,33 +913,24 @@ def create_app():
         
         collection = Collection.query.get_or_404(id)
         
-        # For smart collections (with a tag), we need to make sure all products with this tag
-        # are included in the collection when exporting to Shopify
-        if collection.tag:
-            # Get all products with this tag
-            products = Product.query.join(Product.tags).filter(Tag.id == collection.tag_id).all()
-            
-            # Temporarily store the products in the collection for export
-            original_products = collection.products
-            collection.products = products
-            
-            result = shopify_service.export_collection_to_shopify(collection)
-            
-            # Restore original products
-            collection.products = original_products
+        if collection.shopify_id:
+            # Already in Shopify, so send its current title, description and handle
+            result = shopify_service.update_collection(collection)
+            error, note = result.get('error'), None
+            if not error:
+                mark_pushed('collection', collection.id)
         else:
-            # For regular collections, use the existing products
-            result = shopify_service.export_collection_to_shopify(collection)
+            # Smart collections are exported with every product carrying their tag, and one
+            # already in Shopify under the same handle is linked rather than created again
+            error, note = export_collection(shopify_service, collection)
+        db.session.commit()
         
-        if 'error' in result:
-            flash(f'Error exporting collection to Shopify: {result["error"]}', 'danger')
+        if error:
+            flash(f'Error exporting collection to Shopify: {error}', 'danger')
         else:
-            # Update collection with Shopify ID if it's a new collection
-            if 'custom_collection' in result and 'id' in result['custom_collection'] and not collection.shopify_id:
-                collection.shopify_id = str(result['custom_collection']['id'])
-                db.session.commit()
-            
             flash('Collection successfully exported to Shopify', 'success')
+            if note:
+                flash(note, 'info')
         
         return redirect(url_for('view_collection', id=id))
     
@@ -1089,33 +952,17 @@ def create_app():
         
         success_count = 0
         error_count = 0
+        notes = []
         
         for collection in collections:
-            # For smart collections (with a tag), we need to make sure all products with this tag
-            # are included in the collection when exporting to Shopify
-            if collection.tag:
-                # Get all products with this tag
-                products = Product.query.join(Product.tags).filter(Tag.id == collection.tag_id).all()
-                
-                # Temporarily store the products in the collection for export
-                original_products = collection.products
-                collection.products = products
-                
-                result = shopify_service.export_collection_to_shopify(collection)
-                
-                # Restore original products
-                collection.products = original_products
-            else:
-                # For regular collections, use the existing products
-                result = shopify_service.export_collection_to_shopify(collection)
-            
-            if 'error' not in result:
-                # Update collection with Shopify ID
-                if 'custom_collection' in result and 'id' in result['custom_collection']:
-                    collection.shopify_id = str(result['custom_collection']['id'])
-                    success_count += 1
-            else:
+            # Smart collections get the products carrying their tag, and existing ones are found by handle
+            error, note = export_collection(shopify_service, collection)
+            if error:
                 error_count += 1
+            else:
+                success_count += 1
+            if note:
+                notes.append(f'{collection.name}: {note}')
         
         db.session.commit()
         
@@ -1123,62 +970,33 @@ def create_app():
             flash(f'Successfully exported {success_count} collections to Shopify', 'success')
         if error_count > 0:
             flash(f'Failed to export {error_count} collections to Shopify', 'warning')
+        for note in notes:
+            flash(note, 'info')
         
         return redirect(url_for('collections'))
     
     @app.route('/shopify/export-all-collections', methods=['POST'])
     def export_all_collections_to_shopify():
-        """Export all collections to Shopify."""
+        """Queue a job that exports (or resumes exporting) all collections to Shopify."""
         if not shopify_service.is_configured():
             flash('Shopify integration not configured. Please set Shopify credentials in environment variables.', 'danger')
             return redirect(url_for('env_vars'))
         
-        # Get all collections that haven't been exported yet
-        collections = Collection.query.filter(Collection.shopify_id.is_(None)).all()
-        
-        if not collections:
+        if not filter_query_by_store(Collection.query, Collection).filter(Collection.shopify_id.is_(None)).first():
             flash('No collections available to export. All collections may already be exported to Shopify.', 'warning')
             return redirect(url_for('collections'))
         
-        success_count = 0
-        error_count = 0
-        
-        for collection in collections:
-            # For smart collections (with a tag), we need to make sure all products with this tag
-            # are included in the collection when exporting to Shopify
-            if collection.tag:
-                # Get all products with this tag
-                products = Product.query.join(Product.tags).filter(Tag.id == collection.tag_id).all()
-                
-                # Temporarily store the products in the collection for export
-                original_products = collection.products
-                collection.products = products
-                
-                result = shopify_service.export_collection_to_shopify(collection)
-                
-                # Restore original products
-                collection.products = original_products
-            else:
-                # For regular collections, use the existing products
-                result = shopify_service.export_collection_to_shopify(collection)
-            
-            if 'error' not in result:
-                # Update collection with Shopify ID
-                if 'custom_collection' in result and 'id' in result['custom_collection']:
-                    collection.shopify_id = str(result['custom_collection']['id'])
-                    success_count += 1
-            else:
-                error_count += 1
-        
-        db.session.commit()
-        
-        if success_count > 0:
-            flash(f'Successfully exported {success_count} collections to Shopify', 'success')
-        if error_count > 0:
-            flash(f'Failed to export {error_count} collections to Shopify', 'warning')
+        job = job_runner.enqueue('export_collections', g.current_store)
         
+        flash(f'Started exporting collections to Shopify (job {job.id}). Progress is saved, so an interrupted export resumes where it stopped.', 'success')
         return redirect(url_for('collections'))
     
+    @app.route('/shopify/export-jobs/<int:id>')
+    def export_job_status(id):
+        """Report the progress of a collection export job."""
+        job = ExportJob.query.get_or_404(id)
+        return jsonify(job.to_dict())
+    
     # Store Management Routes
     @app.route('/stores')
     def stores():
@@ -1201,7 +1019,8 @@ def create_app():
             store = Store(
                 name=form.name.data,
                 url=form.url.data,
-                access_token=form.access_token.data
+                access_token=form.access_token.data,
+                import_mode=form.import_mode.data
             )
             db.session.add(store)
             db.session.commit()
@@ -102,6 +102,79 @@ def run_migrations(app):
                 with db.engine.connect() as conn:
                     conn.execute(text("ALTER TABLE products ADD COLUMN shopify_id TEXT"))
             
+            # Check if import_mode column exists in stores table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT import_mode FROM stores LIMIT 1"))
+                print("import_mode column exists in stores table")
+            except OperationalError:
+                print("Adding import_mode column to stores table")
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE stores ADD COLUMN import_mode VARCHAR(20) DEFAULT 'rest'"))
+            
+            # Check if products_synced_at column exists in stores table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT products_synced_at FROM stores LIMIT 1"))
+                print("products_synced_at column exists in stores table")
+            except OperationalError:
+                print("Adding products_synced_at column to stores table")
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE stores ADD COLUMN products_synced_at DATETIME"))
+            
+            # Check if sync_hash column exists in products table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT sync_hash FROM products LIMIT 1"))
+                print("sync_hash column exists in products table")
+            except OperationalError:
+                print("Adding sync_hash column to products table")
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE products ADD COLUMN sync_hash VARCHAR(64)"))
+            
+            # Check if progress columns exist in jobs table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT error_count, progress_at FROM jobs LIMIT 1"))
+                print("progress columns exist in jobs table")
+            except OperationalError:
+                print("Adding progress columns to jobs table")
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN error_count INTEGER DEFAULT 0"))
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN progress_at DATETIME"))
+            
+            # Check if claude_usage column exists in jobs table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT claude_usage FROM jobs LIMIT 1"))
+                print("claude_usage column exists in jobs table")
+            except OperationalError:
+                print("Adding claude_usage column to jobs table")
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN claude_usage TEXT"))
+            
+            # Check if heartbeat columns exist in jobs table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT worker_id, heartbeat_at FROM jobs LIMIT 1"))
+                print("heartbeat columns exist in jobs table")
+            except OperationalError:
+                print("Adding heartbeat columns to jobs table")
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN worker_id VARCHAR(100)"))
+                    conn.execute(text("ALTER TABLE jobs ADD COLUMN heartbeat_at DATETIME"))
+            
+            # Check if resume columns exist in claude_batches table
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text("SELECT job_kind, job_params FROM claude_batches LIMIT 1"))
+                print("resume columns exist in claude_batches table")
+            except OperationalError:
+                print("Adding resume columns to claude_batches table")
+                with db.engine.connect() as conn:
+                    conn.execute(text("ALTER TABLE claude_batches ADD COLUMN job_kind VARCHAR(50)"))
+                    conn.execute(text("ALTER TABLE claude_batches ADD COLUMN job_params TEXT"))
+            
             print("Database migrations completed successfully")
             return True
         except Exception as e:
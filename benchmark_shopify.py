@@ -0,0 +1,294 @@
+"""
+Microbenchmarks for the Shopify integration.
+These run against the local mock server in shopify_mock_server.py, so no
+Shopify credentials or network access are needed.
+
+Usage:
+    python benchmark_shopify.py session [calls]
+    python benchmark_shopify.py rate-limit [calls]
+    python benchmark_shopify.py import [product_count]
+    python benchmark_shopify.py upsert [product_count]
+    python benchmark_shopify.py collections [collection_count]
+    python benchmark_shopify.py fields [product_count]
+    python benchmark_shopify.py tag-push [product_count]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import json
+import tracemalloc
+import requests
+from flask import Flask
+from config import Config
+from models import db, Product, Store
+from shopify_mock_server import start_mock_server
+from shopify_integration import ShopifyIntegration, PRODUCT_IMPORT_FIELDS, fields_param, next_page_info
+
+def _benchmark_app():
+    """Create a minimal app bound to a throwaway SQLite database."""
+    handle, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    db.init_app(app)
+    return app, db_path
+
+def benchmark_session(calls=500):
+    """Compare calls/sec of per-call connections against the pooled session."""
+    # A bucket far larger than the run, so the rate governor never paces the pooled calls
+    server, base_url = start_mock_server(product_count=100, bucket_size=100000, leak_rate=100000.0)
+    
+    try:
+        url = f"{base_url}/admin/api/2023-07/products/1000001.json"
+        headers = {'X-Shopify-Access-Token': 'benchmark', 'Content-Type': 'application/json'}
+        
+        # Before: a fresh connection for every call, as with module-level requests.get
+        start = time.perf_counter()
+        for _ in range(calls):
+            requests.get(url, headers=headers).raise_for_status()
+        before = calls / (time.perf_counter() - start)
+        
+        # After: every call goes through the shared keep-alive session
+        shopify = ShopifyIntegration(access_token='benchmark', store_url=base_url)
+        start = time.perf_counter()
+        for _ in range(calls):
+            result = shopify.get_product(1000001)
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+        after = calls / (time.perf_counter() - start)
+        
+        print(f"Per-call connections: {before:8.1f} calls/sec")
+        print(f"Pooled session:       {after:8.1f} calls/sec ({after / before:.2f}x)")
+    finally:
+        server.shutdown()
+
+def benchmark_rate_limit(calls=200):
+    """Run a burst of calls against a throttled mock and report the sustained rate."""
+    server, base_url = start_mock_server(product_count=100, bucket_size=40, leak_rate=20.0)
+    
+    try:
+        shopify = ShopifyIntegration(access_token='benchmark', store_url=base_url)
+        failures = 0
+        
+        start = time.perf_counter()
+        for _ in range(calls):
+            if 'error' in shopify.get_product(1000001):
+                failures += 1
+        elapsed = time.perf_counter() - start
+        
+        print(f"Sustained rate:  {calls / elapsed:8.1f} calls/sec (bucket leaks 20 calls/sec)")
+        print(f"429s from mock:  {server.state['throttled']}")
+        print(f"Failed calls:    {failures}")
+    finally:
+        server.shutdown()
+
+def benchmark_import(product_count=5000, modes=('rest', 'bulk')):
+    """Import a synthetic catalog through each import path and report time and peak memory."""
+    server, base_url = start_mock_server(product_count=product_count)
+    Config.SHOPIFY_BULK_POLL_INTERVAL = 0.1
+    
+    try:
+        for mode in modes:
+            app, db_path = _benchmark_app()
+            with app.app_context():
+                db.create_all()
+                store = Store(name='Benchmark', url='127.0.0.1', import_mode=mode)
+                db.session.add(store)
+                db.session.commit()
+                
+                shopify = ShopifyIntegration(access_token='benchmark', store_url=base_url)
+                
+                tracemalloc.start()
+                start = time.perf_counter()
+                if mode == 'bulk':
+                    result = shopify.import_products_from_shopify_bulk(db, current_store=store)
+                else:
+                    result = shopify.import_products_from_shopify(db, current_store=store)
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                
+                if 'error' in result:
+                    raise RuntimeError(result['error'])
+                
+                print(f"{mode:>5}: {Product.query.count()} products in {elapsed:6.2f}s, "
+                      f"peak memory {peak / 1024 / 1024:6.1f} MB")
+                db.session.remove()
+            os.remove(db_path)
+    finally:
+        server.shutdown()
+
+def benchmark_upsert(product_count=50000, chunk_size=250):
+    """Write a synthetic payload straight into SQLite, first as inserts and then as updates."""
+    from shopify_mock_server import make_product
+    from shopify_integration import chunked
+    
+    payload = [make_product(i) for i in range(product_count)]
+    app, db_path = _benchmark_app()
+    
+    try:
+        with app.app_context():
+            db.create_all()
+            store = Store(name='Benchmark', url='127.0.0.1')
+            db.session.add(store)
+            db.session.commit()
+            
+            shopify = ShopifyIntegration(access_token='benchmark', store_url='http://127.0.0.1')
+            
+            for label in ('insert', 'update'):
+                start = time.perf_counter()
+                for chunk in chunked(payload, chunk_size):
+                    shopify._upsert_products(db, chunk, store)
+                    db.session.commit()
+                elapsed = time.perf_counter() - start
+                
+                print(f"{label:>6}: {product_count} products in {elapsed:6.2f}s "
+                      f"({product_count / elapsed:8.0f} products/sec)")
+            
+            db.session.remove()
+    finally:
+        os.remove(db_path)
+
+def benchmark_collections(collection_count=100, product_count=5000, latency=0.05):
+    """Import collections with their memberships, sequentially and then with concurrent fetch workers.
+    
+    The mock uses a Shopify Plus sized bucket and a simulated round trip, so
+    the comparison shows latency hidden by concurrency within the rate limit.
+    """
+    server, base_url = start_mock_server(product_count=product_count, collection_count=collection_count,
+                                         bucket_size=400, leak_rate=20.0, latency=latency)
+    
+    try:
+        for workers in (1, Config.SHOPIFY_FETCH_WORKERS):
+            app, db_path = _benchmark_app()
+            with app.app_context():
+                db.create_all()
+                store = Store(name='Benchmark', url='127.0.0.1')
+                db.session.add(store)
+                db.session.commit()
+                
+                shopify = ShopifyIntegration(access_token='benchmark', store_url=base_url)
+                result = shopify.import_products_from_shopify(db, current_store=store)
+                if 'error' in result:
+                    raise RuntimeError(result['error'])
+                
+                # Let the rate limit bucket drain so both runs start equal
+                time.sleep(2)
+                
+                shopify.fetch_workers = workers
+                requests_before = server.state['get_requests']
+                start = time.perf_counter()
+                result = shopify.import_collections_from_shopify(db, current_store=store)
+                elapsed = time.perf_counter() - start
+                
+                if 'error' in result:
+                    raise RuntimeError(result['error'])
+                
+                print(f"{workers} worker(s): {result['total']} collections, {result['linked']} memberships "
+                      f"in {elapsed:6.2f}s using {server.state['get_requests'] - requests_before} GET requests")
+                db.session.remove()
+            os.remove(db_path)
+    finally:
+        server.shutdown()
+
+def benchmark_fields(product_count=5000):
+    """Compare response bytes and JSON decode time of full product pages against the import projection."""
+    server, base_url = start_mock_server(product_count=product_count)
+    
+    try:
+        shopify = ShopifyIntegration(access_token='benchmark', store_url=base_url)
+        
+        for label, fields in (('all fields', None), ('projected', PRODUCT_IMPORT_FIELDS)):
+            url = f"{base_url}/admin/api/2023-07/products.json?limit=250"
+            if fields:
+                url += f"&fields={fields_param(fields)}"
+            
+            total_bytes = 0
+            decode_time = 0.0
+            products = 0
+            page_url = url
+            while page_url:
+                response = shopify._request('GET', page_url)
+                response.raise_for_status()
+                total_bytes += len(response.content)
+                
+                start = time.perf_counter()
+                products += len(json.loads(response.content)['products'])
+                decode_time += time.perf_counter() - start
+                
+                page_info = next_page_info(response)
+                page_url = f"{url}&page_info={page_info}" if page_info else None
+            
+            print(f"{label:>10}: {total_bytes / products:7.0f} bytes/product, "
+                  f"JSON decode {decode_time * 1000:7.1f} ms for {products} products")
+    finally:
+        server.shutdown()
+
+def benchmark_tag_push(product_count=150):
+    """Push new tags for freshly tagged products serially over REST, then in GraphQL batches.
+    
+    The mock enforces standard plan limits on both APIs (40 REST calls leaking
+    at 2/s, and 1000 GraphQL cost points restoring at 50/s).
+    """
+    from models import Tag
+    
+    for mode in ('rest', 'graphql'):
+        server, base_url = start_mock_server(product_count=product_count, bucket_size=40, leak_rate=2.0)
+        app, db_path = _benchmark_app()
+        
+        try:
+            with app.app_context():
+                db.create_all()
+                store = Store(name='Benchmark', url='127.0.0.1')
+                db.session.add(store)
+                db.session.commit()
+                
+                shopify = ShopifyIntegration(access_token=f'benchmark-{mode}', store_url=base_url)
+                result = shopify.import_products_from_shopify(db, current_store=store)
+                if 'error' in result:
+                    raise RuntimeError(result['error'])
+                
+                # Tag every product, as an auto-tag run would
+                tag = Tag(name='benchmark tag', store_id=store.id)
+                products = Product.query.all()
+                for product in products:
+                    product.tags.append(tag)
+                db.session.commit()
+                
+                start = time.perf_counter()
+                if mode == 'rest':
+                    failed = sum(1 for product in products if 'error' in shopify.export_product_to_shopify(product))
+                else:
+                    failed = shopify.export_products_to_shopify(products)['failed']
+                elapsed = time.perf_counter() - start
+                
+                print(f"{mode:>7}: {len(products)} products in {elapsed:6.2f}s "
+                      f"({len(products) / elapsed:5.1f} products/sec, {failed} failed)")
+                db.session.remove()
+        finally:
+            server.shutdown()
+            os.remove(db_path)
+
+if __name__ == '__main__':
+    benchmark = sys.argv[1] if len(sys.argv) > 1 else 'session'
+    
+    if benchmark == 'session':
+        benchmark_session(int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+    elif benchmark == 'rate-limit':
+        benchmark_rate_limit(int(sys.argv[2]) if len(sys.argv) > 2 else 200)
+    elif benchmark == 'import':
+        benchmark_import(int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+    elif benchmark == 'upsert':
+        benchmark_upsert(int(sys.argv[2]) if len(sys.argv) > 2 else 50000)
+    elif benchmark == 'collections':
+        benchmark_collections(int(sys.argv[2]) if len(sys.argv) > 2 else 100)
+    elif benchmark == 'fields':
+        benchmark_fields(int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+    elif benchmark == 'tag-push':
+        benchmark_tag_push(int(sys.argv[2]) if len(sys.argv) > 2 else 150)
+    else:
+        print(f"Unknown benchmark: {benchmark}")
+        sys.exit(1)
@@ -0,0 +1,171 @@
+"""
+Catalog-scale Claude work through the Message Batches API.
+Products without a cached result are submitted as one batch, whose id is
+recorded in the claude_batches table, so an interrupted or re-run job
+collects the batch it already paid for instead of submitting a new one.
+A job doesn't hold a worker while its batch processes: it records itself on
+the batch and finishes, and ClaudeBatchPoller runs it again once the batch
+has ended, when its results are streamed back as (product, result) pairs,
+the same shape batch_generate_tags returns.
+"""
+
+import json
+import threading
+from datetime import datetime
+from config import Config
+from models import db, ClaudeBatch, Store
+
+class BatchPending(Exception):
+    """Raised when a batch's results are needed but it is still processing."""
+    
+    def __init__(self, batch):
+        super().__init__(f"Claude batch {batch.batch_id} is still processing")
+        self.batch = batch
+
+def get_or_submit_batch(claude, kind, products, store=None):
+    """Get the store's unfinished batch of this kind covering the products, or submit a new one."""
+    store_id = store.id if store else None
+    product_ids = {product.id for product in products}
+    
+    batches = (
+        ClaudeBatch.query
+        .filter_by(store_id=store_id, kind=kind)
+        .filter(ClaudeBatch.status.in_(['in_progress', 'ended']))
+        .order_by(ClaudeBatch.id.desc())
+        .all()
+    )
+    for batch in batches:
+        if product_ids <= set(json.loads(batch.product_ids)):
+            print(f"Resuming Claude batch {batch.batch_id}")
+            return batch
+    
+    submitted = claude.submit_message_batch(kind, products)
+    batch = ClaudeBatch(
+        batch_id=submitted['id'],
+        kind=kind,
+        product_ids=json.dumps(sorted(product_ids)),
+        store_id=store_id
+    )
+    db.session.add(batch)
+    db.session.commit()
+    return batch
+
+def check_batch(claude, batch, progress=None):
+    """Check once on a batch, reporting its request counts. Returns the batch as the API reports it."""
+    status = claude.get_message_batch(batch.batch_id)
+    counts = status['request_counts']
+    failed = counts['errored'] + counts['canceled'] + counts['expired']
+    
+    if progress:
+        progress(counts['succeeded'] + failed, counts['succeeded'] + failed + counts['processing'], errors=failed,
+                 message=f"Claude batch {batch.batch_id} {status['processing_status']}")
+    
+    if status['processing_status'] == 'ended':
+        batch.status = 'ended'
+        batch.succeeded_count = counts['succeeded']
+        batch.errored_count = failed
+        batch.ended_at = datetime.utcnow()
+        db.session.commit()
+    return status
+
+def resume_when_ended(batch, kind, **params):
+    """Record the job to run again once the batch ends, and return the result of the job that stops to wait for it."""
+    batch.job_kind = kind
+    batch.job_params = json.dumps(params)
+    db.session.commit()
+    return {
+        'message': f'Waiting for Claude batch {batch.batch_id}, the job runs again once it ends',
+        'claude_batch': batch.batch_id
+    }
+
+def run_claude_batch(claude, kind, products, store=None, progress=None):
+    """Yield (product, result) for each product, getting uncached results through a batch.
+    
+    Cached results come first, then the batch's results as they are read.
+    If the batch has not ended yet, BatchPending is raised after the cached
+    results instead of waiting for it.
+    The batch is only marked applied once every result has been consumed, so
+    a caller that fails part way collects the same batch again when re-run.
+    """
+    pending = []
+    for product in products:
+        result = claude.cached_result(kind, product)
+        if result is None:
+            pending.append(product)
+        else:
+            yield product, result
+    
+    if not pending:
+        return
+    
+    batch = get_or_submit_batch(claude, kind, pending, store)
+    status = check_batch(claude, batch, progress)
+    if status['processing_status'] != 'ended':
+        raise BatchPending(batch)
+    
+    yield from claude.message_batch_results(kind, status, pending)
+    
+    batch.status = 'applied'
+    db.session.commit()
+
+class ClaudeBatchPoller:
+    """Background thread that checks on unfinished batches and runs the jobs waiting for them once they end."""
+    
+    def __init__(self, app, claude, job_runner, poll_interval=None):
+        self.app = app
+        self.claude = claude
+        self.job_runner = job_runner
+        self.poll_interval = poll_interval or Config.CLAUDE_BATCH_POLL_INTERVAL
+        
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the poller thread if it is not already running."""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._thread = threading.Thread(target=self._run, name='claude-batch-poller', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Ask the poller thread to exit after its current check."""
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            with self.app.app_context():
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"Error checking Claude batches: {str(e)}")
+                finally:
+                    db.session.remove()
+    
+    def poll(self):
+        """Check every unfinished batch a job is waiting for, and queue that job again for each one that has ended.
+        
+        Returns the number of jobs queued.
+        """
+        batches = (
+            ClaudeBatch.query
+            .filter_by(status='in_progress')
+            .filter(ClaudeBatch.job_kind.isnot(None))
+            .order_by(ClaudeBatch.id)
+            .all()
+        )
+        
+        resumed = 0
+        for batch in batches:
+            try:
+                status = check_batch(self.claude, batch)
+            except Exception as e:
+                print(f"Error checking Claude batch {batch.batch_id}: {str(e)}")
+                continue
+            
+            if status['processing_status'] == 'ended':
+                store = Store.query.get(batch.store_id) if batch.store_id else None
+                job = self.job_runner.enqueue(batch.job_kind, store, **json.loads(batch.job_params or '{}'))
+                print(f"Claude batch {batch.batch_id} ended, queued job {job.id} to apply its results")
+                resumed += 1
+        return resumed
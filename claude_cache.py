@@ -0,0 +1,119 @@
+"""
+Persistent cache of Claude results.
+Results are kept in a small SQLite file of their own, keyed by a hash of the
+model, the prompt template version and the content sent, so identical content
+is only ever paid for once. The cache holds at most CLAUDE_CACHE_MAX_ENTRIES
+results and evicts the least recently used ones first. A relative
+CLAUDE_CACHE_PATH is resolved under the app's instance folder, like the
+SQLite database.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from config import Config
+
+# Flask's default instance folder for this app, used when no app instance path is given
+DEFAULT_INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+class ClaudeResultCache:
+    """Size-bounded, least recently used cache of Claude results, shared by all threads."""
+    
+    def __init__(self, path=None, max_entries=None, instance_path=None):
+        self.path = os.path.join(instance_path or DEFAULT_INSTANCE_PATH, path or Config.CLAUDE_CACHE_PATH)
+        self.max_entries = Config.CLAUDE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self._conn = None
+        self._entries = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+    
+    @staticmethod
+    def make_key(kind, model, template_version, *content):
+        """Hash what determines a result: the kind of call, model, prompt version and content."""
+        payload = json.dumps([kind, model, template_version, content], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _connect(self):
+        """Open the cache file on first use. Call with the lock held."""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS claude_cache ("
+                "key TEXT PRIMARY KEY, kind TEXT, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_claude_cache_last_used_at ON claude_cache (last_used_at)")
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM claude_cache").fetchone()[0]
+        return self._conn
+    
+    def get(self, key):
+        """Return the cached result for a key, or None."""
+        if not self.enabled:
+            return None
+        
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM claude_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            
+            conn.execute("UPDATE claude_cache SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return json.loads(row[0])
+    
+    def set(self, key, value, kind=None):
+        """Store a result, evicting the least recently used ones if the cache is full."""
+        if not self.enabled:
+            return
+        
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO claude_cache (key, kind, value, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, json.dumps(value), now, now)
+            ).rowcount
+            self._entries += inserted
+            
+            if self._entries > self.max_entries:
+                # Evict a tenth at a time so a full cache isn't trimmed on every insert
+                excess = self._entries - self.max_entries + max(1, self.max_entries // 10)
+                evicted = conn.execute(
+                    "DELETE FROM claude_cache WHERE key IN "
+                    "(SELECT key FROM claude_cache ORDER BY last_used_at LIMIT ?)",
+                    (excess,)
+                ).rowcount
+                self._entries -= evicted
+                self.evictions += evicted
+    
+    def stats(self):
+        """Hit and miss counters since startup, and the number of cached results."""
+        with self._lock:
+            if self.enabled:
+                self._connect()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'entries': self._entries,
+                'max_entries': self.max_entries,
+                'evictions': self.evictions
+            }
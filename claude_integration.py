@@ -1,14 +1,27 @@
 import anthropic
 import asyncio
-import aiohttp
+import httpx
 import json
+import time
+import threading
 from config import Config
+from claude_cache import ClaudeResultCache
+from claude_telemetry import ClaudeTelemetry, current_call_context
+from claude_rate_limit import AdaptiveConcurrencyLimiter, THROTTLED_STATUSES, RETRYABLE_STATUSES
+from retry_backoff import retry_after_seconds, backoff_delay
+from claude_prompts import (
+    PROMPT_VERSIONS, cached_system_prompt,
+    TAGGING_ROLE, TAGS_INSTRUCTIONS, TAGS_MULTI_INSTRUCTIONS,
+    CATEGORY_ROLE, CATEGORY_INSTRUCTIONS,
+    COLLECTION_DESCRIPTION_ROLE, COLLECTION_DESCRIPTION_INSTRUCTIONS,
+    META_DESCRIPTION_ROLE, META_DESCRIPTION_INSTRUCTIONS
+)
 
 class ClaudeTaggingService:
     """Service for tagging products using Claude 3.7."""
     
-    def __init__(self, api_key=None):
-        """Initialize the Claude client."""
+    def __init__(self, api_key=None, instance_path=None):
+        """Initialize the Claude client. instance_path is the app's instance folder, where the result cache is kept."""
         self.api_key = api_key or Config.ANTHROPIC_API_KEY
         self.client = anthropic.Anthropic(api_key=self.api_key)
         self.model = "claude-3-7-sonnet-20250219"
@@ -22,8 +35,108 @@ class ClaudeTaggingService:
             "collection", "set", "bundle", "pack", "kit", "package", "group"
         ]
         
-        # Maximum number of concurrent API calls
-        self.max_concurrent_calls = 10
+        # Calls in flight across every batch and job, adapted to how Claude responds
+        self.limiter = AdaptiveConcurrencyLimiter()
+        
+        # Async client and the event loop its connection pool lives on, created on first use
+        self._async_client = None
+        self._async_client_key = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        
+        # Results already paid for, reused whenever the same content comes up again
+        self.cache = ClaudeResultCache(instance_path=instance_path)
+        
+        # Model, token usage, latency, retries and outcome of every call, totalled per store and job
+        self.telemetry = ClaudeTelemetry()
+    
+    def _client_loop(self):
+        """Get the event loop thread that every async API call runs on, starting it if needed."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='claude-client', daemon=True).start()
+            return self._loop
+    
+    def _get_async_client(self):
+        """Get the shared async client, recreating it if the API key has changed. Runs on the client loop."""
+        if self._async_client is None or self._async_client_key != self.api_key:
+            if self._async_client is not None:
+                # Let requests already in flight on the old client finish before it closes
+                asyncio.get_running_loop().call_later(60, asyncio.ensure_future, self._async_client.close())
+            
+            # Retries are left to _create_message so the limiter sees every 429
+            self._async_client = anthropic.AsyncAnthropic(
+                api_key=self.api_key,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=httpx.Limits(
+                    max_connections=Config.CLAUDE_POOL_SIZE,
+                    max_keepalive_connections=Config.CLAUDE_POOL_SIZE
+                ))
+            )
+            self._async_client_key = self.api_key
+        return self._async_client
+    
+    async def _create_message(self, prompt_kind, **kwargs):
+        """Call the Messages API with the shared async client.
+        
+        The request runs on the client's own event loop, whichever loop awaits
+        it, so all callers share one connection pool and no thread is tied up
+        per in-flight call. Calls wait for a slot under the adaptive limit, and
+        rate limited, overloaded and failed calls are retried up to
+        CLAUDE_MAX_RETRIES times, honoring Retry-After. Every call is recorded in
+        the telemetry under prompt_kind, for the store and job it is made for.
+        """
+        # The call runs on the client loop, so take the store and job from the caller's context
+        context = current_call_context()
+        
+        async def create():
+            client = self._get_async_client()
+            attempt = 0
+            
+            while True:
+                started = await self.limiter.acquire()
+                outcome, retry_after = 'error', None
+                try:
+                    response = await client.messages.create(**kwargs)
+                    outcome = 'success'
+                    self.telemetry.record(kwargs['model'], prompt_kind, response.usage, time.monotonic() - started,
+                                          retries=attempt, context=context)
+                    return response
+                except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                    status_code = getattr(e, 'status_code', None)
+                    if status_code in THROTTLED_STATUSES:
+                        outcome, retry_after = 'throttled', retry_after_seconds(e.response, None)
+                    
+                    retryable = status_code is None or status_code in THROTTLED_STATUSES or status_code in RETRYABLE_STATUSES
+                    if not retryable or attempt >= Config.CLAUDE_MAX_RETRIES:
+                        self.telemetry.record(kwargs['model'], prompt_kind, None, time.monotonic() - started,
+                                              retries=attempt, outcome=outcome, context=context)
+                        raise
+                    print(f"Claude call {outcome} ({status_code or e.__class__.__name__}), retrying")
+                finally:
+                    await self.limiter.release(started, outcome, retry_after)
+                
+                # A Retry-After holds back every call in acquire; otherwise back off
+                if not retry_after:
+                    await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+        
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(create(), self._client_loop()))
+    
+    async def _cached_message_text(self, prompt_kind, content, **kwargs):
+        """Get the text of Claude's reply, from the result cache if this content was sent before.
+        
+        content is what the prompt is filled in with; together with the model
+        and the prompt's template version it keys the cache.
+        """
+        key = self.cache.make_key(prompt_kind, kwargs['model'], PROMPT_VERSIONS[prompt_kind], content)
+        text = self.cache.get(key)
+        if text is None:
+            response = await self._create_message(prompt_kind, **kwargs)
+            text = response.content[0].text
+            self.cache.set(key, text, kind=prompt_kind)
+        return text
     
     async def generate_tags_async(self, product):
         """Generate tags for a product using Claude 3.7 asynchronously."""
@@ -33,114 +146,226 @@ class ClaudeTaggingService:
             print("API key is missing, returning api_key_missing tag")
             return product, ["api_key_missing"]
         
-        # Prepare the prompt
-        prompt = f"""
-        You are a product tagging expert. Your task is to analyze the following product information and generate comprehensive, specific tags.
-
-        Every tag will become a collection, so ensure to give each product at least all of the tags that will allow it to sit in the correct collection on my ecommerce.
-        
-        Product Title: {product.title}
-        Product Description: {product.description}
-        
-        Please generate tags in the following categories:
-        
-        1. BASE TAGS (required):
-           - Extract ALL nouns from the title and description
-           - Extract ALL adjectives that describe the product
-           - Include materials, colors, sizes, styles, and product types
-           - Include brand names if mentioned
-        
-        2. FEATURE TAGS (required):
-           - Specific features and functionalities
-           - Technical specifications
-           - Special attributes or capabilities
-        
-        3. USE CASE TAGS (required):
-           - Where or how the product is used
-           - Problems it solves
-           - Activities it's designed for
-        
-        4. AUDIENCE TAGS (if applicable):
-           - Target demographic (age, gender, profession)
-           - Skill level (beginner, professional, etc.)
-           - Specific user groups
-        
-        Guidelines:
-        - Each tag MUST be a multi-word phrase (2-4 words)
-        - DO NOT create single-word tags
-        - All tags should be lowercase with no special characters
-        - Be comprehensive - it's better to have more specific tags than fewer generic ones
-        - Avoid generic terms like "product", "item", "quality", "value", "new", "trending", etc.
-        - Combine related concepts into meaningful phrases (e.g., "stainless steel coffee maker" instead of just "coffee maker")
-        
-        Return only the tags as a comma-separated list with no additional text, categories, or explanation.
-        """
-        
         try:
             # Call Claude API using the messages API
-            response = await asyncio.to_thread(
-                self.client.messages.create,
-                model=self.model,
-                max_tokens=500,
-                temperature=0.2,
-                system="You are a product tagging expert that generates specific, meaningful tags that avoid generic terms and focus on distinctive product attributes.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            tags_text = await self._cached_message_text('tags', self._tags_content(product), **self._tags_request(product))
             
             # Process the response
-            tags_text = response.content[0].text.strip()
+            tags_text = tags_text.strip()
             print(f"Raw tags from Claude for {product.title}: {tags_text}")
             
             # Split by comma and clean up
-            tags = [tag.strip().lower() for tag in tags_text.split(',')]
-            
-            # Remove any empty tags
-            tags = [tag for tag in tags if tag]
-            
-            # Filter out generic tags
-            tags = self.filter_generic_tags(tags)
-            
-            # Filter out single-word tags
-            tags = [tag for tag in tags if ' ' in tag]
-            
-            # Ensure we have at least one tag
-            if not tags:
-                tags = ["multi word tag"]
-                print(f"No tags after filtering for {product.title}, using 'multi word tag'")
+            tags = self.clean_tags(product, tags_text.split(','))
             
             print(f"Final tags for {product.title}: {tags}")
             return product, tags
-            
+        
         except Exception as e:
             print(f"Error generating tags for {product.title}: {str(e)}")
             return product, ["error generating tags"]
     
-    async def batch_generate_tags(self, products, batch_size=50):
-        """Generate tags for multiple products in parallel."""
-        results = []
+    def _tags_content(self, product):
+        """What the tagging prompt is filled in with, for cache keys."""
+        return [product.title, product.description]
+    
+    def _tags_request(self, product):
+        """Messages API parameters for tagging a product."""
+        return {
+            'model': self.model,
+            'max_tokens': 500,
+            'temperature': 0.2,
+            'system': cached_system_prompt(TAGGING_ROLE, TAGS_INSTRUCTIONS),
+            'messages': [
+                {"role": "user", "content": f"Product Title: {product.title}\nProduct Description: {product.description}"}
+            ]
+        }
+    
+    def clean_tags(self, product, tags):
+        """Lowercase Claude's tags for a product and drop empty, generic and single-word ones."""
+        tags = [tag.strip().lower() for tag in tags]
         
-        # Process products in batches to avoid overwhelming the API
-        for i in range(0, len(products), batch_size):
-            batch = products[i:i+batch_size]
-            print(f"Processing batch {i//batch_size + 1} of {(len(products) + batch_size - 1) // batch_size}")
-            
-            # Create a semaphore to limit concurrent API calls
-            semaphore = asyncio.Semaphore(self.max_concurrent_calls)
+        # Remove any empty tags
+        tags = [tag for tag in tags if tag]
+        
+        # Filter out generic tags
+        tags = self.filter_generic_tags(tags)
+        
+        # Filter out single-word tags
+        tags = [tag for tag in tags if ' ' in tag]
+        
+        # Ensure we have at least one tag
+        if not tags:
+            tags = ["multi word tag"]
+            print(f"No tags after filtering for {product.title}, using 'multi word tag'")
+        
+        return tags
+    
+    async def generate_tags_multi_async(self, products):
+        """Generate tags for several products with a single request.
+        
+        Claude returns a JSON object mapping each product's id to its tags.
+        Returns (product, tags) pairs, with tags None for every product whose
+        entry is missing or malformed, so the caller can tag it on its own.
+        """
+        if not self.api_key:
+            return [(product, ["api_key_missing"]) for product in products]
+        
+        # Products already tagged, on their own or in an earlier multi-product request, don't need sending again.
+        # Both share one cache entry per product, the comma-separated text a single-product reply is
+        results = {}
+        keys = {}
+        for product in products:
+            keys[product.id] = self.cache.make_key('tags', self.model, PROMPT_VERSIONS['tags'], self._tags_content(product))
+            cached = self.cache.get(keys[product.id])
+            if cached is not None:
+                results[product.id] = cached.split(',')
+        
+        pending = [product for product in products if product.id not in results]
+        if not pending:
+            return [(product, self.clean_tags(product, results[product.id])) for product in products]
+        
+        print(f"Generating tags for {len(pending)} products in one request")
+        product_text = "\n".join(
+            f"Product ID: {product.id}\nProduct Title: {product.title}\nProduct Description: {product.description}\n"
+            for product in pending
+        )
+        
+        try:
+            # Call Claude API using the messages API
+            response = await self._create_message(
+                'tags_multi',
+                model=self.model,
+                max_tokens=min(8192, 500 * len(pending)),
+                temperature=0.2,
+                system=cached_system_prompt(TAGGING_ROLE, TAGS_MULTI_INSTRUCTIONS),
+                messages=[
+                    {"role": "user", "content": product_text}
+                ]
+            )
+            tags_by_id = self._parse_tags_by_id(response.content[0].text)
+        except Exception as e:
+            print(f"Error generating tags for {len(pending)} products: {str(e)}")
+            return [(product, self.clean_tags(product, results[product.id]) if product.id in results else ["error generating tags"])
+                    for product in products]
+        
+        for product in pending:
+            tags = tags_by_id.get(str(product.id))
             
-            async def process_with_semaphore(product):
-                async with semaphore:
-                    return await self.generate_tags_async(product)
+            # Only a non-empty list of strings is usable; anything else is tagged on its own
+            if isinstance(tags, list) and tags and all(isinstance(tag, str) for tag in tags):
+                results[product.id] = tags
+                self.cache.set(keys[product.id], ', '.join(tags), kind='tags')
+            else:
+                print(f"Malformed tags for {product.title} in multi-product response, tagging it on its own")
+        
+        return [(product, self.clean_tags(product, results[product.id]) if product.id in results else None)
+                for product in products]
+    
+    @staticmethod
+    def _parse_tags_by_id(text):
+        """Parse Claude's JSON object of tags by product id, ignoring any text around it."""
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end < start:
+            return {}
+        
+        try:
+            tags_by_id = json.loads(text[start:end + 1])
+        except ValueError:
+            return {}
+        
+        return {str(product_id): tags for product_id, tags in tags_by_id.items()} if isinstance(tags_by_id, dict) else {}
+    
+    async def _as_completed(self, units, process):
+        """Run process on each unit of work and yield its results as soon as they are ready.
+        
+        A producer feeds units through a bounded queue to a pool of workers, so
+        a slow call only holds up its own worker rather than a whole batch. How
+        many calls are actually in flight is left to the shared adaptive limiter.
+        process is a coroutine function returning a list of results for a unit.
+        """
+        worker_count = max(1, min(len(units), Config.CLAUDE_MAX_CONCURRENT_CALLS))
+        work = asyncio.Queue(maxsize=worker_count * 2)
+        results = asyncio.Queue()
+        
+        async def produce():
+            for unit in units:
+                await work.put(unit)
+            for _ in range(worker_count):
+                await work.put(None)
+        
+        async def consume():
+            try:
+                while (unit := await work.get()) is not None:
+                    for result in await process(unit):
+                        await results.put(result)
+            finally:
+                # Let the reader know this worker is done, even if it failed
+                await results.put(None)
+        
+        tasks = [asyncio.create_task(produce())] + [asyncio.create_task(consume()) for _ in range(worker_count)]
+        try:
+            finished = 0
+            while finished < worker_count:
+                result = await results.get()
+                if result is None:
+                    finished += 1
+                else:
+                    yield result
             
-            # Create tasks for all products in the batch
-            tasks = [process_with_semaphore(product) for product in batch]
+            # Surface any error that stopped a worker early
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def iter_generate_tags(self, products, products_per_request=None):
+        """Yield (product, tags) for each product as soon as its tags are ready, in completion order.
+        
+        Each request tags products_per_request products (CLAUDE_TAGS_PER_REQUEST
+        by default); products left out of a multi-product response are tagged
+        one per request.
+        """
+        products_per_request = products_per_request or Config.CLAUDE_TAGS_PER_REQUEST
+        
+        async def process_group(group):
+            group_results = await self.generate_tags_multi_async(group)
             
-            # Wait for all tasks to complete
-            batch_results = await asyncio.gather(*tasks)
-            results.extend(batch_results)
+            # Fall back to single-product requests for anything the group request didn't tag
+            return await asyncio.gather(*[
+                self.generate_tags_async(product) if tags is None else asyncio.sleep(0, (product, tags))
+                for product, tags in group_results
+            ])
+        
+        async def process_product(product):
+            return [await self.generate_tags_async(product)]
+        
+        if products_per_request > 1:
+            groups = [products[i:i+products_per_request] for i in range(0, len(products), products_per_request)]
+            results = self._as_completed(groups, process_group)
+        else:
+            results = self._as_completed(products, process_product)
+        
+        async for result in results:
+            yield result
+    
+    async def batch_generate_tags(self, products, batch_size=50, progress=None, products_per_request=None):
+        """Generate tags for multiple products in parallel.
+        
+        Returns (product, tags) pairs in the order they completed. progress,
+        if given, is called every batch_size products with the number of
+        products done, the total and the number that failed.
+        """
+        results = []
+        error_count = 0
+        
+        async for product, tags in self.iter_generate_tags(products, products_per_request):
+            results.append((product, tags))
+            if tags in (["error generating tags"], ["api_key_missing"]):
+                error_count += 1
             
-            print(f"Completed batch {i//batch_size + 1}")
+            if progress and (len(results) % batch_size == 0 or len(results) == len(products)):
+                progress(len(results), len(products), errors=error_count,
+                         message=f"Tagged {len(results)} of {len(products)} products")
         
         return results
     
@@ -153,83 +378,70 @@ class ClaudeTaggingService:
         if not self.api_key:
             return product, None
         
-        # Prepare the prompt
-        prompt = f"""
-        You are a product categorization expert. Your task is to analyze the following product information and determine the most appropriate primary category for it.
-        
-        Product Title: {product.title}
-        Product Description: {product.description}
-        Current Tags: {', '.join([tag.name for tag in product.tags]) if product.tags else 'None'}
-        
-        Please determine the single most appropriate category for this product. The category should be:
-        - A specific, meaningful category that accurately represents this product type
-        - Descriptive enough to be useful for grouping similar products
-        - Not too generic (avoid terms like "product", "item", "goods", etc.)
-        - A multi-word phrase (2-3 words)
-        - Lowercase with no special characters
-        
-        Focus on categories that would be useful in an e-commerce context, such as:
-        - Product type (e.g., "bluetooth speaker", "cotton t-shirt", "ceramic mug")
-        - Primary material (e.g., "leather goods", "wooden furniture")
-        - Primary function (e.g., "kitchen tools", "office supplies")
-        
-        Return only the category name with no additional text or explanation.
-        """
-        
         try:
             # Call Claude API using the messages API
-            response = await asyncio.to_thread(
-                self.client.messages.create,
-                model=self.model,
-                max_tokens=50,
-                temperature=0.1,
-                system="You are a product categorization expert that determines specific, meaningful categories for products, avoiding generic terms.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+            category_text = await self._cached_message_text(
+                'collection_category', self._category_content(product), **self._category_request(product)
             )
             
             # Process the response
-            category = response.content[0].text.strip().lower()
-            
-            # Check if category is too generic
-            if category in self.generic_tags:
-                return product, "uncategorized product"
-            
-            # Ensure category is multi-word
-            if ' ' not in category:
-                category = f"{category} category"
-            
-            return product, category
-            
+            return product, self.parse_category(category_text)
+        
         except Exception as e:
             print(f"Error analyzing product for collection: {str(e)}")
             return product, None
     
-    async def batch_analyze_products_for_collections(self, products, batch_size=50):
-        """Analyze multiple products for collections in parallel."""
+    def _category_content(self, product):
+        """What the categorization prompt is filled in with, for cache keys."""
+        return [product.title, product.description, [tag.name for tag in product.tags]]
+    
+    def _category_request(self, product):
+        """Messages API parameters for categorizing a product."""
+        tags_text = ', '.join([tag.name for tag in product.tags]) if product.tags else 'None'
+        return {
+            'model': self.model,
+            'max_tokens': 50,
+            'temperature': 0.1,
+            'system': cached_system_prompt(CATEGORY_ROLE, CATEGORY_INSTRUCTIONS),
+            'messages': [
+                {"role": "user", "content": f"Product Title: {product.title}\nProduct Description: {product.description}\nCurrent Tags: {tags_text}"}
+            ]
+        }
+    
+    def parse_category(self, category_text):
+        """Turn Claude's reply into a specific, multi-word category."""
+        category = category_text.strip().lower()
+        
+        # Check if category is too generic
+        if category in self.generic_tags:
+            return "uncategorized product"
+        
+        # Ensure category is multi-word
+        if ' ' not in category:
+            category = f"{category} category"
+        
+        return category
+    
+    async def batch_analyze_products_for_collections(self, products, batch_size=50, progress=None):
+        """Analyze multiple products for collections in parallel.
+        
+        Returns (product, category) pairs in the order they completed. progress,
+        if given, is called every batch_size products like in batch_generate_tags.
+        """
         results = []
+        error_count = 0
         
-        # Process products in batches to avoid overwhelming the API
-        for i in range(0, len(products), batch_size):
-            batch = products[i:i+batch_size]
-            print(f"Processing batch {i//batch_size + 1} of {(len(products) + batch_size - 1) // batch_size}")
-            
-            # Create a semaphore to limit concurrent API calls
-            semaphore = asyncio.Semaphore(self.max_concurrent_calls)
-            
-            async def process_with_semaphore(product):
-                async with semaphore:
-                    return await self.analyze_product_for_collection_async(product)
-            
-            # Create tasks for all products in the batch
-            tasks = [process_with_semaphore(product) for product in batch]
-            
-            # Wait for all tasks to complete
-            batch_results = await asyncio.gather(*tasks)
-            results.extend(batch_results)
+        async def process_product(product):
+            return [await self.analyze_product_for_collection_async(product)]
+        
+        async for product, category in self._as_completed(products, process_product):
+            results.append((product, category))
+            if not category:
+                error_count += 1
             
-            print(f"Completed batch {i//batch_size + 1}")
+            if progress and (len(results) % batch_size == 0 or len(results) == len(products)):
+                progress(len(results), len(products), errors=error_count,
+                         message=f"Analyzed {len(results)} of {len(products)} products")
         
         return results
     
@@ -238,40 +450,29 @@ class ClaudeTaggingService:
         if not self.api_key:
             return f"A collection of {product_count} products related to {tag_name}."
         
-        # Prepare the prompt
-        prompt = f"""
-        Create a unique, engaging description for a collection of {product_count} products tagged as '{tag_name}'.
-        
-        Some example products in this collection:
-        {json.dumps(product_examples, indent=2)}
-        
-        The description should:
-        - Be creative and unique to this specific collection
-        - Highlight the key features or benefits of products in this category
-        - Be written in an engaging, conversational tone
-        - Include appropriate HTML formatting (paragraphs, maybe a list of features)
-        - Be 3-5 paragraphs in length
-        - Focus on quality, value, and product benefits
-        - Use h2 or h3 tags for any headings (never h1)
-        
-        Return only the HTML content with no additional text, categories, or explanation.
-        """
+        # Only the collection itself goes in the prompt; the instructions are in the cached system prompt
+        prompt = f"""Collection tag: {tag_name}
+Number of products: {product_count}
+
+Some example products in this collection:
+{json.dumps(product_examples, indent=2)}"""
         
         try:
             # Call Claude API using the messages API
-            response = await asyncio.to_thread(
-                self.client.messages.create,
+            description = await self._cached_message_text(
+                'collection_description',
+                [tag_name, product_count, product_examples],
                 model=self.model,
                 max_tokens=1000,
                 temperature=0.7,
-                system="You are a creative copywriter specializing in e-commerce collection descriptions that are engaging, informative, and optimized for conversion.",
+                system=cached_system_prompt(COLLECTION_DESCRIPTION_ROLE, COLLECTION_DESCRIPTION_INSTRUCTIONS),
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
             )
             
             # Process the response
-            description = response.content[0].text.strip()
+            description = description.strip()
             print(f"Generated collection description for '{tag_name}' collection")
             
             return description
@@ -285,37 +486,25 @@ class ClaudeTaggingService:
         if not self.api_key:
             return f"Explore our {tag_name} collection featuring {product_titles_text}. Find the perfect {tag_name} for your needs."
         
-        # Prepare the prompt
-        prompt = f"""
-        Create a concise, SEO-friendly meta description for a collection of products tagged as '{tag_name}'.
-        
-        Some products in this collection include: {product_titles_text}
-        
-        The meta description should:
-        - Be 150-160 characters maximum
-        - Include the collection name ('{tag_name}')
-        - Be compelling and encourage clicks
-        - NOT make claims about shipping, pricing, or guarantees
-        - Focus on the value proposition of the collection
-        
-        Return only the meta description text with no additional explanation.
-        """
+        # Only the collection itself goes in the prompt; the instructions are in the cached system prompt
+        prompt = f"Collection tag: {tag_name}\nSome products in this collection include: {product_titles_text}"
         
         try:
             # Call Claude API using the messages API
-            response = await asyncio.to_thread(
-                self.client.messages.create,
+            meta_description = await self._cached_message_text(
+                'collection_meta_description',
+                [tag_name, product_titles_text],
                 model=self.model,
                 max_tokens=200,
                 temperature=0.4,
-                system="You are an SEO expert who creates compelling meta descriptions that drive clicks while staying within character limits.",
+                system=cached_system_prompt(META_DESCRIPTION_ROLE, META_DESCRIPTION_INSTRUCTIONS),
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
             )
             
             # Process the response
-            meta_description = response.content[0].text.strip()
+            meta_description = meta_description.strip()
             print(f"Generated meta description for '{tag_name}' collection")
             
             return meta_description
@@ -324,6 +513,90 @@ class ClaudeTaggingService:
             print(f"Error generating collection meta description: {str(e)}")
             return f"Explore our {tag_name} collection featuring {product_titles_text}. Find the perfect {tag_name} for your needs."
     
+    # Message Batches API, for large jobs that don't need results straight away
+    
+    def _batch_kind(self, kind):
+        """Request builder, cache content, result parser and failure result for a kind of batch work."""
+        if kind == 'tags':
+            return self._tags_request, self._tags_content, lambda product, text: self.clean_tags(product, text.split(',')), ["error generating tags"]
+        if kind == 'collection_category':
+            return self._category_request, self._category_content, lambda product, text: self.parse_category(text), None
+        raise ValueError(f'Unknown batch kind: {kind}')
+    
+    def _batches_headers(self):
+        return {'x-api-key': self.api_key, 'anthropic-version': '2023-06-01'}
+    
+    def _batches_request(self, method, path, **kwargs):
+        """Call a Message Batches endpoint. The client library predates it, so this goes over plain HTTP."""
+        response = httpx.request(
+            method,
+            f"{str(self.client.base_url).rstrip('/')}/v1/messages/batches{path}",
+            headers=self._batches_headers(),
+            timeout=Config.CLAUDE_BATCH_HTTP_TIMEOUT,
+            **kwargs
+        )
+        response.raise_for_status()
+        return response
+    
+    def cached_result(self, kind, product):
+        """Get a product's result from the result cache, or None if it hasn't been paid for yet."""
+        _, content, parse, _ = self._batch_kind(kind)
+        text = self.cache.get(self.cache.make_key(kind, self.model, PROMPT_VERSIONS[kind], content(product)))
+        return parse(product, text) if text is not None else None
+    
+    def submit_message_batch(self, kind, products):
+        """Submit a Message Batches API batch with one request per product, keyed by product id.
+        
+        Returns the batch as reported by the API, including its id.
+        """
+        build_request, _, _, _ = self._batch_kind(kind)
+        requests = [{'custom_id': str(product.id), 'params': build_request(product)} for product in products]
+        
+        batch = self._batches_request('POST', '', json={'requests': requests}).json()
+        print(f"Submitted Claude batch {batch['id']} with {len(requests)} {kind} requests")
+        return batch
+    
+    def get_message_batch(self, batch_id):
+        """Get a batch's processing status and request counts."""
+        return self._batches_request('GET', f'/{batch_id}').json()
+    
+    def message_batch_results(self, kind, batch, products):
+        """Stream the results of an ended batch as (product, result) pairs, caching every success.
+        
+        Results are read line by line from the batch's JSONL results file.
+        Requests that errored or expired give the same result as a failed call.
+        """
+        _, content, parse, failed = self._batch_kind(kind)
+        products_by_id = {str(product.id): product for product in products}
+        
+        with httpx.stream(
+            'GET',
+            batch['results_url'],
+            headers=self._batches_headers(),
+            timeout=Config.CLAUDE_BATCH_HTTP_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.strip():
+                    continue
+                
+                entry = json.loads(line)
+                product = products_by_id.get(entry['custom_id'])
+                if product is None:
+                    continue
+                
+                result = entry['result']
+                if result['type'] != 'succeeded':
+                    print(f"Claude batch request for {product.title} {result['type']}: {result.get('error')}")
+                    self.telemetry.record(self.model, kind, None, None, outcome=result['type'], batch=True)
+                    yield product, failed
+                    continue
+                
+                self.telemetry.record(result['message'].get('model') or self.model, kind, result['message'].get('usage'), None, batch=True)
+                text = result['message']['content'][0]['text']
+                self.cache.set(self.cache.make_key(kind, self.model, PROMPT_VERSIONS[kind], content(product)), text, kind=kind)
+                yield product, parse(product, text)
+    
     # Synchronous wrapper methods for backward compatibility
     
     def generate_tags(self, product):
@@ -0,0 +1,266 @@
+"""
+Local mock of the Anthropic Messages and Message Batches APIs.
+This module answers tagging, categorization and description prompts with
+deterministic replies over HTTP, so the Claude integration can be exercised
+and benchmarked offline. Point the app at it with ANTHROPIC_BASE_URL.
+
+Usage:
+    python claude_mock_server.py [port] [batch_seconds]
+"""
+
+import re
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def prompt_text(params):
+    """The text of a request's first user message, whether a string or content blocks."""
+    content = params['messages'][0]['content']
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') for block in content)
+
+def system_text(params):
+    """The text of a request's system prompt, whether a string or content blocks."""
+    system = params.get('system') or ''
+    if isinstance(system, str):
+        return system
+    return ''.join(block.get('text', '') for block in system)
+
+def tags_for(title):
+    """Deterministic multi-word tags for a product title."""
+    words = re.sub(r'[^a-z0-9 ]', '', title.lower()).split()
+    return [f"{' '.join(words[:3])} style", 'mock gift idea']
+
+def reply_text(params):
+    """Answer a prompt the way Claude would, in the format the prompt asks for."""
+    prompt = prompt_text(params)
+    
+    # The cached prefix is shared by every kind of prompt, so the kind is told by what follows it
+    system = system_text(params)[len(cached_prefix(params)):]
+    
+    if 'Product ID:' in prompt:
+        products = re.findall(r'Product ID: (\S+)\nProduct Title: (.*)', prompt)
+        return json.dumps({product_id: tags_for(title) for product_id, title in products})
+    if 'tagging expert' in system:
+        title = re.search(r'Product Title: (.*)', prompt).group(1)
+        return ', '.join(tags_for(title))
+    if 'categorization expert' in system:
+        title = re.search(r'Product Title: (.*)', prompt).group(1)
+        return f"{title.lower().split()[0]} category"
+    if 'meta description' in system:
+        return 'Explore our mock collection of hand-picked products.'
+    return '<p>A mock collection description.</p>'
+
+def cached_prefix(params):
+    """The system prompt up to its last cache_control breakpoint, or '' if it has none."""
+    system = params.get('system')
+    if not isinstance(system, list):
+        return ''
+    
+    prefix = ''
+    text = ''
+    for block in system:
+        text += block.get('text', '')
+        if block.get('cache_control'):
+            prefix = text
+    return prefix
+
+def min_cacheable_tokens(model):
+    """Shortest prompt prefix Claude caches for a model; shorter prefixes are processed as ordinary input."""
+    return 2048 if 'haiku' in (model or '') else 1024
+
+def prompt_usage(params, prompt_cache):
+    """Token usage of a request's prompt, reading its cached prefix from prompt_cache after the first time.
+    
+    Tokens are estimated at four characters each, and a prefix shorter than
+    the model's minimum cacheable length is never cached, as with Claude.
+    """
+    prefix = cached_prefix(params)
+    if len(prefix) // 4 < min_cacheable_tokens(params.get('model')):
+        prefix = ''
+    usage = {
+        'input_tokens': (len(system_text(params)) - len(prefix) + len(prompt_text(params))) // 4,
+        'cache_creation_input_tokens': 0,
+        'cache_read_input_tokens': 0
+    }
+    if prefix and prefix in prompt_cache:
+        usage['cache_read_input_tokens'] = len(prefix) // 4
+    elif prefix:
+        prompt_cache.add(prefix)
+        usage['cache_creation_input_tokens'] = len(prefix) // 4
+    return usage
+
+def make_message(params, prompt_cache):
+    """Build a Messages API response for a request's parameters."""
+    prompt = prompt_text(params)
+    text = reply_text(params)
+    return {
+        'id': f'msg_mock_{abs(hash(prompt)) % 10 ** 12}',
+        'type': 'message',
+        'role': 'assistant',
+        'model': params.get('model'),
+        'content': [{'type': 'text', 'text': text}],
+        'stop_reason': 'end_turn',
+        'stop_sequence': None,
+        'usage': dict(prompt_usage(params, prompt_cache), output_tokens=len(text) // 4)
+    }
+
+class MockClaudeHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the subset of the Anthropic API used by the app."""
+    
+    # HTTP/1.1 so that clients can keep connections alive
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+    
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+    
+    def _batch_status(self, batch):
+        """Report a batch like the API does; it ends batch_seconds after it was created."""
+        ended = time.monotonic() - batch['created'] >= self.server.state['batch_seconds']
+        errored = sum(1 for request in batch['requests'] if '[error]' in prompt_text(request['params']))
+        return {
+            'id': batch['id'],
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {
+                'processing': 0 if ended else len(batch['requests']),
+                'succeeded': len(batch['requests']) - errored if ended else 0,
+                'errored': errored if ended else 0,
+                'canceled': 0,
+                'expired': 0
+            },
+            'results_url': f"http://{self.headers.get('Host')}/v1/messages/batches/{batch['id']}/results" if ended else None
+        }
+    
+    def do_GET(self):
+        state = self.server.state
+        match = re.fullmatch(r'/v1/messages/batches/([^/]+)(/results)?', self.path)
+        batch = state['batches'].get(match.group(1)) if match else None
+        if not batch:
+            return self._send_json({'type': 'error', 'error': {'type': 'not_found_error', 'message': 'Not found'}}, status=404)
+        
+        if not match.group(2):
+            return self._send_json(self._batch_status(batch))
+        
+        # Results are JSONL, one line per request, in no particular order
+        lines = []
+        for request in reversed(batch['requests']):
+            if '[error]' in prompt_text(request['params']):
+                result = {'type': 'errored', 'error': {'type': 'invalid_request_error', 'message': 'Mock error'}}
+            else:
+                with state['lock']:
+                    result = {'type': 'succeeded', 'message': make_message(request['params'], state['prompt_cache'])}
+            lines.append(json.dumps({'custom_id': request['custom_id'], 'result': result}) + '\n')
+        
+        body = ''.join(lines).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/binary')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        state = self.server.state
+        data = self._read_json()
+        
+        if self.path == '/v1/messages':
+            with state['lock']:
+                state['message_requests'] += 1
+                throttled = state['concurrency_limit'] and state['in_flight'] >= state['concurrency_limit']
+                if throttled:
+                    state['throttled'] += 1
+                else:
+                    state['in_flight'] += 1
+                    state['peak_in_flight'] = max(state['peak_in_flight'], state['in_flight'])
+            
+            if throttled:
+                return self._send_json(
+                    {'type': 'error', 'error': {'type': 'rate_limit_error', 'message': 'Too many concurrent requests'}},
+                    status=429, headers={'retry-after': '1'}
+                )
+            
+            try:
+                if state['latency']:
+                    time.sleep(state['latency'])
+                with state['lock']:
+                    message = make_message(data, state['prompt_cache'])
+                return self._send_json(message)
+            finally:
+                with state['lock']:
+                    state['in_flight'] -= 1
+        
+        if self.path == '/v1/messages/batches':
+            with state['lock']:
+                state['batch_requests'] += 1
+                batch = {
+                    'id': f"msgbatch_mock_{state['batch_requests']}",
+                    'requests': data['requests'],
+                    'created': time.monotonic()
+                }
+                state['batches'][batch['id']] = batch
+            return self._send_json(self._batch_status(batch))
+        
+        return self._send_json({'type': 'error', 'error': {'type': 'not_found_error', 'message': 'Not found'}}, status=404)
+
+def create_mock_server(port=0, latency=0.0, batch_seconds=1.0, concurrency_limit=None):
+    """Create a mock Anthropic server bound to localhost (port 0 picks a free port).
+    
+    Messages are answered after latency seconds, and batches end
+    batch_seconds after they are submitted. Requests whose prompt contains
+    "[error]" come back errored in batch results. With concurrency_limit,
+    messages beyond that many in flight are rejected with a 429. System prompt
+    prefixes marked with cache_control are reported as written to the prompt
+    cache the first time they are seen and as read from it after that.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockClaudeHandler)
+    server.daemon_threads = True
+    server.state = {
+        'lock': threading.Lock(),
+        'latency': latency,
+        'batch_seconds': batch_seconds,
+        'concurrency_limit': concurrency_limit,
+        'in_flight': 0,
+        'peak_in_flight': 0,
+        'throttled': 0,
+        'batches': {},
+        'prompt_cache': set(),
+        'message_requests': 0,
+        'batch_requests': 0
+    }
+    return server
+
+def start_mock_server(port=0, latency=0.0, batch_seconds=1.0, concurrency_limit=None):
+    """Start a mock server on a background thread and return it with its base URL."""
+    server = create_mock_server(port, latency, batch_seconds, concurrency_limit)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8766
+    batch_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    
+    server = create_mock_server(port, batch_seconds=batch_seconds)
+    print(f"Mock Anthropic server listening on http://127.0.0.1:{port} (set ANTHROPIC_BASE_URL to use it)")
+    server.serve_forever()
@@ -0,0 +1,146 @@
+"""
+Static parts of the prompts sent to Claude.
+Every prompt starts with the same catalog guide, which is marked for Claude's
+prompt cache so it is only processed once every few minutes whatever kind of
+prompt comes next, followed by a short role and task for the kind of prompt
+and a user message with the product or collection it is about.
+"""
+
+# Prompt template versions, part of every result cache key; bump one when its prompt changes.
+# Tags from multi-product requests are cached like single-product ones, so 'tags' covers both prompts
+PROMPT_VERSIONS = {
+    'tags': 3,
+    'collection_category': 3,
+    'collection_description': 3,
+    'collection_meta_description': 3
+}
+
+# Shared by every prompt so it is cached once for all of them. Claude only caches a prompt prefix of at
+# least 1024 tokens (2048 for Haiku models), so the guide must not be cut down below that.
+CATALOG_GUIDE = """You help run the product catalog of an e-commerce store. Products are tagged, every tag becomes a collection, products without tags are grouped into collections by category, and every collection gets a description and a meta description for search engines. The guide below covers each of these; follow the part for the task you are given.
+
+TAGGING GUIDE
+
+Every tag will become a collection, so ensure to give each product at least all of the tags that will allow it to sit in the correct collection on my ecommerce.
+
+Please generate tags in the following categories:
+
+1. BASE TAGS (required):
+   - Extract ALL nouns from the title and description
+   - Extract ALL adjectives that describe the product
+   - Include materials, colors, sizes, styles, and product types
+   - Include brand names if mentioned
+
+2. FEATURE TAGS (required):
+   - Specific features and functionalities
+   - Technical specifications
+   - Special attributes or capabilities
+
+3. USE CASE TAGS (required):
+   - Where or how the product is used
+   - Problems it solves
+   - Activities it's designed for
+
+4. AUDIENCE TAGS (if applicable):
+   - Target demographic (age, gender, profession)
+   - Skill level (beginner, professional, etc.)
+   - Specific user groups
+
+Guidelines:
+- Each tag MUST be a multi-word phrase (2-4 words)
+- DO NOT create single-word tags
+- All tags should be lowercase with no special characters
+- Be comprehensive - it's better to have more specific tags than fewer generic ones
+- Avoid generic terms like "product", "item", "quality", "value", "new", "trending", etc.
+- Combine related concepts into meaningful phrases (e.g., "stainless steel coffee maker" instead of just "coffee maker")
+- Only tag what the title and description support; never invent materials, sizes or brands
+- Use the same wording for the same concept across products, so similar products share collections (always "stainless steel", never "stainless" on one product and "steel" on another)
+
+Example 1
+Product Title: Organic Cotton Crew Neck T-Shirt - Forest Green
+Product Description: Soft, breathable t-shirt made from 100% GOTS-certified organic cotton. Relaxed fit, reinforced seams, pre-shrunk. Available in sizes XS to XXL.
+Tags: organic cotton tshirt, crew neck tshirt, forest green tshirt, green cotton top, breathable cotton fabric, gots certified cotton, relaxed fit tshirt, reinforced seam construction, preshrunk cotton garment, everyday casual wear, sustainable basic clothing, eco conscious shoppers, unisex casual top
+
+Example 2
+Product Title: Insulated Stainless Steel Water Bottle 750ml
+Product Description: Double-wall vacuum insulation keeps drinks cold for 24 hours or hot for 12. Leak-proof lid, powder-coated finish, fits most car cup holders. BPA free.
+Tags: stainless steel water bottle, insulated water bottle, 750ml water bottle, double wall insulation, vacuum insulated bottle, leak proof lid, powder coated finish, bpa free bottle, cold drinks 24 hours, hot drinks 12 hours, car cup holder bottle, gym hydration gear, hiking water bottle, commuter drink bottle, outdoor enthusiasts gear
+
+Example 3
+Product Title: Beginner Watercolor Paint Set with 24 Colors
+Product Description: Travel-size watercolor palette with 24 vibrant pans, two refillable water brushes and a mixing tray. Great for kids and adults starting out.
+Tags: watercolor paint set, 24 color watercolor palette, travel watercolor kit, watercolor paint pans, refillable water brush, paint mixing tray, vibrant watercolor colors, beginner art supplies, plein air painting, travel sketching kit, art hobby starter, kids art supplies, adult beginner painters
+
+CATEGORY GUIDE
+
+A category groups a product that has no tags with similar products. The category should be:
+- A specific, meaningful category that accurately represents this product type
+- Descriptive enough to be useful for grouping similar products
+- Not too generic (avoid terms like "product", "item", "goods", etc.)
+- A multi-word phrase (2-3 words)
+- Lowercase with no special characters
+
+Focus on categories that would be useful in an e-commerce context, such as:
+- Product type (e.g., "bluetooth speaker", "cotton t-shirt", "ceramic mug")
+- Primary material (e.g., "leather goods", "wooden furniture")
+- Primary function (e.g., "kitchen tools", "office supplies")
+
+Prefer the product type when it is clear, and reuse the same category for products of the same type. For example, "Handmade Ceramic Coffee Mug 350ml" belongs in "ceramic mug", "Walnut Bedside Table with Drawer" in "wooden furniture", and "Wireless Ergonomic Mouse" in "computer accessories".
+
+COLLECTION DESCRIPTION GUIDE
+
+A collection description introduces a collection of products sharing a tag, on the collection's page. The description should:
+- Be creative and unique to this specific collection
+- Highlight the key features or benefits of products in this category
+- Be written in an engaging, conversational tone
+- Include appropriate HTML formatting (paragraphs, maybe a list of features)
+- Be 3-5 paragraphs in length
+- Focus on quality, value, and product benefits
+- Use h2 or h3 tags for any headings (never h1)
+- Mention example products by name only where it reads naturally
+- Not make claims about shipping, pricing, stock or guarantees
+
+META DESCRIPTION GUIDE
+
+A meta description is the text search engines show under a collection's page title. The meta description should:
+- Be 150-160 characters maximum
+- Include the collection name (the collection's tag)
+- Be compelling and encourage clicks
+- NOT make claims about shipping, pricing, or guarantees
+- Focus on the value proposition of the collection
+- Be plain text with no HTML, quotes or emoji"""
+
+TAGGING_ROLE = "You are a product tagging expert that generates specific, meaningful tags that avoid generic terms and focus on distinctive product attributes."
+
+TAGS_INSTRUCTIONS = """Your task is to analyze the product information in the user's message and generate comprehensive, specific tags following the tagging guide.
+
+Return only the tags as a comma-separated list with no additional text, categories, or explanation."""
+
+TAGS_MULTI_INSTRUCTIONS = """Your task is to analyze each of the products in the user's message and generate comprehensive, specific tags for it following the tagging guide. Tag every product on its own merits, even if products are similar.
+
+Return only a JSON object that maps each Product ID to its list of tags, for example {"123": ["first tag", "second tag"]}, with no additional text or explanation."""
+
+CATEGORY_ROLE = "You are a product categorization expert that determines specific, meaningful categories for products, avoiding generic terms."
+
+CATEGORY_INSTRUCTIONS = """Your task is to analyze the product information in the user's message and determine the single most appropriate primary category for it, following the category guide.
+
+Return only the category name with no additional text or explanation."""
+
+COLLECTION_DESCRIPTION_ROLE = "You are a creative copywriter specializing in e-commerce collection descriptions that are engaging, informative, and optimized for conversion."
+
+COLLECTION_DESCRIPTION_INSTRUCTIONS = """Create a unique, engaging description for the collection of products in the user's message, using its tag, product count and example products, following the collection description guide.
+
+Return only the HTML content with no additional text, categories, or explanation."""
+
+META_DESCRIPTION_ROLE = "You are an SEO expert who creates compelling meta descriptions that drive clicks while staying within character limits."
+
+META_DESCRIPTION_INSTRUCTIONS = """Create a concise, SEO-friendly meta description for the collection of products in the user's message, following the meta description guide.
+
+Return only the meta description text with no additional explanation."""
+
+def cached_system_prompt(role, instructions):
+    """System prompt blocks: the catalog guide with a prompt cache breakpoint after it, then the role and task."""
+    return [
+        {"type": "text", "text": CATALOG_GUIDE, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": f"{role}\n\n{instructions}"}
+    ]
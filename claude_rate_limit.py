@@ -0,0 +1,102 @@
+"""
+Adaptive concurrency limit for Claude API calls.
+How many calls Claude accepts at once depends on the account's rate limits and
+on how busy the API is, so instead of a fixed number of calls in flight the
+limit is found with AIMD, as TCP does: it grows by about one call per round of
+successful calls while latency stays close to the best seen, and halves when
+Claude answers 429 (rate limited) or 529 (overloaded). A Retry-After on those
+responses holds back every caller until it has passed.
+"""
+
+import time
+import asyncio
+from config import Config
+
+# Statuses that mean Claude wants fewer calls; they lower the limit and are retried
+THROTTLED_STATUSES = {429, 529}
+
+# Statuses that are retried without lowering the limit
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+
+# Concurrency only grows while the average latency is within this factor of the best seen
+LATENCY_TOLERANCE = 2.0
+
+# Limit kept after a throttled call
+DECREASE_FACTOR = 0.5
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on Claude calls in flight, shared by every call on the client's event loop."""
+    
+    def __init__(self, initial=None, minimum=1, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum or Config.CLAUDE_MAX_CONCURRENT_CALLS
+        self.limit = float(min(self.maximum, max(self.minimum, initial or Config.CLAUDE_INITIAL_CONCURRENT_CALLS)))
+        
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency = None
+        self._best_latency = None
+        self._succeeded = 0
+        self._throttled = 0
+        self._failed = 0
+        self._condition = asyncio.Condition()
+    
+    async def acquire(self):
+        """Wait for a free slot under the limit and any Retry-After pause. Returns the start time."""
+        async with self._condition:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    timeout = self._paused_until - now
+                elif self._in_flight < int(self.limit):
+                    self._in_flight += 1
+                    return now
+                else:
+                    timeout = None
+                
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+    
+    async def release(self, started, outcome, retry_after=None):
+        """Free a slot and adjust the limit for the call's outcome: success, throttled or error."""
+        async with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            
+            if outcome == 'success':
+                self._succeeded += 1
+                latency = now - started
+                self._best_latency = latency if self._best_latency is None else min(self._best_latency, latency)
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+                
+                # Additive increase: about one more call per limit's worth of healthy responses
+                if self._latency <= self._best_latency * LATENCY_TOLERANCE:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == 'throttled':
+                self._throttled += 1
+                
+                # Multiplicative decrease, once per round trip however many calls in it were throttled
+                if now - self._last_decrease >= (self._latency or 0):
+                    self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                    self._last_decrease = now
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + retry_after)
+            else:
+                self._failed += 1
+            
+            self._condition.notify_all()
+    
+    def status(self):
+        """Return the current limit, calls in flight, and call outcomes so far."""
+        return {
+            'limit': int(self.limit),
+            'in_flight': self._in_flight,
+            'paused_seconds': round(max(0.0, self._paused_until - time.monotonic()), 2),
+            'latency_seconds': round(self._latency, 3) if self._latency is not None else None,
+            'succeeded': self._succeeded,
+            'throttled': self._throttled,
+            'failed': self._failed
+        }
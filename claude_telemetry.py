@@ -0,0 +1,214 @@
+"""
+Telemetry for Claude API calls.
+Every call is recorded with its model, prompt kind, token usage (including
+prompt cache reads and writes), latency, retries and outcome, and added to
+running totals for the store and job it was made for, so batch sizes and
+concurrency can be tuned against real numbers and the bill explained.
+Calls are attributed with claude_call_context, which jobs and routes wrap
+their work in.
+"""
+
+import math
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from config import Config
+
+# Store and job that Claude calls made in the current context are for
+_call_context = contextvars.ContextVar('claude_call_context', default={})
+
+# Price in USD per million input and output tokens, by model; unlisted models are priced like Sonnet
+MODEL_PRICES = {
+    'claude-3-7-sonnet-20250219': (3.00, 15.00),
+    'claude-3-5-sonnet-20241022': (3.00, 15.00),
+    'claude-3-5-haiku-20241022': (0.80, 4.00),
+    'claude-3-opus-20240229': (15.00, 75.00)
+}
+DEFAULT_PRICE = (3.00, 15.00)
+
+# Prompt cache writes and reads are billed relative to the input price, and batched calls at half price
+CACHE_WRITE_PRICE_FACTOR = 1.25
+CACHE_READ_PRICE_FACTOR = 0.1
+BATCH_PRICE_FACTOR = 0.5
+
+# Latency percentiles reported for every set of calls
+LATENCY_PERCENTILES = (50, 90, 99)
+
+@contextmanager
+def claude_call_context(store_id=None, job_id=None):
+    """Attribute the Claude calls made inside the block, including from tasks it starts, to a store and job."""
+    token = _call_context.set({'store_id': store_id, 'job_id': job_id})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+def current_call_context():
+    """The store and job that Claude calls made now are for."""
+    return _call_context.get()
+
+def usage_tokens(usage, name):
+    """A token count from a response's usage, whether the client's object or a plain dict, 0 if absent."""
+    if usage is None:
+        return 0
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return value or 0
+
+def call_cost(call):
+    """Estimated cost of a recorded call in USD."""
+    input_price, output_price = MODEL_PRICES.get(call['model'], DEFAULT_PRICE)
+    cost = (
+        call['input_tokens'] * input_price
+        + call['cache_creation_input_tokens'] * input_price * CACHE_WRITE_PRICE_FACTOR
+        + call['cache_read_input_tokens'] * input_price * CACHE_READ_PRICE_FACTOR
+        + call['output_tokens'] * output_price
+    ) / 1_000_000
+    return cost * BATCH_PRICE_FACTOR if call['batch'] else cost
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+class UsageTotals:
+    """Running totals for a set of Claude calls, with their most recent latencies for percentiles."""
+    
+    def __init__(self, by_kind=True):
+        self.calls = 0
+        self.outcomes = {}
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cost = 0.0
+        self.latencies = deque(maxlen=Config.CLAUDE_TELEMETRY_LATENCY_SAMPLES)
+        self.by_kind = {} if by_kind else None
+    
+    def add(self, call):
+        """Add a recorded call to the totals."""
+        self.calls += 1
+        self.outcomes[call['outcome']] = self.outcomes.get(call['outcome'], 0) + 1
+        self.retries += call['retries']
+        self.input_tokens += call['input_tokens']
+        self.output_tokens += call['output_tokens']
+        self.cache_creation_input_tokens += call['cache_creation_input_tokens']
+        self.cache_read_input_tokens += call['cache_read_input_tokens']
+        self.cost += call['cost_usd']
+        
+        # Batched calls have no latency of their own
+        if call['latency_seconds'] is not None:
+            self.latencies.append(call['latency_seconds'])
+        
+        if self.by_kind is not None:
+            self.by_kind.setdefault(call['prompt_kind'], UsageTotals(by_kind=False)).add(call)
+    
+    def summary(self):
+        """Totals as a dict, with latency percentiles and the share of prompt tokens read from the prompt cache."""
+        latencies = list(self.latencies)
+        prompt_tokens = self.input_tokens + self.cache_creation_input_tokens + self.cache_read_input_tokens
+        summary = {
+            'calls': self.calls,
+            'outcomes': dict(self.outcomes),
+            'retries': self.retries,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cache_creation_input_tokens': self.cache_creation_input_tokens,
+            'cache_read_input_tokens': self.cache_read_input_tokens,
+            'cache_read_ratio': round(self.cache_read_input_tokens / prompt_tokens, 3) if prompt_tokens else 0.0,
+            'cost_usd': round(self.cost, 4),
+            'latency_seconds': {
+                'average': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                **{f'p{pct}': round(percentile(latencies, pct), 3) if latencies else None for pct in LATENCY_PERCENTILES},
+                'max': round(max(latencies), 3) if latencies else None
+            }
+        }
+        if self.by_kind is not None:
+            summary['by_kind'] = {kind: totals.summary() for kind, totals in self.by_kind.items()}
+        return summary
+
+class ClaudeTelemetry:
+    """Records every Claude call and keeps totals overall, per store and per running job."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = UsageTotals()
+        self.stores = {}
+        self.jobs = {}
+        self.job_stores = {}
+        self.recent = deque(maxlen=Config.CLAUDE_TELEMETRY_RECENT_CALLS)
+    
+    def record(self, model, prompt_kind, usage, latency, retries=0, outcome='success', context=None, batch=False):
+        """Record a call and add it to the totals of its store and job.
+        
+        usage is the response's usage (None for a failed call), latency the
+        seconds the last attempt took (None for batched calls), and context the
+        current_call_context() of the code that made the call.
+        """
+        context = context if context is not None else current_call_context()
+        call = {
+            'at': datetime.utcnow().isoformat(),
+            'model': model,
+            'prompt_kind': prompt_kind,
+            'store_id': context.get('store_id'),
+            'job_id': context.get('job_id'),
+            'input_tokens': usage_tokens(usage, 'input_tokens'),
+            'output_tokens': usage_tokens(usage, 'output_tokens'),
+            'cache_creation_input_tokens': usage_tokens(usage, 'cache_creation_input_tokens'),
+            'cache_read_input_tokens': usage_tokens(usage, 'cache_read_input_tokens'),
+            'latency_seconds': round(latency, 3) if latency is not None else None,
+            'retries': retries,
+            'outcome': outcome,
+            'batch': batch
+        }
+        call['cost_usd'] = call_cost(call)
+        
+        with self._lock:
+            self.recent.append(call)
+            self.total.add(call)
+            self.stores.setdefault(call['store_id'], UsageTotals()).add(call)
+            if call['job_id'] is not None:
+                self.jobs.setdefault(call['job_id'], UsageTotals()).add(call)
+                self.job_stores[call['job_id']] = call['store_id']
+        
+        print(f"Claude {prompt_kind} call {outcome}"
+              f"{f' in {latency:.2f}s' if latency is not None else ' (batch)'}"
+              f"{f' after {retries} retries' if retries else ''}: "
+              f"{call['input_tokens']} input tokens, {call['cache_read_input_tokens']} read from and "
+              f"{call['cache_creation_input_tokens']} written to the prompt cache, {call['output_tokens']} output tokens")
+        return call
+    
+    def finish_job(self, job_id):
+        """Stop tracking a finished job and return its summary, or None if it made no Claude calls."""
+        with self._lock:
+            totals = self.jobs.pop(job_id, None)
+            self.job_stores.pop(job_id, None)
+            return totals.summary() if totals else None
+    
+    def summary(self, store_id=None, recent=0):
+        """Totals overall, by store and for running jobs, or only for one store and its running jobs.
+        
+        recent is how many of the most recent calls to include as recorded.
+        """
+        with self._lock:
+            if store_id is None:
+                summary = {
+                    'total': self.total.summary(),
+                    'stores': {str(store): totals.summary() for store, totals in self.stores.items()}
+                }
+            else:
+                totals = self.stores.get(store_id)
+                summary = {'store_id': store_id, 'total': totals.summary() if totals else UsageTotals().summary()}
+            
+            summary['running_jobs'] = {
+                str(job_id): totals.summary() for job_id, totals in self.jobs.items()
+                if store_id is None or self.job_stores.get(job_id) == store_id
+            }
+            
+            calls = [call for call in self.recent if store_id is None or call['store_id'] == store_id]
+            summary['recent_calls'] = calls[-recent:] if recent else []
+            return summary
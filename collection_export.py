@@ -0,0 +1,198 @@
+"""
+Resumable export of a store's collections to Shopify.
+Each collection is an item in a persistent export job whose state (pending,
+in_flight, done or failed) is committed as soon as it changes, so an
+interrupted export picks up where it stopped. Before creating anything, a
+collection's handle is looked up in Shopify, which keeps re-runs idempotent.
+"""
+
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update
+from config import Config
+from models import db, Collection, ExportJob, ExportJobItem, Product, Tag
+from shopify_integration import shopify_handle
+from sync_outbox import mark_pushed
+
+# Export jobs being run by this process, so the same job never runs twice at once
+_running_jobs = set()
+_running_jobs_lock = threading.Lock()
+
+def get_or_create_export_job(store):
+    """Get the store's unfinished collection export job, or start a new one.
+    
+    Collections that are not exported yet and not already in the job are added
+    to it, so resuming also picks up collections created since. Returns None
+    when there is nothing to export.
+    """
+    store_id = store.id if store else None
+    
+    collection_query = db.session.query(Collection.id).filter(Collection.shopify_id.is_(None))
+    if store:
+        collection_query = collection_query.filter(Collection.store_id == store_id)
+    collection_ids = [collection_id for (collection_id,) in collection_query.order_by(Collection.id)]
+    
+    job = (
+        ExportJob.query
+        .filter(ExportJob.store_id == store_id)
+        .filter(ExportJob.status.in_(['pending', 'running', 'failed']))
+        .order_by(ExportJob.id.desc())
+        .first()
+    )
+    if not job:
+        if not collection_ids:
+            return None
+        job = ExportJob(store_id=store_id)
+        db.session.add(job)
+        db.session.flush()
+    
+    queued = set(collection_id for (collection_id,) in db.session.query(ExportJobItem.collection_id).filter_by(job_id=job.id))
+    for collection_id in collection_ids:
+        if collection_id not in queued:
+            db.session.add(ExportJobItem(job_id=job.id, collection_id=collection_id))
+    
+    db.session.commit()
+    return job
+
+def export_collection(shopify, collection):
+    """Export one collection unless Shopify already has it.
+    
+    Returns (error, note). Either way the collection's shopify_id is recorded,
+    for smart collections as well as custom ones, and once it is created its
+    pending outbox entries are marked pushed. The caller commits.
+    """
+    if collection.shopify_id:
+        return None, 'Already exported'
+    
+    # A collection created by an interrupted attempt, or whose id was never recorded, is found by its handle
+    existing = shopify.find_collection_by_handle(collection.slug or shopify_handle(collection.name))
+    if 'error' in existing:
+        return existing['error'], None
+    if existing:
+        collection.shopify_id = existing['id']
+        return None, 'Found existing collection in Shopify'
+    
+    # Smart collections are exported with the products carrying their tag
+    if collection.tag:
+        original_products = collection.products
+        collection.products = Product.query.join(Product.tags).filter(Tag.id == collection.tag_id).all()
+        result = shopify.export_collection_to_shopify(collection)
+        collection.products = original_products
+    else:
+        result = shopify.export_collection_to_shopify(collection)
+    
+    if 'error' in result:
+        return result['error'], None
+    
+    for kind in ('custom_collection', 'smart_collection'):
+        if kind in result and 'id' in result[kind]:
+            collection.shopify_id = str(result[kind]['id'])
+    
+    # The collection was created with its current state, so its recorded changes need no push
+    mark_pushed('collection', collection.id)
+    
+    member_errors = result.get('member_errors')
+    return None, f"{len(member_errors)} products could not be added" if member_errors else None
+
+def export_job_item(app, shopify, item_id):
+    """Claim one pending item, export its collection and checkpoint the outcome."""
+    with app.app_context():
+        try:
+            # Claim the item; another worker or run may already have it
+            claimed = db.session.execute(
+                update(ExportJobItem)
+                .where(ExportJobItem.id == item_id, ExportJobItem.state == 'pending')
+                .values(state='in_flight', attempts=ExportJobItem.attempts + 1, updated_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                return None
+            
+            item = ExportJobItem.query.get(item_id)
+            collection = Collection.query.get(item.collection_id)
+            
+            if collection:
+                error, note = export_collection(shopify, collection)
+            else:
+                error, note = None, 'Collection was deleted locally'
+            
+            item.state = 'failed' if error else 'done'
+            item.error = error or note
+            db.session.commit()
+            
+            print(f"Collection {item.collection_id}: {item.state}{f' ({item.error})' if item.error else ''}")
+            return item.state
+        except Exception as e:
+            db.session.rollback()
+            db.session.execute(
+                update(ExportJobItem).where(ExportJobItem.id == item_id).values(state='failed', error=str(e))
+            )
+            db.session.commit()
+            print(f"Error exporting collection for job item {item_id}: {str(e)}")
+            return 'failed'
+        finally:
+            db.session.remove()
+
+def run_export_job(app, job_id, shopify, workers=None, progress=None):
+    """Run (or resume) an export job with concurrent workers.
+    
+    Items left in flight by an interrupted run, and items that failed, are
+    retried; the handle check makes that safe. All workers share the store's
+    rate governor. progress, if given, is called as items finish.
+    """
+    workers = workers or Config.SHOPIFY_EXPORT_WORKERS
+    
+    with _running_jobs_lock:
+        if job_id in _running_jobs:
+            return {'error': f'Export job {job_id} is already running'}
+        _running_jobs.add(job_id)
+    
+    try:
+        return _run_export_job(app, job_id, shopify, workers, progress)
+    finally:
+        with _running_jobs_lock:
+            _running_jobs.discard(job_id)
+
+def _run_export_job(app, job_id, shopify, workers, progress):
+    with app.app_context():
+        job = ExportJob.query.get(job_id)
+        if not job:
+            return {'error': f'Export job {job_id} not found'}
+        
+        db.session.execute(
+            update(ExportJobItem)
+            .where(ExportJobItem.job_id == job_id, ExportJobItem.state.in_(['in_flight', 'failed']))
+            .values(state='pending')
+        )
+        job.status = 'running'
+        job.started_at = job.started_at or datetime.utcnow()
+        db.session.commit()
+        
+        item_ids = [
+            item_id for (item_id,) in
+            db.session.query(ExportJobItem.id).filter_by(job_id=job_id, state='pending').order_by(ExportJobItem.id)
+        ]
+        print(f"Export job {job_id}: {len(item_ids)} collections to export with {workers} workers")
+        db.session.remove()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda item_id: export_job_item(app, shopify, item_id), item_ids)
+        failed = 0
+        for handled, state in enumerate(results, 1):
+            failed += state == 'failed'
+            if progress:
+                progress(handled, len(item_ids), errors=failed, message=f"Exported {handled - failed} collections")
+    
+    with app.app_context():
+        job = ExportJob.query.get(job_id)
+        counts = job.item_counts()
+        job.status = 'failed' if counts['failed'] else 'completed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        
+        result = job.to_dict()
+        db.session.remove()
+    
+    print(f"Export job {job_id} {result['status']}: {counts['done']} done, {counts['failed']} failed")
+    return result
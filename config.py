@@ -13,10 +13,81 @@ class Config:
     # Claude API key
     ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY', '')
     
+    # Claude calls in flight (adapted between 1 and the maximum, starting from the initial value), and keep-alive connections shared by all of them
+    CLAUDE_INITIAL_CONCURRENT_CALLS = int(os.environ.get('CLAUDE_INITIAL_CONCURRENT_CALLS', '10'))
+    CLAUDE_MAX_CONCURRENT_CALLS = int(os.environ.get('CLAUDE_MAX_CONCURRENT_CALLS', '100'))
+    CLAUDE_POOL_SIZE = int(os.environ.get('CLAUDE_POOL_SIZE', '100'))
+    
+    # Retries for rate limited, overloaded or failed Claude calls
+    CLAUDE_MAX_RETRIES = int(os.environ.get('CLAUDE_MAX_RETRIES', '6'))
+    
+    # Products tagged per Claude request (1 sends each product on its own)
+    CLAUDE_TAGS_PER_REQUEST = int(os.environ.get('CLAUDE_TAGS_PER_REQUEST', '20'))
+    
+    # Message Batches API (seconds between status checks on unfinished batches, and per HTTP call)
+    CLAUDE_BATCH_POLL_INTERVAL = float(os.environ.get('CLAUDE_BATCH_POLL_INTERVAL', '60'))
+    CLAUDE_BATCH_HTTP_TIMEOUT = float(os.environ.get('CLAUDE_BATCH_HTTP_TIMEOUT', '60'))
+    
+    # Persistent cache of Claude results (SQLite file, relative to the instance folder, and results kept before the least recently used are evicted; 0 disables it)
+    CLAUDE_CACHE_PATH = os.environ.get('CLAUDE_CACHE_PATH', 'claude_cache.db')
+    CLAUDE_CACHE_MAX_ENTRIES = int(os.environ.get('CLAUDE_CACHE_MAX_ENTRIES', '100000'))
+    
+    # Claude call telemetry (latencies kept per store, job and prompt kind for percentiles, and recent calls kept for inspection)
+    CLAUDE_TELEMETRY_LATENCY_SAMPLES = int(os.environ.get('CLAUDE_TELEMETRY_LATENCY_SAMPLES', '1000'))
+    CLAUDE_TELEMETRY_RECENT_CALLS = int(os.environ.get('CLAUDE_TELEMETRY_RECENT_CALLS', '200'))
+    
     # Shopify credentials
     SHOPIFY_ACCESS_TOKEN = os.environ.get('SHOPIFY_ACCESS_TOKEN', '')
     SHOPIFY_STORE_URL = os.environ.get('SHOPIFY_STORE_URL', '')
     
+    # Shopify HTTP transport (connections kept alive per store)
+    SHOPIFY_POOL_SIZE = int(os.environ.get('SHOPIFY_POOL_SIZE', '10'))
+    SHOPIFY_CONNECT_TIMEOUT = float(os.environ.get('SHOPIFY_CONNECT_TIMEOUT', '5'))
+    SHOPIFY_READ_TIMEOUT = float(os.environ.get('SHOPIFY_READ_TIMEOUT', '30'))
+    
+    # Shopify rate limiting (calls kept free in the bucket, and retries on 429/5xx)
+    SHOPIFY_RATE_HEADROOM = int(os.environ.get('SHOPIFY_RATE_HEADROOM', '2'))
+    SHOPIFY_MAX_RETRIES = int(os.environ.get('SHOPIFY_MAX_RETRIES', '5'))
+    
+    # Concurrent Shopify reads (e.g. collection memberships), all sharing the rate limit
+    SHOPIFY_FETCH_WORKERS = int(os.environ.get('SHOPIFY_FETCH_WORKERS', '4'))
+    
+    # Products updated per GraphQL request when exporting in bulk
+    SHOPIFY_GRAPHQL_BATCH_SIZE = int(os.environ.get('SHOPIFY_GRAPHQL_BATCH_SIZE', '25'))
+    
+    # Concurrent workers for collection export jobs, all sharing the rate limit
+    SHOPIFY_EXPORT_WORKERS = int(os.environ.get('SHOPIFY_EXPORT_WORKERS', '4'))
+    
+    # Shopify imports (products written per chunk; bulk operations polled until done)
+    SHOPIFY_IMPORT_CHUNK_SIZE = int(os.environ.get('SHOPIFY_IMPORT_CHUNK_SIZE', '250'))
+    SHOPIFY_BULK_POLL_INTERVAL = float(os.environ.get('SHOPIFY_BULK_POLL_INTERVAL', '5'))
+    SHOPIFY_BULK_TIMEOUT = float(os.environ.get('SHOPIFY_BULK_TIMEOUT', '3600'))
+    
+    # Incremental syncs re-read this many seconds before the last watermark
+    SHOPIFY_SYNC_OVERLAP_SECONDS = int(os.environ.get('SHOPIFY_SYNC_OVERLAP_SECONDS', '300'))
+    
+    # Shopify webhooks (HMAC secret, and how queued events are applied)
+    SHOPIFY_WEBHOOK_SECRET = os.environ.get('SHOPIFY_WEBHOOK_SECRET', '')
+    WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '500'))
+    WEBHOOK_FLUSH_INTERVAL = float(os.environ.get('WEBHOOK_FLUSH_INTERVAL', '2'))
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '5'))
+    
+    # Outbox of local changes pushed to Shopify (entries per batch, attempts before giving up)
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '100'))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '5'))
+    
+    # Background job workers for long operations (auto-tagging, imports, bulk exports)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', str(os.cpu_count() or 2)))
+    
+    # Job progress stream (seconds between events, throughput window, and when a job counts as stalled)
+    JOB_PROGRESS_INTERVAL = float(os.environ.get('JOB_PROGRESS_INTERVAL', '1'))
+    JOB_THROUGHPUT_WINDOW = float(os.environ.get('JOB_THROUGHPUT_WINDOW', '10'))
+    JOB_STALL_SECONDS = float(os.environ.get('JOB_STALL_SECONDS', '60'))
+    
+    # Job heartbeats (seconds between refreshes, and without one before a running job's process counts as stopped)
+    JOB_HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', '15'))
+    JOB_HEARTBEAT_TIMEOUT = float(os.environ.get('JOB_HEARTBEAT_TIMEOUT', '90'))
+    
     # Default environment variables
     DEFAULT_ENV_VARS = {
         'ANTHROPIC_API_KEY': '',
@@ -0,0 +1,69 @@
+"""
+Script to export a store's collections to Shopify.
+Progress is checkpointed per collection, so running it again after an
+interruption resumes the same export job without creating duplicates.
+"""
+
+import sys
+from flask import Flask
+from models import db, Store
+from shopify_integration import ShopifyIntegration
+from collection_export import get_or_create_export_job, run_export_job
+from config import Config
+
+def main():
+    """
+    Main function to export a store's collections.
+    
+    Usage:
+        python export_collections.py <store_id>
+    """
+    if len(sys.argv) < 2:
+        print("Usage: python export_collections.py <store_id>")
+        sys.exit(1)
+    
+    try:
+        store_id = int(sys.argv[1])
+    except ValueError:
+        print("Error: store_id must be an integer")
+        sys.exit(1)
+    
+    # Create a Flask app
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    
+    # Initialize the database
+    db.init_app(app)
+    
+    with app.app_context():
+        db.create_all()
+        
+        store = Store.query.get(store_id)
+        if not store:
+            print(f"Error: Store with ID {store_id} not found")
+            sys.exit(1)
+        
+        shopify = ShopifyIntegration(
+            access_token=store.access_token or Config.SHOPIFY_ACCESS_TOKEN,
+            store_url=f"https://{store.url}"
+        )
+        
+        job = get_or_create_export_job(store)
+        if not job:
+            print("No collections to export")
+            return
+        job_id = job.id
+        print(f"Exporting collections for store: {store.name} (ID: {store.id}), job {job_id}")
+    
+    result = run_export_job(app, job_id, shopify)
+    
+    if 'error' in result:
+        print(f"Error: {result['error']}")
+        sys.exit(1)
+    
+    print(f"Done: {result['items']['done']} exported, {result['items']['failed']} failed")
+    if result['items']['failed']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -33,11 +33,13 @@ class TagForm(FlaskForm):
 
 class AutoTagForm(FlaskForm):
     """Form for auto-tagging products."""
+    use_batch = BooleanField('Overnight batch (cheaper, results within 24 hours)')
     submit = SubmitField('Auto-Tag Selected Products')
 
 class CreateCollectionsForm(FlaskForm):
     """Form for creating collections from tags."""
     exclude_imported_tags = BooleanField('Only use tags generated by Claude (exclude imported tags)')
+    use_batch = BooleanField('Categorize untagged products in an overnight batch')
     submit = SubmitField('Create Collections from Tags')
 
 class StoreForm(FlaskForm):
@@ -45,6 +47,10 @@ class StoreForm(FlaskForm):
     name = StringField('Store Name', validators=[DataRequired(), Length(max=255)])
     url = StringField('Store URL', validators=[DataRequired(), Length(max=255)])
     access_token = StringField('Access Token', validators=[Optional(), Length(max=255)])
+    import_mode = SelectField('Product Import Mode', choices=[
+        ('rest', 'REST (paged, best for small catalogs)'),
+        ('bulk', 'GraphQL bulk operation (best for large catalogs)')
+    ], default='rest')
     submit = SubmitField('Save')
 
 class StoreSelectForm(FlaskForm):
@@ -0,0 +1,270 @@
+"""
+Background job runner for long-running operations.
+Routes record a job in the jobs table and return straight away; a pool of
+JOB_WORKERS threads then runs the job's task in its own app context, keeping
+status, progress, timing and the result or error up to date on the job row.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update, or_
+from config import Config
+from models import db, Job, Store
+from shopify_rate_limit import get_governor, get_cost_governor
+from claude_telemetry import claude_call_context
+
+# Task functions by job kind, registered with @task
+TASKS = {}
+
+def task(kind):
+    """Register a function as the task run for jobs of the given kind."""
+    def register(func):
+        TASKS[kind] = func
+        return func
+    return register
+
+class JobContext:
+    """What a running task gets: its job's store, the app's services and progress reporting."""
+    
+    def __init__(self, job_id, store, services):
+        self.job_id = job_id
+        self.store = store
+        self.claude = services.get('claude')
+        self.shopify = services.get('shopify')
+    
+    def progress(self, current, total=None, errors=None, message=None):
+        """Record the job's progress: items done, items in all, items failed and the current batch.
+        
+        This commits the task's session, so call it between units of work.
+        Service methods take this as their progress hook.
+        """
+        values = {'progress_current': current, 'progress_at': datetime.utcnow()}
+        if total is not None:
+            values['progress_total'] = total
+        if errors is not None:
+            values['error_count'] = errors
+        if message is not None:
+            values['message'] = message
+        
+        db.session.execute(update(Job).where(Job.id == self.job_id).values(**values))
+        db.session.commit()
+
+class JobRunner:
+    """Pool of worker threads that runs queued jobs.
+    
+    Several processes (gunicorn workers, the debug reloader) can each have a
+    runner on the same database. A runner records itself as the owner of the
+    jobs it runs and refreshes their heartbeat every JOB_HEARTBEAT_INTERVAL
+    seconds, so only jobs whose process has stopped are given up on.
+    """
+    
+    def __init__(self, app, workers=None, **services):
+        self.app = app
+        self.workers = workers or Config.JOB_WORKERS
+        self.services = services
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job-worker')
+        
+        # Jobs handed to this runner's pool that haven't finished
+        self._submitted = set()
+        self._submitted_lock = threading.Lock()
+        
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+    
+    def start(self):
+        """Recover jobs orphaned by stopped processes, then keep this runner's jobs' heartbeats fresh."""
+        with self.app.app_context():
+            try:
+                self.recover_orphaned_jobs(queued_before=datetime.utcnow())
+            finally:
+                db.session.remove()
+        
+        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+            return
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+        self._heartbeat_thread.start()
+    
+    def stop(self):
+        """Stop refreshing heartbeats; jobs still running are left for another process to recover."""
+        self._stop.set()
+    
+    def recover_orphaned_jobs(self, queued_before=None):
+        """Fail running jobs whose heartbeat is stale and run queued jobs no live pool has picked up.
+        
+        A stale heartbeat means the process running the job has stopped. Queued
+        jobs recorded before queued_before (by default, more than
+        JOB_HEARTBEAT_TIMEOUT seconds ago) are handed to this runner's pool; the
+        claim in _run keeps a job another pool also has from running twice.
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=Config.JOB_HEARTBEAT_TIMEOUT)
+        queued_before = queued_before or stale_before
+        
+        interrupted = (
+            Job.query
+            .filter(Job.status == 'running')
+            .filter(or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < stale_before))
+            .update({
+                'status': 'failed',
+                'error': 'Interrupted: the process running it stopped',
+                'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+        )
+        db.session.commit()
+        if interrupted:
+            print(f"Marked {interrupted} interrupted jobs as failed")
+        
+        queued_ids = [
+            job_id for (job_id,) in
+            db.session.query(Job.id)
+            .filter(Job.status == 'queued', Job.created_at <= queued_before)
+            .order_by(Job.id)
+        ]
+        with self._submitted_lock:
+            orphaned_ids = [job_id for job_id in queued_ids if job_id not in self._submitted]
+        for job_id in orphaned_ids:
+            self._submit(job_id)
+        if orphaned_ids:
+            print(f"Queued {len(orphaned_ids)} jobs left waiting by another process")
+    
+    def _heartbeat(self):
+        while not self._stop.wait(Config.JOB_HEARTBEAT_INTERVAL):
+            with self.app.app_context():
+                try:
+                    db.session.execute(
+                        update(Job)
+                        .where(Job.worker_id == self.worker_id, Job.status == 'running')
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    db.session.commit()
+                    self.recover_orphaned_jobs()
+                except Exception as e:
+                    print(f"Error refreshing job heartbeats: {str(e)}")
+                finally:
+                    db.session.remove()
+    
+    def _submit(self, job_id):
+        with self._submitted_lock:
+            self._submitted.add(job_id)
+        self._executor.submit(self._run, job_id)
+    
+    def enqueue(self, kind, store=None, **params):
+        """Record a job and hand it to the worker pool. Params must be JSON serializable."""
+        if kind not in TASKS:
+            raise ValueError(f'Unknown job kind: {kind}')
+        
+        job = Job(kind=kind, store_id=store.id if store else None, params=json.dumps(params))
+        db.session.add(job)
+        db.session.commit()
+        
+        self._submit(job.id)
+        return job
+    
+    def _run(self, job_id):
+        try:
+            self._run_job(job_id)
+        finally:
+            with self._submitted_lock:
+                self._submitted.discard(job_id)
+    
+    def _run_job(self, job_id):
+        with self.app.app_context():
+            try:
+                # Claim the job so it can only ever run once
+                claimed = db.session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == 'queued')
+                    .values(status='running', started_at=datetime.utcnow(),
+                            worker_id=self.worker_id, heartbeat_at=datetime.utcnow())
+                ).rowcount
+                db.session.commit()
+                if not claimed:
+                    db.session.remove()
+                    return
+                
+                job = Job.query.get(job_id)
+                store = Store.query.get(job.store_id) if job.store_id else None
+                print(f"Job {job_id} ({job.kind}) started")
+                
+                # Claude calls made by the task are totalled for the job and its store
+                with claude_call_context(store_id=job.store_id, job_id=job_id):
+                    result = TASKS[job.kind](JobContext(job_id, store, self.services), **json.loads(job.params or '{}'))
+                db.session.commit()
+                
+                error = result.get('error') if isinstance(result, dict) else None
+                values = {
+                    'status': 'failed' if error else 'completed',
+                    'result': json.dumps(result, default=str),
+                    'error': error
+                }
+            except Exception as e:
+                db.session.rollback()
+                values = {'status': 'failed', 'error': str(e)}
+            
+            # Summary of the job's Claude calls, kept with the job whether it completed or failed
+            claude = self.services.get('claude')
+            claude_usage = claude.telemetry.finish_job(job_id) if claude else None
+            if claude_usage:
+                values['claude_usage'] = json.dumps(claude_usage)
+            
+            try:
+                db.session.execute(
+                    update(Job).where(Job.id == job_id).values(finished_at=datetime.utcnow(), **values)
+                )
+                db.session.commit()
+                print(f"Job {job_id} {values['status']}{': ' + values['error'] if values['error'] else ''}")
+            except Exception as e:
+                print(f"Error recording the outcome of job {job_id}: {str(e)}")
+            finally:
+                db.session.remove()
+
+def job_event_stream(job_id, store_url=None, interval=None):
+    """Yield server-sent events with a job's progress until it finishes.
+    
+    Each event carries the job's progress along with the throughput over the
+    last JOB_THROUGHPUT_WINDOW seconds, a stalled flag once no progress has
+    been reported for JOB_STALL_SECONDS, and the Shopify rate limit state for
+    store_url, so a rate-limit storm shows up as a climbing throttled count.
+    """
+    interval = interval or Config.JOB_PROGRESS_INTERVAL
+    samples = deque()
+    
+    while True:
+        job = Job.query.get(job_id)
+        if not job:
+            yield f"event: error\ndata: {json.dumps({'error': f'Job {job_id} not found'})}\n\n"
+            return
+        
+        data = job.to_dict()
+        progress = data['progress']
+        
+        # Recent throughput shows a slowdown sooner than the average since the start
+        now = time.monotonic()
+        samples.append((now, progress['current']))
+        while len(samples) > 2 and now - samples[1][0] >= Config.JOB_THROUGHPUT_WINDOW:
+            samples.popleft()
+        window = samples[-1][0] - samples[0][0]
+        progress['recent_throughput'] = round((samples[-1][1] - samples[0][1]) / window, 2) if window > 0 else None
+        progress['stalled'] = (progress['seconds_since_progress'] or 0) >= Config.JOB_STALL_SECONDS
+        
+        if store_url:
+            data['shopify_rate_limit'] = {
+                'rest': get_governor(store_url).status(),
+                'graphql': get_cost_governor(store_url).status()
+            }
+        
+        finished = job.status in ('completed', 'failed')
+        yield f"event: {'done' if finished else 'progress'}\ndata: {json.dumps(data, default=str)}\n\n"
+        if finished:
+            return
+        
+        # Don't hold a pooled connection while waiting for the next poll
+        db.session.close()
+        time.sleep(interval)
@@ -1,4 +1,8 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.orm import Session
+from contextlib import contextmanager
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -25,6 +29,8 @@ class Store(db.Model):
     name = db.Column(db.String(255), nullable=False)
     url = db.Column(db.String(255), nullable=False, unique=True)
     access_token = db.Column(db.String(255))
+    import_mode = db.Column(db.String(20), default='rest')  # 'rest' (paged) or 'bulk' (GraphQL bulk operation)
+    products_synced_at = db.Column(db.DateTime)  # Watermark of the last successful product sync (UTC)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -41,6 +47,8 @@ class Store(db.Model):
             'id': self.id,
             'name': self.name,
             'url': self.url,
+            'import_mode': self.import_mode,
+            'products_synced_at': self.products_synced_at,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
@@ -59,6 +67,7 @@ class Product(db.Model):
     price = db.Column(db.Float)
     image_url = db.Column(db.String(500))
     shopify_id = db.Column(db.String(100))  # Shopify product ID for syncing
+    sync_hash = db.Column(db.String(64))  # Hash of title, description and tags as last synced with Shopify
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -160,3 +169,267 @@ class EnvVar(db.Model):
     
     def __repr__(self):
         return f'<EnvVar {self.key}>'
+
+class WebhookEvent(db.Model):
+    """Shopify webhook event queued for batched processing."""
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        db.Index('idx_webhook_event_processed_at', 'processed_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(100), nullable=False)  # e.g. products/update
+    shopify_id = db.Column(db.String(100))  # ID of the product or collection the event is about
+    payload = db.Column(db.Text, nullable=False)
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
+    # Store relationship
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.id'))
+    
+    def __repr__(self):
+        return f'<WebhookEvent {self.topic} {self.shopify_id}>'
+
+class SyncOutbox(db.Model):
+    """Local change to a product or collection waiting to be pushed to Shopify."""
+    __tablename__ = 'sync_outbox'
+    __table_args__ = (
+        db.Index('idx_sync_outbox_processed_at', 'processed_at'),
+        db.Index('idx_sync_outbox_entity', 'entity_type', 'entity_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)  # 'product' or 'collection'
+    entity_id = db.Column(db.Integer, nullable=False)  # Local ID of the changed row
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
+    # Store relationship
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.id'))
+    
+    def __repr__(self):
+        return f'<SyncOutbox {self.entity_type} {self.entity_id}>'
+
+class ExportJob(db.Model):
+    """Persistent, resumable export of a store's collections to Shopify."""
+    __tablename__ = 'export_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed or failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Store relationship
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.id'))
+    
+    # Relationships
+    items = db.relationship('ExportJobItem', backref='job', lazy='dynamic')
+    
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.status}>'
+    
+    def item_counts(self):
+        """Number of items in each state."""
+        counts = dict(
+            db.session.query(ExportJobItem.state, db.func.count(ExportJobItem.id))
+            .filter(ExportJobItem.job_id == self.id)
+            .group_by(ExportJobItem.state)
+            .all()
+        )
+        return {state: counts.get(state, 0) for state in ('pending', 'in_flight', 'done', 'failed')}
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'store_id': self.store_id,
+            'items': self.item_counts(),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class ExportJobItem(db.Model):
+    """One collection in an export job, with its checkpointed state."""
+    __tablename__ = 'export_job_items'
+    __table_args__ = (
+        db.Index('idx_export_job_item_state', 'job_id', 'state'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('export_jobs.id'), nullable=False)
+    collection_id = db.Column(db.Integer, db.ForeignKey('collections.id'), nullable=False)
+    state = db.Column(db.String(20), default='pending')  # pending, in_flight, done or failed
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ExportJobItem {self.collection_id} {self.state}>'
+
+class Job(db.Model):
+    """Long-running operation queued for the background job runner."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('idx_job_status', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # e.g. auto_tag, import_products
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed or failed
+    params = db.Column(db.Text)  # JSON arguments for the task
+    progress_current = db.Column(db.Integer, default=0)
+    progress_total = db.Column(db.Integer)
+    error_count = db.Column(db.Integer, default=0)  # Items that failed so far
+    message = db.Column(db.Text)  # Current batch or stage
+    progress_at = db.Column(db.DateTime)  # When progress was last reported
+    result = db.Column(db.Text)  # JSON result of a completed task
+    error = db.Column(db.Text)
+    claude_usage = db.Column(db.Text)  # JSON summary of the Claude calls the job made
+    worker_id = db.Column(db.String(100))  # Runner (host, process) that claimed the job
+    heartbeat_at = db.Column(db.DateTime)  # Last time that runner reported the job still running
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Store relationship
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.id'))
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+    
+    def to_dict(self):
+        now = datetime.utcnow()
+        elapsed = ((self.finished_at or now) - self.started_at).total_seconds() if self.started_at else None
+        current = self.progress_current or 0
+        
+        # Average rate since the job started, and the time left at that rate
+        throughput = current / elapsed if elapsed and current else None
+        eta_seconds = None
+        if throughput and self.progress_total and self.status == 'running':
+            eta_seconds = round(max(0, self.progress_total - current) / throughput, 1)
+        
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'store_id': self.store_id,
+            'progress': {
+                'current': current,
+                'total': self.progress_total,
+                'errors': self.error_count or 0,
+                'message': self.message,
+                'throughput': round(throughput, 2) if throughput else None,
+                'eta_seconds': eta_seconds,
+                'seconds_since_progress': round((now - (self.progress_at or self.started_at)).total_seconds(), 1)
+                if self.status == 'running' and (self.progress_at or self.started_at) else None
+            },
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'claude_usage': json.loads(self.claude_usage) if self.claude_usage else None,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration_seconds': round(elapsed, 2) if elapsed is not None else None
+        }
+
+class ClaudeBatch(db.Model):
+    """Claude Message Batches API batch, kept so its results can still be collected after a restart."""
+    __tablename__ = 'claude_batches'
+    __table_args__ = (
+        db.Index('idx_claude_batch_status', 'store_id', 'kind', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(100), unique=True, nullable=False)  # Anthropic's batch id
+    kind = db.Column(db.String(50), nullable=False)  # tags or collection_category
+    status = db.Column(db.String(20), default='in_progress')  # in_progress, ended or applied
+    product_ids = db.Column(db.Text, nullable=False)  # JSON list of the products in the batch
+    succeeded_count = db.Column(db.Integer, default=0)
+    errored_count = db.Column(db.Integer, default=0)
+    job_kind = db.Column(db.String(50))  # Job to run again once the batch ends
+    job_params = db.Column(db.Text)  # JSON params of that job
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    ended_at = db.Column(db.DateTime)
+    
+    # Store relationship
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.id'))
+    
+    def __repr__(self):
+        return f'<ClaudeBatch {self.batch_id} {self.kind} {self.status}>'
+
+# Attributes that are pushed to Shopify; changes to anything else are not recorded
+OUTBOX_TRACKED_FIELDS = {
+    'product': ('title', 'description', 'tags'),
+    'collection': ('name', 'slug', 'description', 'meta_description')
+}
+
+@contextmanager
+def outbox_suppressed(session=None):
+    """Don't record outbox entries for changes flushed inside this block."""
+    session = session or db.session
+    previous = session.info.get('outbox_suppressed', False)
+    session.info['outbox_suppressed'] = True
+    try:
+        yield
+    finally:
+        session.info['outbox_suppressed'] = previous
+
+def _tracked_changes(instance, fields):
+    """Check whether any of the given attributes changed in the pending flush."""
+    state = inspect(instance)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+@event.listens_for(Session, 'after_flush')
+def record_outbox_entries(session, flush_context):
+    """Write an outbox entry for every new or changed product and collection.
+    
+    Set-based writes (imports, webhooks) bypass the ORM and are never recorded,
+    so changes pulled from Shopify are not pushed straight back. Local deletes
+    of products and collections are not recorded either: deleting locally has
+    never touched Shopify. Deleting a tag is, as it changes the tag string of
+    every product that carried it.
+    """
+    if session.info.get('outbox_suppressed'):
+        return
+    
+    changed = {}
+    for instance in list(session.new) + list(session.dirty):
+        if isinstance(instance, Product):
+            entity_type = 'product'
+        elif isinstance(instance, Collection):
+            entity_type = 'collection'
+        elif isinstance(instance, Tag) and instance not in session.new:
+            # Renaming a tag changes the tag string of every product carrying it
+            if _tracked_changes(instance, ('name',)):
+                for product in instance.products:
+                    changed[('product', product.id)] = product.store_id
+            continue
+        else:
+            continue
+        
+        if instance in session.new or _tracked_changes(instance, OUTBOX_TRACKED_FIELDS[entity_type]):
+            changed[(entity_type, instance.id)] = instance.store_id
+    
+    for instance in session.deleted:
+        if isinstance(instance, Tag):
+            for product in instance.products:
+                if product not in session.deleted:
+                    changed[('product', product.id)] = product.store_id
+    
+    if changed:
+        session.connection().execute(insert(SyncOutbox), [
+            {
+                'entity_type': entity_type,
+                'entity_id': entity_id,
+                'store_id': store_id,
+                'attempts': 0,
+                'created_at': datetime.utcnow()
+            }
+            for (entity_type, entity_id), store_id in changed.items()
+        ])
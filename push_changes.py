@@ -0,0 +1,57 @@
+"""
+Script to push a store's locally changed products and collections to Shopify.
+Only entities recorded in the sync outbox are sent, so this is cheap to run
+from cron as often as needed.
+"""
+
+import sys
+from flask import Flask
+from models import db, Store
+from shopify_integration import ShopifyIntegration
+from sync_outbox import drain_outbox
+from config import Config
+
+def main():
+    """
+    Main function to push a store's pending changes.
+    
+    Usage:
+        python push_changes.py <store_id>
+    """
+    if len(sys.argv) < 2:
+        print("Usage: python push_changes.py <store_id>")
+        sys.exit(1)
+    
+    try:
+        store_id = int(sys.argv[1])
+    except ValueError:
+        print("Error: store_id must be an integer")
+        sys.exit(1)
+    
+    # Create a Flask app
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    
+    # Initialize the database
+    db.init_app(app)
+    
+    with app.app_context():
+        store = Store.query.get(store_id)
+        if not store:
+            print(f"Error: Store with ID {store_id} not found")
+            sys.exit(1)
+        
+        shopify = ShopifyIntegration(
+            access_token=store.access_token or Config.SHOPIFY_ACCESS_TOKEN,
+            store_url=f"https://{store.url}"
+        )
+        
+        print(f"Pushing changes for store: {store.name} (ID: {store.id})")
+        result = drain_outbox(shopify, store=store)
+        
+        print(f"Done: {result['pushed']} pushed, {result['unchanged']} unchanged, {result['failed']} failed")
+        if result['failed']:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
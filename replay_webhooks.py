@@ -0,0 +1,54 @@
+"""
+Script to replay recorded Shopify webhook payloads against a local server.
+Each payload is signed with SHOPIFY_WEBHOOK_SECRET exactly as Shopify would,
+so the full receive, verify, queue and apply path can be exercised offline.
+"""
+
+import sys
+import hmac
+import base64
+import hashlib
+import requests
+from shopify_webhooks import get_webhook_secret
+
+def sign(raw_body, secret):
+    """Compute the X-Shopify-Hmac-Sha256 header for a payload."""
+    digest = hmac.new(secret.encode('utf-8'), raw_body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+def replay(url, topic, shop_domain, payload_paths, secret=None):
+    """POST each recorded payload file to the webhook endpoint."""
+    secret = secret or get_webhook_secret()
+    session = requests.Session()
+    
+    for path in payload_paths:
+        with open(path, 'rb') as payload_file:
+            raw_body = payload_file.read()
+        
+        response = session.post(url, data=raw_body, headers={
+            'Content-Type': 'application/json',
+            'X-Shopify-Topic': topic,
+            'X-Shopify-Shop-Domain': shop_domain,
+            'X-Shopify-Hmac-Sha256': sign(raw_body, secret)
+        })
+        print(f"{path}: {response.status_code} {response.text.strip()}")
+
+def main():
+    """
+    Main function to replay webhook payloads.
+    
+    Usage:
+        python replay_webhooks.py <url> <topic> <shop_domain> <payload.json> [<payload.json> ...]
+    """
+    if len(sys.argv) < 5:
+        print("Usage: python replay_webhooks.py <url> <topic> <shop_domain> <payload.json> [<payload.json> ...]")
+        sys.exit(1)
+    
+    if not get_webhook_secret():
+        print("Error: SHOPIFY_WEBHOOK_SECRET is not set")
+        sys.exit(1)
+    
+    replay(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4:])
+
+if __name__ == "__main__":
+    main()
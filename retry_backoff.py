@@ -0,0 +1,18 @@
+"""
+Retry timing shared by the Shopify and Claude clients.
+Both APIs can answer a throttled request with a Retry-After header and
+otherwise expect clients to back off exponentially before trying again.
+"""
+
+import random
+
+def retry_after_seconds(response, default=2.0):
+    """Read the Retry-After header from a response, falling back to a default."""
+    try:
+        return max(0.0, float(response.headers.get('Retry-After', default)))
+    except (TypeError, ValueError):
+        return default
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -1,12 +1,184 @@
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import insert, update, delete
+from sqlalchemy.exc import SQLAlchemyError
+import re
 import json
+import hashlib
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
 from config import Config
-from models import Product, Tag, Collection
+from models import Product, Tag, Collection, product_tags, collection_products
+from shopify_rate_limit import get_governor, get_cost_governor, is_throttled, should_retry
+from retry_backoff import retry_after_seconds, backoff_delay
+
+# Bulk operation query for full catalog pulls; only the fields the importer uses
+BULK_PRODUCTS_QUERY = """
+{
+  products {
+    edges {
+      node {
+        id
+        title
+        descriptionHtml
+        tags
+        featuredImage {
+          url
+        }
+        variants {
+          edges {
+            node {
+              id
+              price
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# REST fields the importers consume; everything else (options, metafields,
+# the full image list) is left out of the response
+PRODUCT_IMPORT_FIELDS = ('id', 'title', 'body_html', 'tags', 'variants', 'image')
+COLLECTION_IMPORT_FIELDS = ('id', 'title', 'handle', 'body_html', 'rules')
+
+# Estimated query cost of one productUpdate mutation, and of a small query
+PRODUCT_UPDATE_COST = 10
+DEFAULT_QUERY_COST = 10
+
+# Members sent with a new custom collection, and per collectionAddProducts call (the API maximum)
+COLLECTION_MEMBER_CHUNK_SIZE = 250
+
+# Terminal states of a Shopify bulk operation
+BULK_OPERATION_FINISHED = {'COMPLETED', 'FAILED', 'CANCELED', 'EXPIRED'}
+
+# Pooled keep-alive sessions, one per store, shared by every ShopifyIntegration
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_shared_session(store_url, pool_size=None):
+    """Get the pooled HTTP session for a store, creating it on first use."""
+    key = (store_url or '').lower().rstrip('/')
+    
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            pool_size = pool_size or Config.SHOPIFY_POOL_SIZE
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[key] = session
+        
+        return session
+
+def next_page_info(response):
+    """Extract the page_info cursor for the next page from a Link header, if any."""
+    link_header = response.headers.get('Link')
+    if not link_header or 'rel="next"' not in link_header:
+        return None
+    
+    next_link = [link for link in link_header.split(',') if 'rel="next"' in link][0]
+    return next_link.split('page_info=')[1].split('&')[0].split('>')[0]
+
+def fields_param(fields):
+    """Format a field set for Shopify's fields query parameter."""
+    return ','.join(fields)
+
+def product_sync_hash(title, description, tag_names):
+    """Hash the product content that is synced with Shopify (title, description and tags).
+    
+    Tags are compared case-insensitively and in any order, as Shopify stores them.
+    """
+    normalized_tags = sorted(set(name.strip().lower() for name in tag_names if name and name.strip()))
+    content = json.dumps([title or '', description or '', normalized_tags])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def shopify_handle(title):
+    """Derive the handle Shopify generates from a title when none is given."""
+    return re.sub(r'[^a-z0-9]+', '-', (title or '').lower()).strip('-')
+
+def format_shopify_time(value):
+    """Format a naive UTC datetime for Shopify's *_at_min filters."""
+    return value.strftime('%Y-%m-%dT%H:%M:%S') + '+00:00'
+
+def chunked(iterable, size):
+    """Group an iterable into lists of at most size items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def merge_iterables(iterables, depth=1):
+    """Iterate several iterables concurrently, one background thread each.
+    
+    Items are yielded in whatever order they arrive, with up to depth items
+    buffered. Exceptions raised by any iterable are re-raised to the caller.
+    """
+    iterables = list(iterables)
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    finished = object()
+    
+    def put(entry):
+        # Give up if the consumer has gone away, rather than blocking forever
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce(iterable):
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((finished, None))
+        except Exception as e:
+            put((finished, e))
+    
+    for iterable in iterables:
+        threading.Thread(target=produce, args=(iterable,), daemon=True).start()
+    
+    try:
+        running = len(iterables)
+        while running:
+            item, error = items.get()
+            if item is finished:
+                if error:
+                    raise error
+                running -= 1
+                continue
+            yield item
+    finally:
+        stop.set()
+
+def prefetch(iterable, depth=1):
+    """Iterate on a background thread, keeping up to depth items ready.
+    
+    This lets the next page download while the caller is still writing the
+    current one. Exceptions raised by the iterable are re-raised to the caller.
+    """
+    return merge_iterables([iterable], depth)
 
 class ShopifyIntegration:
     """Integration with Shopify API."""
     
-    def __init__(self, access_token=None, store_url=None):
+    def __init__(self, access_token=None, store_url=None, pool_size=None,
+                 connect_timeout=None, read_timeout=None):
         """Initialize the Shopify API client."""
         self.access_token = access_token or Config.SHOPIFY_ACCESS_TOKEN
         self.store_url = store_url or Config.SHOPIFY_STORE_URL
@@ -19,34 +191,96 @@ class ShopifyIntegration:
             'X-Shopify-Access-Token': self.access_token,
             'Content-Type': 'application/json'
         }
+        
+        # HTTP transport settings
+        self.pool_size = pool_size or Config.SHOPIFY_POOL_SIZE
+        self.timeout = (
+            connect_timeout or Config.SHOPIFY_CONNECT_TIMEOUT,
+            read_timeout or Config.SHOPIFY_READ_TIMEOUT
+        )
+        self.max_retries = Config.SHOPIFY_MAX_RETRIES
+        self.fetch_workers = Config.SHOPIFY_FETCH_WORKERS
+    
+    @property
+    def session(self):
+        """The pooled session for the currently configured store."""
+        # Looked up on every access because app.py reassigns store_url at runtime
+        return get_shared_session(self.store_url, self.pool_size)
+    
+    @property
+    def governor(self):
+        """The rate governor for the currently configured store."""
+        return get_governor(self.store_url)
+    
+    @property
+    def cost_governor(self):
+        """The GraphQL query cost governor for the currently configured store."""
+        return get_cost_governor(self.store_url)
+    
+    def _request(self, method, url, rate_limited=True, **kwargs):
+        """Send a request to Shopify over the shared keep-alive session.
+        
+        Requests are paced by the store's leaky-bucket governor, and 429s
+        (or 5xx on idempotent methods) are retried with jittered backoff.
+        GraphQL calls pass rate_limited=False, as they are metered by query
+        cost instead of the REST call bucket.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        governor = self.governor
+        
+        for attempt in range(self.max_retries + 1):
+            if rate_limited:
+                governor.acquire()
+            response = self.session.request(method, url, headers=self.headers, **kwargs)
+            if rate_limited:
+                governor.update(response)
+            
+            if attempt == self.max_retries or not should_retry(method, response):
+                return response
+            
+            # 429s are held back by the governor until Retry-After has passed
+            if response.status_code == 429:
+                delay = backoff_delay(0)
+                print(f"Shopify rate limit hit, retrying in {retry_after_seconds(response):.1f}s (attempt {attempt + 1})")
+            else:
+                delay = backoff_delay(attempt)
+                print(f"Shopify returned {response.status_code}, retrying in {delay:.1f}s (attempt {attempt + 1})")
+            
+            time.sleep(delay)
+        
+        return response
     
     def is_configured(self):
         """Check if Shopify integration is configured."""
         return bool(self.access_token and self.store_url)
     
-    def get_products(self, limit=50):
-        """Fetch products from Shopify."""
+    def get_products(self, limit=50, fields=None):
+        """Fetch products from Shopify, optionally only the given fields."""
         if not self.is_configured():
             return {'error': 'Shopify integration not configured'}
         
         url = f"{self.store_url}/admin/api/2023-07/products.json?limit={limit}"
+        if fields:
+            url += f"&fields={fields_param(fields)}"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self._request('GET', url)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             return {'error': str(e)}
     
-    def get_product(self, product_id):
-        """Fetch a specific product from Shopify."""
+    def get_product(self, product_id, fields=None):
+        """Fetch a specific product from Shopify, optionally only the given fields."""
         if not self.is_configured():
             return {'error': 'Shopify integration not configured'}
         
         url = f"{self.store_url}/admin/api/2023-07/products/{product_id}.json"
+        if fields:
+            url += f"?fields={fields_param(fields)}"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self._request('GET', url)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -60,7 +294,7 @@ class ShopifyIntegration:
         url = f"{self.store_url}/admin/api/2023-07/products.json"
         
         try:
-            response = requests.post(url, headers=self.headers, json=product_data)
+            response = self._request('POST', url, json=product_data)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -75,7 +309,7 @@ class ShopifyIntegration:
         
         try:
             print(f"Updating product {product_id} in Shopify with data: {json.dumps(product_data, indent=2)}")
-            response = requests.put(url, headers=self.headers, json=product_data)
+            response = self._request('PUT', url, json=product_data)
             
             # Print response details for debugging
             print(f"Shopify API Response Status: {response.status_code}")
@@ -112,103 +346,51 @@ class ShopifyIntegration:
         url = f"{self.store_url}/admin/api/2023-07/products/{product_id}.json"
         
         try:
-            response = requests.delete(url, headers=self.headers)
+            response = self._request('DELETE', url)
             response.raise_for_status()
             return {'success': True}
         except requests.exceptions.RequestException as e:
             return {'error': str(e)}
     
-    def get_collections(self):
-        """Fetch custom collections from Shopify."""
+    def get_collections(self, fields=None):
+        """Fetch custom collections from Shopify, optionally only the given fields."""
         if not self.is_configured():
             return {'error': 'Shopify integration not configured'}
         
         url = f"{self.store_url}/admin/api/2023-07/custom_collections.json"
+        if fields:
+            url += f"?fields={fields_param(fields)}"
         
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self._request('GET', url)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             return {'error': str(e)}
     
-    def get_all_collections(self):
-        """Fetch all collections from Shopify using pagination."""
+    def iter_collection_pages(self, fields=None):
+        """Yield pages of custom and smart collections, fetching both kinds concurrently.
+        
+        Raises requests.exceptions.RequestException if a page cannot be fetched.
+        """
+        return merge_iterables([
+            self._iter_pages('custom_collections', 'custom_collections', fields=fields),
+            self._iter_pages('smart_collections', 'smart_collections', fields=fields)
+        ])
+    
+    def get_all_collections(self, fields=None):
+        """Fetch all custom and smart collections from Shopify using pagination."""
         if not self.is_configured():
             return {'error': 'Shopify integration not configured'}
         
         all_collections = []
-        page_info = None
-        limit = 250  # Maximum allowed by Shopify API
-        
-        # First, get custom collections
-        while True:
-            url = f"{self.store_url}/admin/api/2023-07/custom_collections.json?limit={limit}"
-            
-            # Add pagination parameter if we have a page_info token
-            if page_info:
-                url += f"&page_info={page_info}"
-            
-            try:
-                response = requests.get(url, headers=self.headers)
-                response.raise_for_status()
-                
-                # Get collections from response
-                collections_page = response.json().get('custom_collections', [])
-                all_collections.extend(collections_page)
-                
-                # Check if there are more pages
-                link_header = response.headers.get('Link')
-                if not link_header or 'rel="next"' not in link_header:
-                    break
-                
-                # Extract the page_info parameter from the Link header
-                next_link = [link for link in link_header.split(',') if 'rel="next"' in link][0]
-                page_info = next_link.split('page_info=')[1].split('&')[0].split('>')[0]
-                
-                print(f"Fetched {len(collections_page)} custom collections, total so far: {len(all_collections)}")
-                
-                # If we got fewer collections than the limit, we're done
-                if len(collections_page) < limit:
-                    break
-                
-            except requests.exceptions.RequestException as e:
-                return {'error': str(e)}
         
-        # Now, get smart collections
-        page_info = None
-        while True:
-            url = f"{self.store_url}/admin/api/2023-07/smart_collections.json?limit={limit}"
-            
-            # Add pagination parameter if we have a page_info token
-            if page_info:
-                url += f"&page_info={page_info}"
-            
-            try:
-                response = requests.get(url, headers=self.headers)
-                response.raise_for_status()
-                
-                # Get collections from response
-                collections_page = response.json().get('smart_collections', [])
+        try:
+            for collections_page in self.iter_collection_pages(fields):
                 all_collections.extend(collections_page)
-                
-                # Check if there are more pages
-                link_header = response.headers.get('Link')
-                if not link_header or 'rel="next"' not in link_header:
-                    break
-                
-                # Extract the page_info parameter from the Link header
-                next_link = [link for link in link_header.split(',') if 'rel="next"' in link][0]
-                page_info = next_link.split('page_info=')[1].split('&')[0].split('>')[0]
-                
-                print(f"Fetched {len(collections_page)} smart collections, total so far: {len(all_collections)}")
-                
-                # If we got fewer collections than the limit, we're done
-                if len(collections_page) < limit:
-                    break
-                
-            except requests.exceptions.RequestException as e:
-                return {'error': str(e)}
+                print(f"Fetched {len(collections_page)} collections, total so far: {len(all_collections)}")
+        except requests.exceptions.RequestException as e:
+            return {'error': str(e)}
         
         return {'collections': all_collections}
     
@@ -220,12 +402,69 @@ class ShopifyIntegration:
         url = f"{self.store_url}/admin/api/2023-07/custom_collections.json"
         
         try:
-            response = requests.post(url, headers=self.headers, json=collection_data)
+            response = self._request('POST', url, json=collection_data)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             return {'error': str(e)}
     
+    def find_collection_by_handle(self, handle):
+        """Look up a custom or smart collection by handle.
+        
+        Returns {'id': ..., 'kind': 'custom_collection' or 'smart_collection'},
+        an empty dict when no collection has the handle, or an error.
+        """
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured'}
+        
+        try:
+            for kind in ('custom_collection', 'smart_collection'):
+                url = f"{self.store_url}/admin/api/2023-07/{kind}s.json?{urlencode({'handle': handle, 'fields': 'id,handle'})}"
+                response = self._request('GET', url)
+                response.raise_for_status()
+                
+                for collection in response.json().get(f'{kind}s', []):
+                    if collection.get('handle') == handle:
+                        return {'id': str(collection['id']), 'kind': kind}
+        except requests.exceptions.RequestException as e:
+            return {'error': str(e)}
+        
+        return {}
+    
+    def update_collection(self, collection):
+        """Update an exported collection's title, description and handle in Shopify.
+        
+        Local collections built from a tag are smart collections; anything else
+        is tried as a custom collection first, since imported smart collections
+        carry no tag locally.
+        """
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured'}
+        
+        kinds = ['smart_collection', 'custom_collection'] if collection.tag else ['custom_collection', 'smart_collection']
+        
+        try:
+            for kind in kinds:
+                url = f"{self.store_url}/admin/api/2023-07/{kind}s/{collection.shopify_id}.json"
+                collection_data = {
+                    kind: {
+                        "id": collection.shopify_id,
+                        "title": collection.name,
+                        "body_html": collection.description or "",
+                        "handle": collection.slug if collection.slug else None
+                    }
+                }
+                
+                response = self._request('PUT', url, json=collection_data)
+                if response.status_code == 404:
+                    continue
+                response.raise_for_status()
+                return response.json()
+        except requests.exceptions.RequestException as e:
+            return {'error': str(e)}
+        
+        return {'error': f"Collection {collection.shopify_id} not found in Shopify"}
+    
     def add_product_to_collection(self, collection_id, product_id):
         """Add a product to a collection in Shopify."""
         if not self.is_configured():
@@ -241,211 +480,666 @@ class ShopifyIntegration:
         }
         
         try:
-            response = requests.post(url, headers=self.headers, json=collect_data)
+            response = self._request('POST', url, json=collect_data)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             return {'error': str(e)}
     
-    def get_all_products(self):
-        """Fetch all products from Shopify using pagination."""
-        if not self.is_configured():
-            return {'error': 'Shopify integration not configured'}
+    def add_products_to_collection(self, collection_id, product_ids):
+        """Add products to a collection in chunks with the collectionAddProducts mutation.
         
-        all_products = []
+        Returns a map of Shopify product ID to error for every product that
+        could not be added (empty when all succeeded).
+        """
+        mutation = """
+        mutation collectionAddProducts($id: ID!, $productIds: [ID!]!) {
+          collectionAddProducts(id: $id, productIds: $productIds) {
+            collection {
+              id
+            }
+            userErrors {
+              field
+              message
+            }
+          }
+        }
+        """
+        
+        errors = {}
+        for chunk in chunked([str(product_id) for product_id in product_ids], COLLECTION_MEMBER_CHUNK_SIZE):
+            result = self.graphql(mutation, {
+                'id': f"gid://shopify/Collection/{collection_id}",
+                'productIds': [f"gid://shopify/Product/{product_id}" for product_id in chunk]
+            })
+            
+            if 'error' in result:
+                errors.update((product_id, result['error']) for product_id in chunk)
+                continue
+            
+            for user_error in result['data']['collectionAddProducts'].get('userErrors') or []:
+                # Errors about one product point at its index, e.g. ["productIds", "3"]
+                field = user_error.get('field') or []
+                if len(field) > 1 and str(field[1]).isdigit() and int(field[1]) < len(chunk):
+                    errors[chunk[int(field[1])]] = user_error['message']
+                else:
+                    errors.update((product_id, user_error['message']) for product_id in chunk)
+        
+        return errors
+    
+    def iter_product_pages(self, limit=250, params=None, fields=None):
+        """Yield pages of products from Shopify, following page_info cursors.
+        
+        Extra filter params (e.g. updated_at_min) apply to the first request;
+        Shopify carries them inside the cursor for later pages. The fields
+        projection is sent with every page.
+        Raises requests.exceptions.RequestException if a page cannot be fetched.
+        """
         page_info = None
-        limit = 250  # Maximum allowed by Shopify API
+        fetched = 0
         
         while True:
             url = f"{self.store_url}/admin/api/2023-07/products.json?limit={limit}"
+            if fields:
+                url += f"&fields={fields_param(fields)}"
             
             # Add pagination parameter if we have a page_info token
             if page_info:
                 url += f"&page_info={page_info}"
+            elif params:
+                url += f"&{urlencode(params)}"
+            
+            response = self._request('GET', url)
+            response.raise_for_status()
+            
+            # Get products from response
+            products_page = response.json().get('products', [])
+            fetched += len(products_page)
+            print(f"Fetched {len(products_page)} products, total so far: {fetched}")
+            
+            if products_page:
+                yield products_page
+            
+            # Check if there are more pages
+            page_info = next_page_info(response)
+            
+            # If we got fewer products than the limit, we're done
+            if not page_info or len(products_page) < limit:
+                break
+    
+    def iter_deleted_product_ids(self, since):
+        """Yield Shopify IDs of products deleted since a given UTC datetime, from the events feed."""
+        params = {'filter': 'Product', 'verb': 'destroy', 'created_at_min': format_shopify_time(since)}
+        for events_page in self._iter_pages('events', 'events', params=params):
+            for event in events_page:
+                if event.get('subject_type') == 'Product':
+                    yield str(event['subject_id'])
+    
+    def _iter_pages(self, path, key, limit=250, params=None, fields=None, stop=None):
+        """Yield pages of a paginated REST resource, following page_info cursors.
+        
+        Filter params apply to the first request; the fields projection is
+        sent with every page. Paging ends early once stop, a threading.Event,
+        is set.
+        Raises requests.exceptions.RequestException if a page cannot be fetched.
+        """
+        base_url = f"{self.store_url}/admin/api/2023-07/{path}.json?limit={limit}"
+        if fields:
+            base_url += f"&fields={fields_param(fields)}"
+        url = f"{base_url}&{urlencode(params)}" if params else base_url
+        
+        while url and not (stop and stop.is_set()):
+            response = self._request('GET', url)
+            response.raise_for_status()
+            
+            page = response.json().get(key, [])
+            if page:
+                yield page
+            
+            page_info = next_page_info(response)
+            url = f"{base_url}&page_info={page_info}" if page_info else None
+    
+    def iter_collects(self, stop=None):
+        """Yield (collection_id, product_id) pairs for every custom collection membership in the store."""
+        for collects_page in self._iter_pages('collects', 'collects', fields=('collection_id', 'product_id'), stop=stop):
+            for collect in collects_page:
+                yield str(collect['collection_id']), str(collect['product_id'])
+    
+    def iter_collection_product_ids(self, collection_id, stop=None):
+        """Yield the Shopify IDs of every product in a collection, across all pages."""
+        path = f"collections/{collection_id}/products"
+        for products_page in self._iter_pages(path, 'products', fields=('id',), stop=stop):
+            for shopify_product in products_page:
+                yield str(shopify_product['id'])
+    
+    def get_all_products(self, fields=None):
+        """Fetch all products from Shopify using pagination."""
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured'}
+        
+        all_products = []
+        
+        try:
+            for products_page in self.iter_product_pages(fields=fields):
+                all_products.extend(products_page)
+        except requests.exceptions.RequestException as e:
+            return {'error': str(e)}
+        
+        return {'products': all_products}
+    
+    def graphql(self, query, variables=None, cost=DEFAULT_QUERY_COST):
+        """Run a GraphQL Admin API query.
+        
+        Calls are paced by the store's query cost governor using the estimated
+        cost, and responses rejected as THROTTLED are retried once enough
+        points have been restored.
+        """
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured'}
+        
+        url = f"{self.store_url}/admin/api/2023-07/graphql.json"
+        cost_governor = self.cost_governor
+        
+        for attempt in range(self.max_retries + 1):
+            cost_governor.acquire(cost)
             
             try:
-                response = requests.get(url, headers=self.headers)
+                response = self._request('POST', url, rate_limited=False,
+                                         json={'query': query, 'variables': variables or {}})
                 response.raise_for_status()
-                
-                # Get products from response
-                products_page = response.json().get('products', [])
-                all_products.extend(products_page)
-                
-                # Check if there are more pages
-                link_header = response.headers.get('Link')
-                if not link_header or 'rel="next"' not in link_header:
-                    break
-                
-                # Extract the page_info parameter from the Link header
-                next_link = [link for link in link_header.split(',') if 'rel="next"' in link][0]
-                page_info = next_link.split('page_info=')[1].split('&')[0].split('>')[0]
-                
-                print(f"Fetched {len(products_page)} products, total so far: {len(all_products)}")
-                
-                # If we got fewer products than the limit, we're done
-                if len(products_page) < limit:
-                    break
-                
+                result = response.json()
             except requests.exceptions.RequestException as e:
                 return {'error': str(e)}
+            
+            cost_governor.update(result)
+            
+            if not is_throttled(result) or attempt == self.max_retries:
+                break
+            print(f"Shopify GraphQL throttled, waiting for {cost} query cost points (attempt {attempt + 1})")
         
-        return {'products': all_products}
+        if result.get('errors'):
+            return {'error': json.dumps(result['errors'])}
+        
+        return result
     
-    def import_products_from_shopify(self, db, current_store=None):
-        """Import products from Shopify to the local database."""
-        if not self.is_configured():
-            return {'error': 'Shopify integration not configured', 'imported': 0}
+    def run_bulk_query(self, query):
+        """Submit a bulk operation query and return the operation ID."""
+        mutation = """
+        mutation bulkOperationRunQuery($query: String!) {
+          bulkOperationRunQuery(query: $query) {
+            bulkOperation {
+              id
+              status
+            }
+            userErrors {
+              field
+              message
+            }
+          }
+        }
+        """
         
-        print("Starting import from Shopify...")
-        shopify_products = self.get_all_products()
+        result = self.graphql(mutation, {'query': query})
+        if 'error' in result:
+            return result
         
-        if 'error' in shopify_products:
-            return shopify_products
+        payload = result['data']['bulkOperationRunQuery']
+        if payload.get('userErrors'):
+            return {'error': json.dumps(payload['userErrors'])}
         
-        products = shopify_products.get('products', [])
-        print(f"Found {len(products)} products in Shopify")
+        return {'id': payload['bulkOperation']['id']}
+    
+    def wait_for_bulk_operation(self, poll_interval=None, timeout=None):
+        """Poll the current bulk operation until it finishes."""
+        poll_interval = poll_interval or Config.SHOPIFY_BULK_POLL_INTERVAL
+        deadline = time.monotonic() + (timeout or Config.SHOPIFY_BULK_TIMEOUT)
         
-        imported_count = 0
-        updated_count = 0
+        query = """
+        {
+          currentBulkOperation {
+            id
+            status
+            errorCode
+            objectCount
+            url
+          }
+        }
+        """
+        
+        while True:
+            result = self.graphql(query)
+            if 'error' in result:
+                return result
+            
+            operation = result['data']['currentBulkOperation']
+            if not operation:
+                return {'error': 'No bulk operation is running'}
+            
+            print(f"Bulk operation {operation['id']} is {operation['status']} ({operation['objectCount']} objects)")
+            
+            if operation['status'] in BULK_OPERATION_FINISHED:
+                if operation['status'] != 'COMPLETED':
+                    return {'error': f"Bulk operation {operation['status'].lower()}: {operation.get('errorCode')}"}
+                return operation
+            
+            if time.monotonic() > deadline:
+                return {'error': f"Timed out waiting for bulk operation {operation['id']}"}
+            
+            time.sleep(poll_interval)
+    
+    def iter_bulk_results(self, url):
+        """Stream the JSONL result of a bulk operation one object at a time."""
+        # The result URL is pre-signed storage, so no Shopify headers or rate limit apply
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+    
+    def iter_bulk_products(self, url):
+        """Stream products from a bulk result, reshaped like REST product dicts.
+        
+        Child rows (variants) follow their parent product in the JSONL output and
+        carry its ID in __parentId, so each product is yielded once the next one starts.
+        """
+        product = None
+        
+        for row in self.iter_bulk_results(url):
+            if '__parentId' in row:
+                if product and row['__parentId'] == product['gid'] and 'price' in row:
+                    product['variants'].append({'price': row['price']})
+                continue
+            
+            if product:
+                yield product
+            
+            product = {
+                'gid': row['id'],
+                'id': int(row['id'].rsplit('/', 1)[1]),
+                'title': row.get('title', ''),
+                'body_html': row.get('descriptionHtml', ''),
+                'tags': ', '.join(row.get('tags') or []),
+                'variants': [],
+                'images': [{'src': row['featuredImage']['url']}] if row.get('featuredImage') else []
+            }
+        
+        if product:
+            yield product
+    
+    def _resolve_store(self, current_store=None):
+        """Get the local store being synced, falling back to the configured store URL."""
+        if current_store:
+            return current_store
         
         # Get the current store from the normalized URL
         from store_management import normalize_url
         from models import Store
         
-        store = None
-        if current_store:
-            store = current_store
-        else:
-            normalized_url = normalize_url(self.store_url)
-            store = Store.query.filter_by(url=normalized_url).first()
+        normalized_url = normalize_url(self.store_url)
+        return Store.query.filter_by(url=normalized_url).first()
+    
+    def _upsert_products(self, db, products, store=None):
+        """Insert or update Shopify products (REST-shaped dicts) in the local database.
+        
+        Existing products and tags are preloaded once per chunk, and products,
+        tags and product_tags rows are written with set-based statements instead
+        of a query per product and per tag. Returns a tuple of
+        (imported_count, updated_count). The caller commits.
+        """
+        store_id = store.id if store else None
         
+        # Parse the payload, keyed by Shopify ID so duplicates collapse
+        parsed = {}
         for shopify_product in products:
-            # Check if product already exists in database
-            existing_product = Product.query.filter_by(shopify_id=str(shopify_product['id'])).first()
+            row = {
+                'title': shopify_product['title'],
+                'description': shopify_product.get('body_html')
+            }
             
-            if existing_product:
-                # Update existing product
-                existing_product.title = shopify_product['title']
-                existing_product.description = shopify_product['body_html']
-                
-                # Get price from first variant
-                if shopify_product['variants'] and 'price' in shopify_product['variants'][0]:
-                    existing_product.price = float(shopify_product['variants'][0]['price'])
-                
-                # Get image URL from first image
-                if shopify_product['images'] and 'src' in shopify_product['images'][0]:
-                    existing_product.image_url = shopify_product['images'][0]['src']
-                
-                # Update tags
-                if 'tags' in shopify_product and shopify_product['tags']:
-                    tag_names = [tag.strip() for tag in shopify_product['tags'].split(',')]
-                    
-                    # Clear existing tags
-                    existing_product.tags = []
-                    
-                    # Add new tags
-                    for tag_name in tag_names:
-                        if tag_name:
-                            tag = Tag.query.filter_by(name=tag_name.lower()).first()
-                            if not tag:
-                                tag = Tag(name=tag_name.lower())
-                                db.session.add(tag)
-                            existing_product.tags.append(tag)
-            else:
-                # Create new product
-                new_product = Product(
-                    title=shopify_product['title'],
-                    description=shopify_product['body_html'],
-                    shopify_id=str(shopify_product['id'])
-                )
-                
-                # Associate with store if available
-                if store:
-                    new_product.store_id = store.id
-                
-                # Get price from first variant
-                if shopify_product['variants'] and 'price' in shopify_product['variants'][0]:
-                    new_product.price = float(shopify_product['variants'][0]['price'])
-                
-                # Get image URL from first image
-                if shopify_product['images'] and 'src' in shopify_product['images'][0]:
-                    new_product.image_url = shopify_product['images'][0]['src']
+            # Get price from first variant
+            if shopify_product.get('variants') and 'price' in shopify_product['variants'][0]:
+                row['price'] = float(shopify_product['variants'][0]['price'])
+            
+            # Get image URL from the featured image, or the first of the full image list
+            if shopify_product.get('image') and 'src' in shopify_product['image']:
+                row['image_url'] = shopify_product['image']['src']
+            elif shopify_product.get('images') and 'src' in shopify_product['images'][0]:
+                row['image_url'] = shopify_product['images'][0]['src']
+            
+            # Tags are only replaced when Shopify reports some
+            tag_names = None
+            if 'tags' in shopify_product and shopify_product['tags']:
+                tag_names = list(dict.fromkeys(
+                    tag.strip().lower() for tag in shopify_product['tags'].split(',') if tag.strip()
+                ))
+            
+            parsed[str(shopify_product['id'])] = (row, tag_names, 'tags' in shopify_product)
+        
+        if not parsed:
+            return 0, 0
+        
+        # Preload the products that already exist
+        existing = dict(
+            db.session.query(Product.shopify_id, Product.id)
+            .filter(Product.shopify_id.in_(list(parsed)))
+            .all()
+        )
+        
+        # Existing products keep their local tags when Shopify reports none, so hash those
+        kept_tags = {}
+        kept_ids = [existing[shopify_id] for shopify_id, (_, tag_names, has_tags) in parsed.items()
+                    if has_tags and not tag_names and shopify_id in existing]
+        if kept_ids:
+            tag_rows = (
+                db.session.query(product_tags.c.product_id, Tag.name)
+                .join(Tag, Tag.id == product_tags.c.tag_id)
+                .filter(product_tags.c.product_id.in_(kept_ids))
+            )
+            for product_id, name in tag_rows:
+                kept_tags.setdefault(product_id, []).append(name)
+        
+        # Remember what Shopify holds, so unchanged products are not exported back
+        for shopify_id, (row, tag_names, has_tags) in parsed.items():
+            if has_tags:
+                local_tags = tag_names or kept_tags.get(existing.get(shopify_id), [])
+                row['sync_hash'] = product_sync_hash(row['title'], row['description'], local_tags)
+        
+        # Update existing products by primary key
+        updates = [dict(row, id=existing[shopify_id]) for shopify_id, (row, _, _) in parsed.items() if shopify_id in existing]
+        if updates:
+            db.session.execute(update(Product), updates)
+        
+        # Insert new products and collect their IDs
+        inserts = [
+            {
+                'title': row['title'],
+                'description': row['description'],
+                'price': row.get('price'),
+                'image_url': row.get('image_url'),
+                'shopify_id': shopify_id,
+                'sync_hash': row.get('sync_hash'),
+                'store_id': store_id
+            }
+            for shopify_id, (row, _, _) in parsed.items() if shopify_id not in existing
+        ]
+        product_ids = dict(existing)
+        if inserts:
+            inserted = db.session.execute(insert(Product).returning(Product.shopify_id, Product.id), inserts)
+            product_ids.update(inserted.all())
+        
+        # Resolve tag names against the store's tags, creating any that are missing
+        tagged = {shopify_id: tag_names for shopify_id, (_, tag_names, _) in parsed.items() if tag_names}
+        if tagged:
+            all_tag_names = set(name for tag_names in tagged.values() for name in tag_names)
+            
+            tag_query = db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(all_tag_names))
+            if store:
+                tag_query = tag_query.filter(Tag.store_id == store_id)
+            
+            tag_ids = {}
+            for name, tag_id in tag_query.order_by(Tag.id):
+                tag_ids.setdefault(name, tag_id)
+            
+            missing = [{'name': name, 'store_id': store_id} for name in sorted(all_tag_names - set(tag_ids))]
+            if missing:
+                created = db.session.execute(insert(Tag).returning(Tag.name, Tag.id), missing)
+                tag_ids.update(created.all())
+            
+            # Replace product_tags rows for every product that reported tags
+            tagged_product_ids = [product_ids[shopify_id] for shopify_id in tagged]
+            db.session.execute(delete(product_tags).where(product_tags.c.product_id.in_(tagged_product_ids)))
+            db.session.execute(insert(product_tags), [
+                {'product_id': product_ids[shopify_id], 'tag_id': tag_ids[name]}
+                for shopify_id, tag_names in tagged.items()
+                for name in tag_names
+            ])
+        
+        return len(inserts), len(updates)
+    
+    def _delete_local_products(self, db, store, shopify_ids):
+        """Delete a store's local copies of the given Shopify products. The caller commits."""
+        shopify_ids = list(shopify_ids)
+        if not shopify_ids:
+            return 0
+        
+        product_query = db.session.query(Product.id).filter(Product.shopify_id.in_(shopify_ids))
+        if store:
+            product_query = product_query.filter(Product.store_id == store.id)
+        product_ids = [product_id for (product_id,) in product_query]
+        
+        if product_ids:
+            db.session.execute(delete(product_tags).where(product_tags.c.product_id.in_(product_ids)))
+            db.session.execute(delete(collection_products).where(collection_products.c.product_id.in_(product_ids)))
+            db.session.execute(delete(Product).where(Product.id.in_(product_ids)))
+        
+        return len(product_ids)
+    
+    def _import_chunks(self, db, chunks, store=None, seen_ids=None, progress=None):
+        """Upsert chunks of products, committing after each one.
+        
+        A chunk that fails to write is rolled back and counted, so earlier
+        chunks stay committed and the import carries on with the next one.
+        If seen_ids is given, every Shopify ID read is added to it, and
+        progress, if given, is called after each chunk.
+        """
+        imported_count = 0
+        updated_count = 0
+        failed_count = 0
+        total = 0
+        
+        try:
+            for chunk in chunks:
+                if seen_ids is not None:
+                    seen_ids.update(str(shopify_product['id']) for shopify_product in chunk)
                 
-                # Add tags
-                if 'tags' in shopify_product and shopify_product['tags']:
-                    tag_names = [tag.strip() for tag in shopify_product['tags'].split(',')]
-                    
-                    for tag_name in tag_names:
-                        if tag_name:
-                            # Check if tag exists for this store
-                            tag_query = Tag.query.filter_by(name=tag_name.lower())
-                            if store:
-                                tag_query = tag_query.filter_by(store_id=store.id)
-                            
-                            tag = tag_query.first()
-                            if not tag:
-                                tag = Tag(name=tag_name.lower())
-                                if store:
-                                    tag.store_id = store.id
-                                db.session.add(tag)
-                            new_product.tags.append(tag)
+                try:
+                    imported, updated = self._upsert_products(db, chunk, store)
+                    db.session.commit()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    failed_count += len(chunk)
+                    print(f"Error writing {len(chunk)} products, skipping chunk: {str(e)}")
+                    if progress:
+                        progress(total + failed_count, errors=failed_count, message=f"Skipped a chunk of {len(chunk)} products")
+                    continue
                 
-                db.session.add(new_product)
-                imported_count += 1
-        
-        db.session.commit()
+                imported_count += imported
+                updated_count += updated
+                total += len(chunk)
+                print(f"Imported {total} products so far")
+                if progress:
+                    progress(total + failed_count, errors=failed_count, message=f"Imported a chunk of {len(chunk)} products")
+        except requests.exceptions.RequestException as e:
+            # Chunks written before the failure stay committed
+            return {'error': str(e), 'imported': imported_count, 'updated': updated_count}
         
         return {
             'success': True,
             'imported': imported_count,
-            'total': len(shopify_products.get('products', []))
+            'updated': updated_count,
+            'failed': failed_count,
+            'total': total + failed_count
         }
     
+    def import_products_from_shopify(self, db, current_store=None, progress=None):
+        """Import products from Shopify to the local database.
+        
+        Pages are written and committed as they arrive, while the next page is
+        fetched in the background, so memory stays flat and progress is durable.
+        """
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured', 'imported': 0}
+        
+        print("Starting import from Shopify...")
+        store = self._resolve_store(current_store)
+        
+        pages = self.iter_product_pages(fields=PRODUCT_IMPORT_FIELDS)
+        return self._import_chunks(db, prefetch(pages), store, progress=progress)
+    
+    def import_products_from_shopify_bulk(self, db, current_store=None, chunk_size=None, progress=None):
+        """Import products from Shopify using a GraphQL bulk operation.
+        
+        The JSONL result is streamed and written in chunks, so memory stays flat
+        regardless of catalog size and each chunk is committed as it lands.
+        """
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured', 'imported': 0}
+        
+        chunk_size = chunk_size or Config.SHOPIFY_IMPORT_CHUNK_SIZE
+        
+        print("Starting bulk import from Shopify...")
+        operation = self.run_bulk_query(BULK_PRODUCTS_QUERY)
+        if 'error' in operation:
+            return operation
+        
+        operation = self.wait_for_bulk_operation()
+        if 'error' in operation:
+            return operation
+        
+        # An empty catalog completes without a result file
+        if not operation.get('url'):
+            return {'success': True, 'imported': 0, 'updated': 0, 'failed': 0, 'total': 0}
+        
+        store = self._resolve_store(current_store)
+        chunks = chunked(self.iter_bulk_products(operation['url']), chunk_size)
+        
+        return self._import_chunks(db, prefetch(chunks), store, progress=progress)
+    
+    def sync_products_incremental(self, db, current_store=None):
+        """Pull only the products changed or deleted since the store's last sync.
+        
+        The watermark (Store.products_synced_at) only advances after a sync
+        succeeds, and each sync overlaps the previous one slightly so that
+        changes landing during a sync are picked up by the next one.
+        """
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured', 'imported': 0}
+        
+        store = self._resolve_store(current_store)
+        if not store:
+            return {'error': 'No local store matches the Shopify store URL', 'imported': 0}
+        
+        # Without a watermark there is nothing to be incremental against
+        if not store.products_synced_at:
+            return self.reconcile_products(db, current_store=store)
+        
+        started_at = datetime.utcnow()
+        since = store.products_synced_at - timedelta(seconds=Config.SHOPIFY_SYNC_OVERLAP_SECONDS)
+        print(f"Syncing products changed since {format_shopify_time(since)}...")
+        
+        pages = self.iter_product_pages(
+            params={'updated_at_min': format_shopify_time(since)},
+            fields=PRODUCT_IMPORT_FIELDS
+        )
+        result = self._import_chunks(db, prefetch(pages), store)
+        if 'error' in result:
+            return result
+        
+        try:
+            result['deleted'] = self._delete_local_products(db, store, set(self.iter_deleted_product_ids(since)))
+        except requests.exceptions.RequestException as e:
+            return {'error': f"Error fetching deleted products: {str(e)}", 'imported': result['imported']}
+        
+        # Rolled back chunks must be fetched again, so the watermark stays put until they succeed
+        if result['failed']:
+            print(f"Incremental sync: {result['failed']} products failed, keeping the sync watermark")
+        else:
+            store.products_synced_at = started_at
+        db.session.commit()
+        
+        print(f"Incremental sync: {result['imported']} new, {result['updated']} updated, {result['deleted']} deleted")
+        return result
+    
+    def reconcile_products(self, db, current_store=None):
+        """Run a full import and delete local products that no longer exist in Shopify.
+        
+        This is the nightly safety net behind incremental syncs; it also sets
+        the store's sync watermark.
+        """
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured', 'imported': 0}
+        
+        # Products missing from the feed are deleted, so only ever prune one store's products
+        store = self._resolve_store(current_store)
+        if not store:
+            return {'error': 'No local store matches the Shopify store URL', 'imported': 0}
+        
+        started_at = datetime.utcnow()
+        seen_ids = set()
+        
+        print("Starting full product reconcile with Shopify...")
+        if store.import_mode == 'bulk':
+            operation = self.run_bulk_query(BULK_PRODUCTS_QUERY)
+            if 'error' not in operation:
+                operation = self.wait_for_bulk_operation()
+            if 'error' in operation:
+                return operation
+            
+            products = self.iter_bulk_products(operation['url']) if operation.get('url') else iter(())
+            chunks = chunked(products, Config.SHOPIFY_IMPORT_CHUNK_SIZE)
+        else:
+            chunks = self.iter_product_pages(fields=PRODUCT_IMPORT_FIELDS)
+        
+        result = self._import_chunks(db, prefetch(chunks), store, seen_ids=seen_ids)
+        
+        # Only prune after a complete pass; a partial one would delete live products
+        if 'error' in result or result['failed']:
+            return result
+        
+        local_query = (
+            db.session.query(Product.shopify_id)
+            .filter(Product.shopify_id.isnot(None))
+            .filter(Product.store_id == store.id)
+        )
+        removed_ids = set(shopify_id for (shopify_id,) in local_query) - seen_ids
+        
+        result['deleted'] = self._delete_local_products(db, store, removed_ids)
+        store.products_synced_at = started_at
+        db.session.commit()
+        
+        print(f"Full reconcile: {result['imported']} new, {result['updated']} updated, {result['deleted']} deleted")
+        return result
+    
     def export_product_to_shopify(self, product):
-        """Export a product from the local database to Shopify."""
+        """Export a product from the local database to Shopify.
+        
+        Products that are already in Shopify are compared with their last synced
+        state (Product.sync_hash) locally: unchanged products cost no request and
+        changed ones a single PUT. The caller commits.
+        """
         if not self.is_configured():
             return {'error': 'Shopify integration not configured'}
         
         # Get tags as a comma-separated string
-        tag_string = ",".join([tag.name for tag in product.tags])
-        print(f"Exporting product {product.title} with tags: {tag_string}")
+        tag_names = [tag.name for tag in product.tags]
+        tag_string = ",".join(tag_names)
+        sync_hash = product_sync_hash(product.title, product.description, tag_names)
         
         # Check if product already exists in Shopify
         if product.shopify_id:
-            # First, get the current product from Shopify to ensure we have all required fields
-            current_product_result = self.get_product(product.shopify_id)
-            
-            if 'error' in current_product_result:
-                print(f"Error getting product from Shopify: {current_product_result.get('error', 'Unknown error')}")
-                return current_product_result
+            if product.sync_hash == sync_hash:
+                print(f"Product {product.title} is unchanged since the last sync, skipping export")
+                return {'success': True, 'skipped': True}
             
-            # Extract the current product data
-            current_product = current_product_result.get('product', {})
+            print(f"Exporting product {product.title} with tags: {tag_string}")
             
-            # Update only the fields we want to change
+            # Send only the synced fields; variants and images are left alone
+            # to minimize the risk of validation errors
             product_data = {
                 "product": {
                     "id": product.shopify_id,
+                    "title": product.title,
+                    "body_html": product.description or "",
                     "tags": tag_string
                 }
             }
             
-            # Only update these fields if they've changed
-            if product.title != current_product.get('title'):
-                product_data["product"]["title"] = product.title
-            
-            if (product.description or "") != current_product.get('body_html', ""):
-                product_data["product"]["body_html"] = product.description or ""
-            
-            # Don't update variants or images unless necessary
-            # This minimizes the risk of validation errors
-            
-            print(f"Updating product in Shopify with minimal data: {json.dumps(product_data, indent=2)}")
             result = self.update_product(product.shopify_id, product_data)
             
             # Check if the update was successful
             if 'error' not in result and 'product' in result:
                 print(f"Successfully updated product in Shopify with tags: {tag_string}")
+                product.sync_hash = sync_hash
             else:
                 print(f"Error updating product in Shopify: {result.get('error', 'Unknown error')}")
                 
@@ -458,6 +1152,7 @@ class ShopifyIntegration:
                     }
                 }
                 
+                # The snapshot is left as is, so title and description are retried next time
                 result = self.update_product(product.shopify_id, minimal_product_data)
                 if 'error' not in result and 'product' in result:
                     print(f"Successfully updated product tags in Shopify: {tag_string}")
@@ -490,18 +1185,200 @@ class ShopifyIntegration:
                 # Update local product with Shopify ID
                 if 'id' in result['product']:
                     product.shopify_id = str(result['product']['id'])
+                    product.sync_hash = sync_hash
             else:
                 print(f"Error creating product in Shopify: {result.get('error', 'Unknown error')}")
         
         return result
     
-    def import_collections_from_shopify(self, db, current_store=None):
-        """Import collections from Shopify to the local database."""
+    def export_products_to_shopify(self, products, batch_size=None, progress=None):
+        """Export many products at once with batched GraphQL productUpdate mutations.
+        
+        Products already in Shopify are sent batch_size per request, each
+        mutation aliased so its result maps back to its product; unchanged
+        products (by sync hash) are skipped and new ones are created one by
+        one. Returns counts and a map of local product ID to error (None on
+        success). The caller commits; progress, if given, is called after
+        each batch.
+        """
+        if not self.is_configured():
+            return {'error': 'Shopify integration not configured'}
+        
+        batch_size = batch_size or Config.SHOPIFY_GRAPHQL_BATCH_SIZE
+        results = {}
+        pending = []
+        unchanged_count = 0
+        
+        for product in products:
+            tag_names = [tag.name for tag in product.tags]
+            sync_hash = product_sync_hash(product.title, product.description, tag_names)
+            
+            if not product.shopify_id:
+                # Products new to Shopify need a REST create, which also returns their ID
+                result = self.export_product_to_shopify(product)
+                results[product.id] = result.get('error')
+            elif product.sync_hash == sync_hash:
+                unchanged_count += 1
+                results[product.id] = None
+            else:
+                pending.append((product, tag_names, sync_hash))
+        
+        for batch in chunked(pending, batch_size):
+            declarations = ', '.join(f'$p{index}: ProductInput!' for index in range(len(batch)))
+            mutations = '\n'.join(
+                f'  p{index}: productUpdate(input: $p{index}) {{ product {{ id }} userErrors {{ field message }} }}'
+                for index in range(len(batch))
+            )
+            mutation = f"mutation exportProducts({declarations}) {{\n{mutations}\n}}"
+            variables = {
+                f'p{index}': {
+                    'id': f"gid://shopify/Product/{product.shopify_id}",
+                    'title': product.title,
+                    'descriptionHtml': product.description or "",
+                    'tags': tag_names
+                }
+                for index, (product, tag_names, _) in enumerate(batch)
+            }
+            
+            response = self.graphql(mutation, variables, cost=PRODUCT_UPDATE_COST * len(batch))
+            
+            for index, (product, _, sync_hash) in enumerate(batch):
+                if 'error' in response:
+                    results[product.id] = response['error']
+                    continue
+                
+                payload = response['data'].get(f'p{index}') or {}
+                if payload.get('userErrors'):
+                    results[product.id] = json.dumps(payload['userErrors'])
+                elif not payload.get('product'):
+                    results[product.id] = f"Product {product.shopify_id} not found in Shopify"
+                else:
+                    product.sync_hash = sync_hash
+                    results[product.id] = None
+            
+            print(f"Exported batch of {len(batch)} products to Shopify")
+            if progress:
+                progress(len(results), len(products), errors=sum(1 for error in results.values() if error),
+                         message=f"Exported a batch of {len(batch)} products")
+        
+        failed_count = 0
+        for product_id, error in results.items():
+            if error:
+                failed_count += 1
+                print(f"Error exporting product {product_id} to Shopify: {error}")
+        
+        return {
+            'success': True,
+            'exported': len(results) - failed_count - unchanged_count,
+            'unchanged': unchanged_count,
+            'failed': failed_count,
+            'results': results
+        }
+    
+    def _upsert_collections(self, db, collections, store=None):
+        """Insert or update Shopify collections (custom or smart) in the local database.
+        
+        Returns a tuple of (imported_count, updated_count). The caller commits.
+        """
+        parsed = {}
+        for shopify_collection in collections:
+            parsed[str(shopify_collection.get('id'))] = {
+                'name': shopify_collection.get('title', ''),
+                'slug': shopify_collection.get('handle', ''),
+                'description': shopify_collection.get('body_html', '')
+            }
+        
+        if not parsed:
+            return 0, 0
+        
+        # Preload the collections that already exist
+        existing = dict(
+            db.session.query(Collection.shopify_id, Collection.id)
+            .filter(Collection.shopify_id.in_(list(parsed)))
+            .all()
+        )
+        
+        updates = [dict(row, id=existing[shopify_id]) for shopify_id, row in parsed.items() if shopify_id in existing]
+        if updates:
+            db.session.execute(update(Collection), updates)
+        
+        inserts = [
+            dict(row, shopify_id=shopify_id, store_id=store.id if store else None)
+            for shopify_id, row in parsed.items() if shopify_id not in existing
+        ]
+        if inserts:
+            db.session.execute(insert(Collection), inserts)
+        
+        return len(inserts), len(updates)
+    
+    def _delete_local_collections(self, db, store, shopify_ids):
+        """Delete a store's local copies of the given Shopify collections. The caller commits."""
+        shopify_ids = list(shopify_ids)
+        if not shopify_ids:
+            return 0
+        
+        collection_query = db.session.query(Collection.id).filter(Collection.shopify_id.in_(shopify_ids))
+        if store:
+            collection_query = collection_query.filter(Collection.store_id == store.id)
+        collection_ids = [collection_id for (collection_id,) in collection_query]
+        
+        if collection_ids:
+            db.session.execute(delete(collection_products).where(collection_products.c.collection_id.in_(collection_ids)))
+            db.session.execute(delete(Collection).where(Collection.id.in_(collection_ids)))
+        
+        return len(collection_ids)
+    
+    def _replace_collection_products(self, db, store, memberships):
+        """Replace the local product lists of collections with the given Shopify memberships.
+        
+        memberships maps a Shopify collection ID to the Shopify IDs of its
+        products. IDs are resolved against in-memory indexes of the store's
+        collections and products, and collection_products rows are rewritten
+        with one delete and one insert. Returns the number of rows written.
+        The caller commits.
+        """
+        if not memberships:
+            return 0
+        
+        collection_query = (
+            db.session.query(Collection.shopify_id, Collection.id)
+            .filter(Collection.shopify_id.in_(list(memberships)))
+        )
+        product_query = db.session.query(Product.shopify_id, Product.id).filter(Product.shopify_id.isnot(None))
+        if store:
+            collection_query = collection_query.filter(Collection.store_id == store.id)
+            product_query = product_query.filter(Product.store_id == store.id)
+        
+        collection_ids = dict(collection_query.all())
+        product_ids = dict(product_query.all())
+        
+        rows = [
+            {'collection_id': collection_ids[collection_id], 'product_id': product_ids[product_id]}
+            for collection_id, members in memberships.items() if collection_id in collection_ids
+            for product_id in members if product_id in product_ids
+        ]
+        
+        db.session.execute(
+            delete(collection_products).where(collection_products.c.collection_id.in_(list(collection_ids.values())))
+        )
+        if rows:
+            db.session.execute(insert(collection_products), rows)
+        
+        return len(rows)
+    
+    def import_collections_from_shopify(self, db, current_store=None, progress=None):
+        """Import collections from Shopify to the local database.
+        
+        Memberships come from paging through the store's collects (custom
+        collections) and each smart collection's product list, fetched by a
+        bounded pool of workers, and are written set-based. progress, if
+        given, is called as smart collections' products are fetched.
+        """
         if not self.is_configured():
             return {'error': 'Shopify integration not configured', 'imported': 0}
         
         print("Starting import of collections from Shopify...")
-        shopify_collections = self.get_all_collections()
+        shopify_collections = self.get_all_collections(fields=COLLECTION_IMPORT_FIELDS)
         
         if 'error' in shopify_collections:
             return shopify_collections
@@ -509,91 +1386,60 @@ class ShopifyIntegration:
         collections = shopify_collections.get('collections', [])
         print(f"Found {len(collections)} collections in Shopify")
         
-        imported_count = 0
-        updated_count = 0
+        store = self._resolve_store(current_store)
+        imported_count, updated_count = self._upsert_collections(db, collections, store)
+        db.session.commit()
         
-        # Get the current store from the normalized URL
-        from store_management import normalize_url
-        from models import Store
+        # Fetch every collection's members before touching the local memberships
+        memberships = {str(shopify_collection.get('id')): set() for shopify_collection in collections}
+        smart_collection_ids = [
+            str(shopify_collection.get('id')) for shopify_collection in collections if 'rules' in shopify_collection
+        ]
         
-        store = None
-        if current_store:
-            store = current_store
-        else:
-            normalized_url = normalize_url(self.store_url)
-            store = Store.query.filter_by(url=normalized_url).first()
+        # Set when the import gives up, so fetches already running stop at their next page
+        stop = threading.Event()
         
-        for shopify_collection in collections:
-            # Extract collection data
-            collection_id = str(shopify_collection.get('id'))
-            collection_title = shopify_collection.get('title', '')
-            collection_handle = shopify_collection.get('handle', '')
-            collection_body_html = shopify_collection.get('body_html', '')
-            
-            # Check if collection already exists in database
-            existing_collection = Collection.query.filter_by(shopify_id=collection_id).first()
-            
-            if existing_collection:
-                # Update existing collection
-                existing_collection.name = collection_title
-                existing_collection.slug = collection_handle
-                existing_collection.description = collection_body_html
-                updated_count += 1
-            else:
-                # Create new collection
-                new_collection = Collection(
-                    name=collection_title,
-                    slug=collection_handle,
-                    description=collection_body_html,
-                    shopify_id=collection_id
-                )
-                
-                # Associate with store if available
-                if store:
-                    new_collection.store_id = store.id
-                db.session.add(new_collection)
-                imported_count += 1
+        def fetch_collects():
+            # Custom collections: one paged pass over the store-wide collects feed
+            for collection_id, product_id in self.iter_collects(stop=stop):
+                if collection_id in memberships:
+                    memberships[collection_id].add(product_id)
         
-        db.session.commit()
+        def fetch_smart_collection(collection_id):
+            # Smart collections have no collects, so page through their products
+            return collection_id, set(self.iter_collection_product_ids(collection_id, stop=stop))
         
-        # Now fetch products for each collection
-        for shopify_collection in collections:
-            collection_id = str(shopify_collection.get('id'))
-            
-            # Get the local collection
-            local_collection = Collection.query.filter_by(shopify_id=collection_id).first()
-            if not local_collection:
-                continue
+        # The collects feed and the smart collection fetches run side by side;
+        # every worker shares the store's rate governor
+        executor = ThreadPoolExecutor(max_workers=self.fetch_workers)
+        try:
+            futures = [executor.submit(fetch_collects)]
+            futures += [executor.submit(fetch_smart_collection, collection_id) for collection_id in smart_collection_ids]
             
-            # Get products in this collection from Shopify
-            try:
-                url = f"{self.store_url}/admin/api/2023-07/collections/{collection_id}/products.json?limit=250"
-                response = requests.get(url, headers=self.headers)
-                response.raise_for_status()
-                
-                collection_products = response.json().get('products', [])
-                print(f"Found {len(collection_products)} products in collection {local_collection.name}")
-                
-                # Clear existing products
-                local_collection.products = []
-                
-                # Add products to collection
-                for shopify_product in collection_products:
-                    product_id = str(shopify_product.get('id'))
-                    local_product = Product.query.filter_by(shopify_id=product_id).first()
-                    
-                    if local_product and local_product not in local_collection.products:
-                        local_collection.products.append(local_product)
-                
-                db.session.commit()
-                
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching products for collection {collection_id}: {str(e)}")
+            for done, future in enumerate(futures[1:], 1):
+                collection_id, product_ids = future.result()
+                memberships[collection_id] = product_ids
+                if progress:
+                    progress(done, len(futures), message=f"Fetched products of {done} smart collections")
+            futures[0].result()
+            if progress:
+                progress(len(futures), len(futures), message="Fetched custom collection memberships")
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching collection products: {str(e)}")
+            return {'error': f"Error fetching collection products: {str(e)}", 'imported': imported_count}
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        linked_count = self._replace_collection_products(db, store, memberships)
+        db.session.commit()
+        print(f"Linked {linked_count} products to {len(memberships)} collections")
         
         return {
             'success': True,
             'imported': imported_count,
             'updated': updated_count,
+            'linked': linked_count,
             'total': len(collections)
         }
     
@@ -605,7 +1451,7 @@ class ShopifyIntegration:
         url = f"{self.store_url}/admin/api/2023-07/smart_collections.json"
         
         try:
-            response = requests.post(url, headers=self.headers, json=collection_data)
+            response = self._request('POST', url, json=collection_data)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -676,7 +1522,19 @@ class ShopifyIntegration:
                     "type": "single_line_text_field"
                 })
             
-            print(f"Exporting custom collection to Shopify: {json.dumps(collection_data, indent=2)}")
+            # Members travel with the create request; any beyond the first chunk
+            # are added with the bulk membership mutation
+            local_ids = {product.shopify_id: product.id for product in collection.products if product.shopify_id}
+            member_ids = list(local_ids)
+            member_errors = {
+                product.id: 'Product has not been exported to Shopify'
+                for product in collection.products if not product.shopify_id
+            }
+            collection_data["custom_collection"]["collects"] = [
+                {"product_id": product_id} for product_id in member_ids[:COLLECTION_MEMBER_CHUNK_SIZE]
+            ]
+            
+            print(f"Exporting custom collection {collection.name} to Shopify with {len(member_ids)} products")
             
             result = self.create_collection(collection_data)
             
@@ -686,14 +1544,18 @@ class ShopifyIntegration:
             # Get collection ID
             collection_id = result['custom_collection']['id']
             
-            # Add products to collection
-            products_added = 0
-            for product in collection.products:
-                if product.shopify_id:
-                    add_result = self.add_product_to_collection(collection_id, product.shopify_id)
-                    if 'error' not in add_result:
-                        products_added += 1
+            # Add the remaining products to the collection
+            if len(member_ids) > COLLECTION_MEMBER_CHUNK_SIZE:
+                failed = self.add_products_to_collection(collection_id, member_ids[COLLECTION_MEMBER_CHUNK_SIZE:])
+                member_errors.update((local_ids[product_id], error) for product_id, error in failed.items())
+            
+            for product_id, error in member_errors.items():
+                print(f"Could not add product {product_id} to collection {collection.name}: {error}")
             
+            products_added = len(collection.products) - len(member_errors)
             print(f"Added {products_added} products to collection {collection.name} in Shopify")
             
+            # Per-member failures, keyed by local product ID
+            result['products_added'] = products_added
+            result['member_errors'] = member_errors
             return result
@@ -0,0 +1,604 @@
+"""
+Local mock of the Shopify Admin REST API.
+This module serves a synthetic catalog over HTTP so the Shopify integration
+can be exercised and benchmarked offline.
+
+Usage:
+    python shopify_mock_server.py [port] [product_count] [bulk_fixture.jsonl]
+"""
+
+import re
+import sys
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode, quote
+
+API_PREFIX = '/admin/api/2023-07'
+
+def now():
+    """Current UTC time in Shopify's timestamp format."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+def parse_time(value):
+    """Parse a Shopify timestamp (query strings turn '+' into a space)."""
+    return datetime.fromisoformat(value.replace(' ', '+'))
+
+def bulk_product_rows(product):
+    """Flatten a product into bulk operation JSONL rows (parent first, then children)."""
+    gid = f"gid://shopify/Product/{product['id']}"
+    yield {
+        'id': gid,
+        'title': product.get('title'),
+        'descriptionHtml': product.get('body_html'),
+        'tags': [tag.strip() for tag in (product.get('tags') or '').split(',') if tag.strip()],
+        'featuredImage': {'url': product['images'][0]['src']} if product.get('images') else None
+    }
+    for variant in product.get('variants', []):
+        yield {
+            'id': f"gid://shopify/ProductVariant/{variant['id']}",
+            'price': variant['price'],
+            '__parentId': gid
+        }
+
+def project(item, query):
+    """Keep only the fields requested in the query string, like Shopify's fields parameter."""
+    if 'fields' not in query:
+        return item
+    fields = query['fields'][0].split(',')
+    return {key: value for key, value in item.items() if key in fields}
+
+def make_product(index):
+    """Build a synthetic Shopify product resembling a real catalog entry."""
+    product_id = 1000000 + index
+    product = {
+        'id': product_id,
+        'title': f'Synthetic Product {index}',
+        'body_html': f'<p>Description for synthetic product {index}.</p>',
+        'vendor': 'Mock Vendor',
+        'product_type': 'Mock Type',
+        'handle': f'synthetic-product-{index}',
+        'created_at': '2024-01-01T00:00:00-00:00',
+        'updated_at': '2024-01-01T00:00:00-00:00',
+        'tags': f'mock tag {index % 50}, shared mock tag',
+        'status': 'active',
+        'published_at': '2024-01-01T00:00:00-00:00',
+        'published_scope': 'web',
+        'template_suffix': None,
+        'admin_graphql_api_id': f'gid://shopify/Product/{product_id}',
+        'variants': [
+            {
+                'id': product_id * 10 + v,
+                'product_id': product_id,
+                'title': f'Variant {v}',
+                'price': f'{10 + v}.99',
+                'compare_at_price': None,
+                'sku': f'SKU-{index}-{v}',
+                'barcode': None,
+                'position': v + 1,
+                'option1': f'Variant {v}',
+                'option2': None,
+                'option3': None,
+                'grams': 500,
+                'weight': 0.5,
+                'weight_unit': 'kg',
+                'taxable': True,
+                'requires_shipping': True,
+                'inventory_item_id': product_id * 100 + v,
+                'inventory_management': 'shopify',
+                'inventory_policy': 'deny',
+                'inventory_quantity': 10,
+                'fulfillment_service': 'manual',
+                'image_id': None,
+                'created_at': '2024-01-01T00:00:00-00:00',
+                'updated_at': '2024-01-01T00:00:00-00:00',
+                'admin_graphql_api_id': f'gid://shopify/ProductVariant/{product_id * 10 + v}'
+            }
+            for v in range(3)
+        ],
+        'options': [
+            {
+                'id': product_id,
+                'product_id': product_id,
+                'name': 'Title',
+                'position': 1,
+                'values': [f'Variant {v}' for v in range(3)]
+            }
+        ],
+        'images': [
+            {
+                'id': product_id * 10 + i,
+                'product_id': product_id,
+                'position': i + 1,
+                'alt': f'Synthetic product {index} image {i + 1}',
+                'width': 1200,
+                'height': 1200,
+                'src': f'https://cdn.example.com/products/{index}/{i}.jpg',
+                'variant_ids': [],
+                'created_at': '2024-01-01T00:00:00-00:00',
+                'updated_at': '2024-01-01T00:00:00-00:00',
+                'admin_graphql_api_id': f'gid://shopify/ProductImage/{product_id * 10 + i}'
+            }
+            for i in range(2)
+        ]
+    }
+    product['image'] = product['images'][0]
+    return product
+
+def collection_members(state, collection_id):
+    """Products in a collection: from collects for custom ones, tag rules for smart ones."""
+    for smart_collection in state['smart_collections']:
+        if smart_collection['id'] == collection_id:
+            conditions = set(rule['condition'] for rule in smart_collection.get('rules', []))
+            return [
+                p for p in state['products']
+                if conditions & set(tag.strip() for tag in p['tags'].split(','))
+            ]
+    
+    product_ids = set(c['product_id'] for c in state['collects'] if c['collection_id'] == collection_id)
+    return [p for p in state['products'] if p['id'] in product_ids]
+
+def seed_collections(state, collection_count):
+    """Add custom collections (with collects) and tag-based smart collections to the catalog."""
+    products = state['products']
+    for index in range(collection_count):
+        collection_id = 2000000 + index
+        state['custom_collections'].append({
+            'id': collection_id,
+            'title': f'Custom Collection {index}',
+            'handle': f'custom-collection-{index}',
+            'body_html': ''
+        })
+        for offset, product in enumerate(products[index::collection_count]):
+            state['collects'].append({
+                'id': collection_id * 1000 + offset,
+                'collection_id': collection_id,
+                'product_id': product['id']
+            })
+        
+        state['smart_collections'].append({
+            'id': 3000000 + index,
+            'title': f'Smart Collection {index}',
+            'handle': f'smart-collection-{index}',
+            'body_html': '',
+            'rules': [{'column': 'tag', 'relation': 'equals', 'condition': f'mock tag {index % 50}'}]
+        })
+
+class MockShopifyHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the subset of the Admin API used by the app."""
+    
+    # HTTP/1.1 so that clients can keep connections alive
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+    
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if getattr(self, '_call_limit', None):
+            self.send_header('X-Shopify-Shop-Api-Call-Limit', self._call_limit)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+    
+    def _paginate(self, items, query, resource):
+        """Return one page of items plus a Link header, like Shopify's cursor pagination."""
+        limit = int(query.get('limit', ['50'])[0])
+        offset = int(query.get('offset', ['0'])[0])
+        page = items[offset:offset + limit]
+        
+        headers = {}
+        if offset + limit < len(items):
+            # Like Shopify, the opaque cursor carries the original filters
+            filters = {k: v[0] for k, v in query.items() if k not in ('limit', 'page_info')}
+            filters['offset'] = offset + limit
+            page_info = quote(urlencode(filters), safe='')
+            next_url = f"http://{self.headers.get('Host')}{API_PREFIX}/{resource}.json?limit={limit}&page_info={page_info}"
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        
+        return page, headers
+    
+    def _throttled(self):
+        """Apply the optional leaky bucket; send a 429 and return True when it is full."""
+        bucket = self.server.state.get('bucket')
+        if not bucket:
+            return False
+        
+        with self.server.state['lock']:
+            now = time.monotonic()
+            bucket['level'] = max(0.0, bucket['level'] - (now - bucket['updated_at']) * bucket['leak_rate'])
+            bucket['updated_at'] = now
+            
+            if bucket['level'] + 1 > bucket['size']:
+                self.server.state['throttled'] += 1
+                self._call_limit = f"{bucket['size']}/{bucket['size']}"
+                throttled = True
+            else:
+                bucket['level'] += 1
+                self._call_limit = f"{int(bucket['level'])}/{bucket['size']}"
+                throttled = False
+        
+        if throttled:
+            # Drain the request body so the connection can be reused
+            self._read_json()
+            self._send_json({'errors': 'Exceeded call limit'}, status=429, headers={'Retry-After': '1.0'})
+        return throttled
+    
+    def do_GET(self):
+        self.server.state['get_requests'] += 1
+        if self._throttled():
+            return
+        
+        if self.server.state['latency']:
+            time.sleep(self.server.state['latency'])
+        
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+        if 'page_info' in query:
+            query.update(parse_qs(query['page_info'][0]))
+        state = self.server.state
+        
+        if path == f'{API_PREFIX}/products.json':
+            products = state['products']
+            if 'updated_at_min' in query:
+                since = parse_time(query['updated_at_min'][0])
+                products = [p for p in products if parse_time(p['updated_at']) >= since]
+            page, headers = self._paginate(products, query, 'products')
+            return self._send_json({'products': [project(p, query) for p in page]}, headers=headers)
+        
+        if path == f'{API_PREFIX}/events.json':
+            events = state['events']
+            if 'created_at_min' in query:
+                since = parse_time(query['created_at_min'][0])
+                events = [e for e in events if parse_time(e['created_at']) >= since]
+            if 'verb' in query:
+                events = [e for e in events if e['verb'] == query['verb'][0]]
+            page, headers = self._paginate(events, query, 'events')
+            return self._send_json({'events': page}, headers=headers)
+        
+        if path.startswith(f'{API_PREFIX}/products/') and path.endswith('.json'):
+            product_id = int(path.rsplit('/', 1)[1][:-len('.json')])
+            product = state['products_by_id'].get(product_id)
+            if not product:
+                return self._send_json({'errors': 'Not Found'}, status=404)
+            return self._send_json({'product': project(product, query)})
+        
+        for resource in ('custom_collections', 'smart_collections'):
+            if path == f'{API_PREFIX}/{resource}.json':
+                collections = state[resource]
+                if 'handle' in query:
+                    collections = [c for c in collections if c.get('handle') == query['handle'][0]]
+                page, headers = self._paginate(collections, query, resource)
+                return self._send_json({resource: [project(c, query) for c in page]}, headers=headers)
+        
+        if path == f'{API_PREFIX}/collects.json':
+            collects = state['collects']
+            if 'collection_id' in query:
+                collects = [c for c in collects if str(c['collection_id']) == query['collection_id'][0]]
+            page, headers = self._paginate(collects, query, 'collects')
+            return self._send_json({'collects': [project(c, query) for c in page]}, headers=headers)
+        
+        if path.startswith(f'{API_PREFIX}/collections/') and path.endswith('/products.json'):
+            collection_id = int(path.split('/')[-2])
+            products = collection_members(state, collection_id)
+            page, headers = self._paginate(products, query, f'collections/{collection_id}/products')
+            return self._send_json({'products': [project(p, query) for p in page]}, headers=headers)
+        
+        if path.startswith('/bulk/') and path.endswith('.jsonl'):
+            return self._send_bulk_result()
+        
+        return self._send_json({'errors': 'Not Found'}, status=404)
+    
+    def _send_bulk_result(self):
+        """Stream the bulk operation result as chunked JSONL."""
+        state = self.server.state
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/jsonl')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        
+        def write_chunk(data):
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        
+        if state['bulk_fixture']:
+            # Replay a recorded bulk result verbatim
+            with open(state['bulk_fixture'], 'rb') as fixture:
+                for block in iter(lambda: fixture.read(65536), b''):
+                    write_chunk(block)
+        else:
+            buffer = []
+            for product in state['products']:
+                buffer.extend(json.dumps(row) + '\n' for row in bulk_product_rows(product))
+                if len(buffer) >= 500:
+                    write_chunk(''.join(buffer).encode('utf-8'))
+                    buffer = []
+            if buffer:
+                write_chunk(''.join(buffer).encode('utf-8'))
+        
+        self.wfile.write(b"0\r\n\r\n")
+    
+    def _graphql_cost(self, requested):
+        """Draw query cost points from the GraphQL bucket; returns (throttled, extensions)."""
+        bucket = self.server.state['graphql_bucket']
+        with self.server.state['lock']:
+            now = time.monotonic()
+            bucket['available'] = min(bucket['maximum'],
+                                      bucket['available'] + (now - bucket['updated_at']) * bucket['restore_rate'])
+            bucket['updated_at'] = now
+            
+            throttled = requested > bucket['available']
+            if not throttled:
+                bucket['available'] -= requested
+            
+            return throttled, {'cost': {
+                'requestedQueryCost': requested,
+                'actualQueryCost': None if throttled else requested,
+                'throttleStatus': {
+                    'maximumAvailable': bucket['maximum'],
+                    'currentlyAvailable': int(bucket['available']),
+                    'restoreRate': bucket['restore_rate']
+                }
+            }}
+    
+    def _handle_graphql(self, data):
+        """Answer the bulk operation queries and productUpdate mutations used by the app."""
+        state = self.server.state
+        query = data.get('query', '')
+        variables = data.get('variables') or {}
+        
+        updates = query.count('productUpdate(')
+        throttled, extensions = self._graphql_cost(10 * updates if updates else 10)
+        state['graphql_requests'] += 1
+        if throttled:
+            self.server.state['graphql_throttled'] += 1
+            return self._send_json({
+                'errors': [{'message': 'Throttled', 'extensions': {'code': 'THROTTLED'}}],
+                'extensions': extensions
+            })
+        
+        if 'collectionAddProducts' in query:
+            collection_id = int(variables['id'].rsplit('/', 1)[1])
+            user_errors = []
+            for index, product_gid in enumerate(variables['productIds']):
+                product_id = int(product_gid.rsplit('/', 1)[1])
+                if product_id not in state['products_by_id']:
+                    user_errors.append({'field': ['productIds', str(index)], 'message': 'Product does not exist'})
+                    continue
+                state['collects'].append({
+                    'id': len(state['collects']) + 1,
+                    'collection_id': collection_id,
+                    'product_id': product_id
+                })
+            return self._send_json({'data': {'collectionAddProducts': {
+                'collection': {'id': variables['id']},
+                'userErrors': user_errors
+            }}, 'extensions': extensions})
+        
+        if updates:
+            # Each aliased productUpdate takes its input from the variable of the same name
+            result = {}
+            for alias, product_input in variables.items():
+                product_id = int(product_input['id'].rsplit('/', 1)[1])
+                product = state['products_by_id'].get(product_id)
+                if not product:
+                    result[alias] = {'product': None, 'userErrors': [{'field': ['id'], 'message': 'Product does not exist'}]}
+                    continue
+                
+                product['title'] = product_input.get('title', product['title'])
+                product['body_html'] = product_input.get('descriptionHtml', product['body_html'])
+                if 'tags' in product_input:
+                    product['tags'] = ', '.join(product_input['tags'])
+                product['updated_at'] = now()
+                result[alias] = {'product': {'id': product_input['id']}, 'userErrors': []}
+            
+            return self._send_json({'data': result, 'extensions': extensions})
+        
+        if 'bulkOperationRunQuery' in query:
+            with state['lock']:
+                state['bulk_operation'] = {
+                    'id': f"gid://shopify/BulkOperation/{state['next_id']}",
+                    'polls': 0
+                }
+            return self._send_json({'data': {'bulkOperationRunQuery': {
+                'bulkOperation': {'id': state['bulk_operation']['id'], 'status': 'CREATED'},
+                'userErrors': []
+            }}})
+        
+        if 'currentBulkOperation' in query:
+            operation = state.get('bulk_operation')
+            if not operation:
+                return self._send_json({'data': {'currentBulkOperation': None}})
+            
+            # Report RUNNING on the first poll so clients exercise their polling loop
+            operation['polls'] += 1
+            completed = operation['polls'] > 1
+            return self._send_json({'data': {'currentBulkOperation': {
+                'id': operation['id'],
+                'status': 'COMPLETED' if completed else 'RUNNING',
+                'errorCode': None,
+                'objectCount': str(len(state['products'])),
+                'url': f"http://{self.headers.get('Host')}/bulk/{operation['id'].rsplit('/', 1)[1]}.jsonl" if completed else None
+            }}})
+        
+        return self._send_json({'errors': [{'message': 'Unsupported query'}]}, status=400)
+    
+    def do_PUT(self):
+        if self._throttled():
+            return
+        
+        path = urlparse(self.path).path
+        state = self.server.state
+        
+        if path.startswith(f'{API_PREFIX}/products/') and path.endswith('.json'):
+            product_id = int(path.rsplit('/', 1)[1][:-len('.json')])
+            product = state['products_by_id'].get(product_id)
+            if not product:
+                return self._send_json({'errors': 'Not Found'}, status=404)
+            product.update(self._read_json().get('product', {}))
+            product['updated_at'] = now()
+            return self._send_json({'product': product})
+        
+        for resource, key in (('custom_collections', 'custom_collection'),
+                              ('smart_collections', 'smart_collection')):
+            if path.startswith(f'{API_PREFIX}/{resource}/') and path.endswith('.json'):
+                collection_id = int(path.rsplit('/', 1)[1][:-len('.json')])
+                data = self._read_json()
+                for collection in state[resource]:
+                    if collection['id'] == collection_id:
+                        collection.update(data.get(key, {}), id=collection_id)
+                        return self._send_json({key: collection})
+                return self._send_json({'errors': 'Not Found'}, status=404)
+        
+        return self._send_json({'errors': 'Not Found'}, status=404)
+    
+    def do_POST(self):
+        path = urlparse(self.path).path
+        state = self.server.state
+        
+        # GraphQL is metered by query cost rather than the REST call bucket
+        if path == f'{API_PREFIX}/graphql.json':
+            return self._handle_graphql(self._read_json())
+        
+        if self._throttled():
+            return
+        
+        data = self._read_json()
+        
+        with state['lock']:
+            state['next_id'] += 1
+            new_id = state['next_id']
+        
+        if path == f'{API_PREFIX}/products.json':
+            product = dict(data.get('product', {}), id=new_id, updated_at=now())
+            state['products'].append(product)
+            state['products_by_id'][new_id] = product
+            return self._send_json({'product': product}, status=201)
+        
+        for resource, key in (('custom_collections', 'custom_collection'),
+                              ('smart_collections', 'smart_collection')):
+            if path == f'{API_PREFIX}/{resource}.json':
+                collection = dict(data.get(key, {}), id=new_id)
+                if not collection.get('handle'):
+                    # Shopify derives the handle from the title when none is given
+                    collection['handle'] = re.sub(r'[^a-z0-9]+', '-', collection.get('title', '').lower()).strip('-')
+                
+                # Custom collections can be created together with their collects
+                for collect in collection.pop('collects', None) or []:
+                    state['collects'].append({
+                        'id': len(state['collects']) + 1,
+                        'collection_id': new_id,
+                        'product_id': int(collect['product_id'])
+                    })
+                
+                state[resource].append(collection)
+                return self._send_json({key: collection}, status=201)
+        
+        if path == f'{API_PREFIX}/collects.json':
+            collect = dict(data.get('collect', {}), id=new_id)
+            state['collects'].append(collect)
+            return self._send_json({'collect': collect}, status=201)
+        
+        return self._send_json({'errors': 'Not Found'}, status=404)
+    
+    def do_DELETE(self):
+        if self._throttled():
+            return
+        
+        path = urlparse(self.path).path
+        state = self.server.state
+        
+        if path.startswith(f'{API_PREFIX}/products/') and path.endswith('.json'):
+            product_id = int(path.rsplit('/', 1)[1][:-len('.json')])
+            product = state['products_by_id'].pop(product_id, None)
+            if product:
+                state['products'].remove(product)
+                state['events'].append({
+                    'id': len(state['events']) + 1,
+                    'subject_id': product_id,
+                    'subject_type': 'Product',
+                    'verb': 'destroy',
+                    'created_at': now()
+                })
+            return self._send_json({})
+        
+        return self._send_json({'errors': 'Not Found'}, status=404)
+
+def create_mock_server(port=0, product_count=100, bucket_size=None, leak_rate=2.0, bulk_fixture=None,
+                       collection_count=0, latency=0.0):
+    """Create a mock Shopify server bound to localhost (port 0 picks a free port).
+    
+    When bucket_size is given, calls are metered with a leaky bucket like
+    Shopify's and rejected with 429 once it overflows. Bulk operation results
+    are generated from the synthetic catalog, or replayed from the JSONL file
+    at bulk_fixture. collection_count custom and smart collections are seeded,
+    and every GET is delayed by latency seconds to mimic a network round trip.
+    """
+    products = [make_product(i) for i in range(product_count)]
+    
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockShopifyHandler)
+    server.daemon_threads = True
+    server.state = {
+        'lock': threading.Lock(),
+        'next_id': 9000000,
+        'products': products,
+        'products_by_id': {p['id']: p for p in products},
+        'custom_collections': [],
+        'smart_collections': [],
+        'collects': [],
+        'events': [],
+        'throttled': 0,
+        'graphql_throttled': 0,
+        'graphql_requests': 0,
+        'graphql_bucket': {
+            'maximum': 1000.0,
+            'restore_rate': 50.0,
+            'available': 1000.0,
+            'updated_at': time.monotonic()
+        },
+        'get_requests': 0,
+        'latency': latency,
+        'bulk_fixture': bulk_fixture,
+        'bulk_operation': None,
+        'bucket': {
+            'size': bucket_size,
+            'leak_rate': leak_rate,
+            'level': 0.0,
+            'updated_at': time.monotonic()
+        } if bucket_size else None
+    }
+    seed_collections(server.state, collection_count)
+    return server
+
+def start_mock_server(port=0, product_count=100, bucket_size=None, leak_rate=2.0, bulk_fixture=None,
+                      collection_count=0, latency=0.0):
+    """Start a mock server on a background thread and return it with its base URL."""
+    server = create_mock_server(port, product_count, bucket_size, leak_rate, bulk_fixture,
+                                collection_count, latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    product_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    bulk_fixture = sys.argv[3] if len(sys.argv) > 3 else None
+    
+    server = create_mock_server(port, product_count, bulk_fixture=bulk_fixture)
+    print(f"Mock Shopify server with {product_count} products listening on http://127.0.0.1:{port}")
+    server.serve_forever()
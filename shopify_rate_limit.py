@@ -0,0 +1,197 @@
+"""
+Client-side rate governors for the Shopify Admin API.
+Shopify meters REST calls with a leaky bucket per store and reports its fill
+level in the X-Shopify-Shop-Api-Call-Limit header. GraphQL calls draw query
+cost points from a separate bucket reported in extensions.cost. This module
+mirrors both buckets locally so requests are paced just under the limits
+instead of running into 429s or THROTTLED errors.
+"""
+
+import time
+import threading
+from config import Config
+from retry_backoff import retry_after_seconds
+
+# Shopify buckets drain completely in about 20 seconds (40 at 2/s, 400 at 20/s on Plus)
+BUCKET_DRAIN_SECONDS = 20.0
+
+# Statuses that are retried transparently
+RATE_LIMITED_STATUS = 429
+SERVER_ERROR_STATUSES = {500, 502, 503, 504}
+
+# Methods that are safe to resend after a server error
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE'}
+
+# GraphQL cost bucket on standard plans (Plus stores report larger values)
+GRAPHQL_BUCKET_SIZE = 1000.0
+GRAPHQL_RESTORE_RATE = 50.0
+
+_governors = {}
+_cost_governors = {}
+_governors_lock = threading.Lock()
+
+class LeakyBucketGovernor:
+    """Local model of one store's Shopify call bucket, shared by all threads."""
+    
+    def __init__(self, bucket_size=40, headroom=None):
+        self.bucket_size = bucket_size
+        self.leak_rate = bucket_size / BUCKET_DRAIN_SECONDS
+        self.headroom = Config.SHOPIFY_RATE_HEADROOM if headroom is None else headroom
+        
+        self._level = 0.0
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._throttled = 0
+        self._lock = threading.Lock()
+    
+    def _leak(self, now):
+        """Drain the bucket for the time elapsed since the last update."""
+        self._level = max(0.0, self._level - (now - self._updated_at) * self.leak_rate)
+        self._updated_at = now
+    
+    def acquire(self):
+        """Block until a call fits in the bucket, then reserve a slot for it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._leak(now)
+                
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._level + 1 <= self.bucket_size - self.headroom:
+                    self._level += 1
+                    return
+                else:
+                    wait = (self._level + 1 - (self.bucket_size - self.headroom)) / self.leak_rate
+            
+            time.sleep(wait)
+    
+    def update(self, response):
+        """Resynchronize the local bucket with the fill level Shopify reported."""
+        call_limit = response.headers.get('X-Shopify-Shop-Api-Call-Limit')
+        
+        with self._lock:
+            now = time.monotonic()
+            self._leak(now)
+            
+            if call_limit:
+                try:
+                    used, size = (int(part) for part in call_limit.split('/'))
+                except ValueError:
+                    used, size = None, None
+                
+                if size:
+                    self.bucket_size = size
+                    self.leak_rate = size / BUCKET_DRAIN_SECONDS
+                    self._level = float(used)
+            
+            if response.status_code == RATE_LIMITED_STATUS:
+                # The bucket is full; hold every caller until Shopify says to retry
+                self._throttled += 1
+                self._level = float(self.bucket_size)
+                self._blocked_until = max(self._blocked_until, now + retry_after_seconds(response))
+    
+    def status(self):
+        """Return the current estimated bucket state and the number of throttled calls so far."""
+        with self._lock:
+            self._leak(time.monotonic())
+            return {
+                'level': round(self._level, 2),
+                'bucket_size': self.bucket_size,
+                'leak_rate': self.leak_rate,
+                'throttled': self._throttled
+            }
+
+class QueryCostGovernor:
+    """Local model of one store's GraphQL query cost bucket, shared by all threads."""
+    
+    def __init__(self, maximum=GRAPHQL_BUCKET_SIZE, restore_rate=GRAPHQL_RESTORE_RATE):
+        self.maximum = maximum
+        self.restore_rate = restore_rate
+        
+        self._available = maximum
+        self._updated_at = time.monotonic()
+        self._throttled = 0
+        self._lock = threading.Lock()
+    
+    def _restore(self, now):
+        """Refill the bucket for the time elapsed since the last update."""
+        self._available = min(self.maximum, self._available + (now - self._updated_at) * self.restore_rate)
+        self._updated_at = now
+    
+    def acquire(self, cost):
+        """Block until the bucket holds enough points for a query, then reserve them."""
+        cost = min(float(cost), self.maximum)
+        
+        while True:
+            with self._lock:
+                self._restore(time.monotonic())
+                
+                if self._available >= cost:
+                    self._available -= cost
+                    return
+                wait = (cost - self._available) / self.restore_rate
+            
+            time.sleep(wait)
+    
+    def update(self, result):
+        """Resynchronize the local bucket with the throttle status Shopify reported."""
+        cost = (result.get('extensions') or {}).get('cost') or {}
+        throttle_status = cost.get('throttleStatus')
+        if not throttle_status:
+            return
+        
+        with self._lock:
+            self._restore(time.monotonic())
+            if is_throttled(result):
+                self._throttled += 1
+            self.maximum = float(throttle_status['maximumAvailable'])
+            self.restore_rate = float(throttle_status['restoreRate'])
+            self._available = float(throttle_status['currentlyAvailable'])
+    
+    def status(self):
+        """Return the current estimated bucket state and the number of throttled calls so far."""
+        with self._lock:
+            self._restore(time.monotonic())
+            return {
+                'available': round(self._available, 2),
+                'maximum': self.maximum,
+                'restore_rate': self.restore_rate,
+                'throttled': self._throttled
+            }
+
+def get_governor(store_url):
+    """Get the rate governor for a store, creating it on first use."""
+    key = (store_url or '').lower().rstrip('/')
+    
+    with _governors_lock:
+        governor = _governors.get(key)
+        if governor is None:
+            governor = LeakyBucketGovernor()
+            _governors[key] = governor
+        return governor
+
+def get_cost_governor(store_url):
+    """Get the GraphQL query cost governor for a store, creating it on first use."""
+    key = (store_url or '').lower().rstrip('/')
+    
+    with _governors_lock:
+        governor = _cost_governors.get(key)
+        if governor is None:
+            governor = QueryCostGovernor()
+            _cost_governors[key] = governor
+        return governor
+
+def is_throttled(result):
+    """Check whether a GraphQL response was rejected for exceeding the cost budget."""
+    return any(
+        (error.get('extensions') or {}).get('code') == 'THROTTLED'
+        for error in result.get('errors') or []
+        if isinstance(error, dict)
+    )
+
+def should_retry(method, response):
+    """Check whether a response is worth retrying transparently."""
+    if response.status_code == RATE_LIMITED_STATUS:
+        return True
+    return response.status_code in SERVER_ERROR_STATUSES and method.upper() in IDEMPOTENT_METHODS
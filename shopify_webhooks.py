@@ -0,0 +1,211 @@
+"""
+Shopify webhook handling.
+Webhooks are verified and written to the webhook_events table by the request
+handler, then applied to the local database in batches by a background thread,
+so a burst of thousands of events never holds up a web worker.
+"""
+
+import os
+import hmac
+import json
+import base64
+import hashlib
+import threading
+from datetime import datetime
+from sqlalchemy import func
+from config import Config
+from models import db, WebhookEvent, Store
+from shopify_integration import ShopifyIntegration
+
+# Topics the receiver accepts, mapped to the kind of entity they change
+SUPPORTED_TOPICS = {
+    'products/create': 'product',
+    'products/update': 'product',
+    'products/delete': 'product',
+    'collections/create': 'collection',
+    'collections/update': 'collection',
+    'collections/delete': 'collection'
+}
+
+def get_webhook_secret():
+    """Get the webhook secret, preferring the runtime environment (updated from the UI)."""
+    return os.environ.get('SHOPIFY_WEBHOOK_SECRET') or Config.SHOPIFY_WEBHOOK_SECRET
+
+def verify_webhook(raw_body, hmac_header, secret=None):
+    """Check a webhook's X-Shopify-Hmac-Sha256 header against the raw request body."""
+    secret = secret or get_webhook_secret()
+    if not secret or not hmac_header:
+        return False
+    
+    digest = hmac.new(secret.encode('utf-8'), raw_body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode('ascii'), hmac_header)
+
+def entity_key(event):
+    """The store and entity an event changes, or the event itself if it changes nothing supported."""
+    kind = SUPPORTED_TOPICS.get(event.topic)
+    if kind and event.shopify_id:
+        return (event.store_id, kind, event.shopify_id)
+    return ('event', event.id)
+
+def event_version(event):
+    """Sort key putting an entity's events in the order Shopify made the changes.
+    
+    Webhooks can arrive out of order, so the payload's updated_at decides
+    rather than the order they were received in. A delete always wins, since
+    a deleted entity never comes back under the same id.
+    """
+    updated_at = json.loads(event.payload or '{}').get('updated_at')
+    try:
+        timestamp = datetime.fromisoformat(updated_at).timestamp() if updated_at else float('-inf')
+    except ValueError:
+        timestamp = float('-inf')
+    return (event.topic.endswith('/delete'), timestamp, event.id)
+
+def enqueue_webhook(store, topic, payload):
+    """Record a verified webhook for the background processor."""
+    event = WebhookEvent(
+        store_id=store.id if store else None,
+        topic=topic,
+        shopify_id=str(payload.get('id')) if payload.get('id') else None,
+        payload=json.dumps(payload)
+    )
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+class WebhookProcessor:
+    """Background thread that applies queued webhook events in batches."""
+    
+    def __init__(self, app, batch_size=None, flush_interval=None):
+        self.app = app
+        self.batch_size = batch_size or Config.WEBHOOK_BATCH_SIZE
+        self.flush_interval = flush_interval or Config.WEBHOOK_FLUSH_INTERVAL
+        
+        # Only the local upsert helpers are used, so no credentials are needed
+        self.shopify = ShopifyIntegration()
+        
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the processor thread if it is not already running."""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._thread = threading.Thread(target=self._run, name='webhook-processor', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Ask the processor thread to exit after its current batch."""
+        self._stop.set()
+        self._wake.set()
+    
+    def notify(self):
+        """Wake the processor early because new events have arrived."""
+        self._wake.set()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            # Wait briefly so a burst of events is applied as one batch
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._stop.wait(min(self.flush_interval, 0.5))
+            
+            with self.app.app_context():
+                try:
+                    while self.process_batch():
+                        pass
+                except Exception as e:
+                    print(f"Error processing webhook events: {str(e)}")
+                finally:
+                    db.session.remove()
+    
+    def process_batch(self):
+        """Apply the next batch of queued events. Returns the number of events handled.
+        
+        The batch is applied in one transaction. If that fails, its events are
+        applied again one entity at a time, so only the events of the entity
+        that failed are left for a later attempt.
+        """
+        events = (
+            WebhookEvent.query
+            .filter(WebhookEvent.processed_at.is_(None))
+            .filter(WebhookEvent.attempts < Config.WEBHOOK_MAX_ATTEMPTS)
+            .order_by(WebhookEvent.id)
+            .limit(self.batch_size)
+            .all()
+        )
+        if not events:
+            return 0
+        event_ids = [event.id for event in events]
+        
+        try:
+            self.apply_events(events)
+            self._mark_processed(event_ids)
+            db.session.commit()
+            print(f"Processed {len(event_ids)} webhook events")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error applying {len(event_ids)} webhook events, applying them one entity at a time: {str(e)}")
+            self.apply_entities_separately(event_ids)
+        
+        return len(event_ids)
+    
+    def apply_entities_separately(self, event_ids):
+        """Apply events one entity at a time, counting an attempt and the error only on entities that fail."""
+        events = WebhookEvent.query.filter(WebhookEvent.id.in_(event_ids)).order_by(WebhookEvent.id).all()
+        groups = {}
+        for event in events:
+            groups.setdefault(entity_key(event), []).append(event.id)
+        
+        processed = failed = 0
+        for group_ids in groups.values():
+            try:
+                self.apply_events(WebhookEvent.query.filter(WebhookEvent.id.in_(group_ids)).all())
+                self._mark_processed(group_ids)
+                db.session.commit()
+                processed += len(group_ids)
+            except Exception as e:
+                db.session.rollback()
+                
+                # Counting attempts stops a poison event from blocking the queue forever
+                WebhookEvent.query.filter(WebhookEvent.id.in_(group_ids)).update(
+                    {'attempts': func.coalesce(WebhookEvent.attempts, 0) + 1, 'error': str(e)}, synchronize_session=False
+                )
+                db.session.commit()
+                failed += len(group_ids)
+                print(f"Error applying webhook events {group_ids}: {str(e)}")
+        
+        print(f"Processed {processed} webhook events, {failed} failed")
+    
+    def _mark_processed(self, event_ids):
+        WebhookEvent.query.filter(WebhookEvent.id.in_(event_ids)).update(
+            {'processed_at': datetime.utcnow(), 'error': None}, synchronize_session=False
+        )
+    
+    def apply_events(self, events):
+        """Coalesce events per entity (the newest change wins) and apply them per store. The caller commits."""
+        latest = {}
+        for event in events:
+            key = entity_key(event)
+            if key[0] != 'event' and (key not in latest or event_version(event) > event_version(latest[key])):
+                latest[key] = event
+        
+        stores = {}
+        for (store_id, kind, shopify_id), event in latest.items():
+            changes = stores.setdefault(store_id, {
+                'product_upserts': [], 'product_deletes': [],
+                'collection_upserts': [], 'collection_deletes': []
+            })
+            action = 'deletes' if event.topic.endswith('/delete') else 'upserts'
+            value = shopify_id if action == 'deletes' else json.loads(event.payload)
+            changes[f'{kind}_{action}'].append(value)
+        
+        for store_id, changes in stores.items():
+            store = Store.query.get(store_id) if store_id else None
+            
+            self.shopify._upsert_products(db, changes['product_upserts'], store)
+            self.shopify._delete_local_products(db, store, changes['product_deletes'])
+            self.shopify._upsert_collections(db, changes['collection_upserts'], store)
+            self.shopify._delete_local_collections(db, store, changes['collection_deletes'])
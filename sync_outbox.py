@@ -0,0 +1,136 @@
+"""
+Pushes locally changed products and collections to Shopify.
+Changes are recorded in the sync_outbox table by a flush hook in models.py.
+Draining coalesces all pending entries for an entity into a single write, so
+the cost of a push follows the number of changed entities, not catalog size.
+"""
+
+from datetime import datetime
+from sqlalchemy import update, func
+from config import Config
+from models import db, SyncOutbox, Product, Collection, outbox_suppressed
+from shopify_integration import shopify_handle
+
+def pending_entries(store=None):
+    """Query outbox entries that still need to be pushed."""
+    query = (
+        SyncOutbox.query
+        .filter(SyncOutbox.processed_at.is_(None))
+        .filter(SyncOutbox.attempts < Config.OUTBOX_MAX_ATTEMPTS)
+    )
+    if store:
+        query = query.filter(SyncOutbox.store_id == store.id)
+    return query
+
+def mark_pushed(entity_type, entity_id):
+    """Mark an entity's pending outbox entries as pushed, after its current state was sent to Shopify another way.
+    
+    Exports call this so the next drain doesn't send the same state again.
+    The caller commits.
+    """
+    db.session.execute(
+        update(SyncOutbox)
+        .where(
+            SyncOutbox.entity_type == entity_type,
+            SyncOutbox.entity_id == entity_id,
+            SyncOutbox.processed_at.is_(None)
+        )
+        .values(processed_at=datetime.utcnow(), error=None)
+    )
+
+def push_entity(shopify, entity_type, entity_id):
+    """Push the current state of one product or collection to Shopify."""
+    if entity_type == 'product':
+        product = Product.query.get(entity_id)
+        if not product:
+            # Deleted locally since the change was recorded
+            return {'success': True, 'skipped': True}
+        
+        # Unchanged products are skipped by their sync hash without a request
+        return shopify.export_product_to_shopify(product)
+    
+    collection = Collection.query.get(entity_id)
+    if not collection:
+        return {'success': True, 'skipped': True}
+    
+    if collection.shopify_id:
+        return shopify.update_collection(collection)
+    
+    # A push that created the collection but failed before recording its id is found by its handle
+    existing = shopify.find_collection_by_handle(collection.slug or shopify_handle(collection.name))
+    if 'error' in existing:
+        return existing
+    if existing:
+        collection.shopify_id = existing['id']
+        return shopify.update_collection(collection)
+    
+    result = shopify.export_collection_to_shopify(collection)
+    for kind in ('custom_collection', 'smart_collection'):
+        if kind in result and 'id' in result[kind]:
+            collection.shopify_id = str(result[kind]['id'])
+    return result
+
+def drain_outbox(shopify, store=None, batch_size=None):
+    """Push pending outbox entries to Shopify in batches.
+    
+    Only entries recorded before the drain started are pushed; edits made
+    while it runs wait for the next drain. Every Shopify call goes through the
+    store's rate governor. Entities that fail keep their entries for a later
+    retry, up to OUTBOX_MAX_ATTEMPTS.
+    """
+    batch_size = batch_size or Config.OUTBOX_BATCH_SIZE
+    last_id = db.session.query(func.max(SyncOutbox.id)).scalar() or 0
+    cursor = 0
+    pushed_count = 0
+    unchanged_count = 0
+    failed_count = 0
+    
+    with outbox_suppressed():
+        while True:
+            entries = (
+                pending_entries(store)
+                .filter(SyncOutbox.id > cursor, SyncOutbox.id <= last_id)
+                .order_by(SyncOutbox.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not entries:
+                break
+            cursor = entries[-1].id
+            
+            # One write per entity, however many times it was edited
+            entities = list(dict.fromkeys((entry.entity_type, entry.entity_id) for entry in entries))
+            
+            for entity_type, entity_id in entities:
+                result = push_entity(shopify, entity_type, entity_id)
+                
+                if 'error' in result:
+                    failed_count += 1
+                    values = {'attempts': SyncOutbox.attempts + 1, 'error': str(result['error'])}
+                else:
+                    if result.get('skipped'):
+                        unchanged_count += 1
+                    else:
+                        pushed_count += 1
+                    values = {'processed_at': datetime.utcnow(), 'error': None}
+                
+                db.session.execute(
+                    update(SyncOutbox)
+                    .where(
+                        SyncOutbox.entity_type == entity_type,
+                        SyncOutbox.entity_id == entity_id,
+                        SyncOutbox.processed_at.is_(None),
+                        SyncOutbox.id <= last_id
+                    )
+                    .values(**values)
+                )
+            
+            db.session.commit()
+            print(f"Pushed {pushed_count} changes to Shopify so far ({unchanged_count} unchanged, {failed_count} failed)")
+    
+    return {
+        'success': True,
+        'pushed': pushed_count,
+        'unchanged': unchanged_count,
+        'failed': failed_count
+    }
@@ -0,0 +1,64 @@
+"""
+Script to sync a store's products with Shopify.
+This script is meant to be run from cron: frequent incremental syncs pick up
+recent changes, and a nightly full reconcile catches anything they missed.
+"""
+
+import sys
+from flask import Flask
+from models import db, Store
+from shopify_integration import ShopifyIntegration
+from config import Config
+
+def main():
+    """
+    Main function to sync a store's products.
+    
+    Usage:
+        python sync_products.py <store_id> [--full]
+    """
+    if len(sys.argv) < 2:
+        print("Usage: python sync_products.py <store_id> [--full]")
+        sys.exit(1)
+    
+    try:
+        store_id = int(sys.argv[1])
+    except ValueError:
+        print("Error: store_id must be an integer")
+        sys.exit(1)
+    
+    full = '--full' in sys.argv[2:]
+    
+    # Create a Flask app
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    
+    # Initialize the database
+    db.init_app(app)
+    
+    with app.app_context():
+        store = Store.query.get(store_id)
+        if not store:
+            print(f"Error: Store with ID {store_id} not found")
+            sys.exit(1)
+        
+        shopify = ShopifyIntegration(
+            access_token=store.access_token or Config.SHOPIFY_ACCESS_TOKEN,
+            store_url=f"https://{store.url}"
+        )
+        
+        print(f"{'Reconciling' if full else 'Syncing'} products for store: {store.name} (ID: {store.id})")
+        
+        if full:
+            result = shopify.reconcile_products(db, current_store=store)
+        else:
+            result = shopify.sync_products_incremental(db, current_store=store)
+        
+        if 'error' in result:
+            print(f"Error syncing store {store.name}: {result['error']}")
+            sys.exit(1)
+        
+        print(f"Done: {result['imported']} new, {result['updated']} updated, {result.get('deleted', 0)} deleted")
+
+if __name__ == "__main__":
+    main()
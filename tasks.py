@@ -0,0 +1,385 @@
+"""
+Long-running operations run by the background job runner.
+Each task gets a JobContext in place of the request's current store, reports
+progress through it, and returns a JSON-serializable result for the job row.
+"""
+
+import asyncio
+from flask import current_app
+from sqlalchemy import func
+from config import Config
+from models import db, Product, Tag, Collection, product_tags
+from jobs import task
+from collection_export import get_or_create_export_job, run_export_job
+from claude_batches import BatchPending, run_claude_batch, resume_when_ended
+from sync_outbox import drain_outbox
+
+# Products analyzed by Claude between progress reports
+CLAUDE_BATCH_SIZE = 50
+
+# Products whose tags are written per transaction as Claude's results come in
+TAG_WRITE_BATCH_SIZE = 25
+
+def apply_tags(store, product, tags):
+    """Add Claude's tags to a product, creating the store's tags as needed. Returns the number added."""
+    if not tags or tags == ["error generating tags"] or tags == ["api_key_missing"]:
+        return 0
+    
+    print(f"Adding tags to product {product.id}: {tags}")
+    tags_added = 0
+    
+    for tag_name in tags:
+        # Check if tag exists for this store, create if not
+        tag_query = Tag.query.filter_by(name=tag_name)
+        if store:
+            tag_query = tag_query.filter_by(store_id=store.id)
+        
+        tag = tag_query.first()
+        if not tag:
+            # Double check if tag exists with this name for any store
+            existing_tag = Tag.query.filter_by(name=tag_name).first()
+            if existing_tag:
+                # Tag exists but for a different store, create a new one for this store
+                print(f"Tag {tag_name} exists for another store, creating for current store")
+                tag = Tag(name=f"{tag_name}", store_id=store.id if store else None)
+            else:
+                print(f"Creating new tag: {tag_name}")
+                tag = Tag(name=tag_name)
+                if store:
+                    tag.store_id = store.id
+            
+            db.session.add(tag)
+            try:
+                db.session.flush()  # Flush to get the tag ID
+            except Exception as e:
+                print(f"Error creating tag {tag_name}: {str(e)}")
+                db.session.rollback()
+                continue
+        
+        # Add tag to product if not already added
+        if tag not in product.tags:
+            print(f"Adding tag {tag.name} to product {product.title}")
+            product.tags.append(tag)
+            tags_added += 1
+    
+    return tags_added
+
+@task('auto_tag')
+def auto_tag_products(ctx, product_ids, use_batch=False):
+    """Auto-tag products using Claude, then export the tagged products to Shopify.
+    
+    With use_batch, tags come from a Message Batches API batch instead of live
+    calls: slower to arrive, but cheaper and with no client-side concurrency
+    limit, which suits whole-catalog re-tagging.
+    """
+    store = ctx.store
+    
+    # Get all products to tag (filtered by store)
+    products_query = Product.query.filter(Product.id.in_(product_ids))
+    if store:
+        products_query = products_query.filter_by(store_id=store.id)
+    
+    products = products_query.all()
+    if not products:
+        return {'error': 'No valid products found for auto-tagging'}
+    
+    tagged_count = 0
+    total_tags_added = 0
+    error_count = 0
+    processed_products = []
+    
+    def write_tags(product, tags):
+        """Apply a product's tags as they arrive, committing every TAG_WRITE_BATCH_SIZE products."""
+        nonlocal tagged_count, total_tags_added, error_count
+        
+        processed_products.append(product)
+        if tags in (["error generating tags"], ["api_key_missing"]):
+            error_count += 1
+        
+        tags_added = apply_tags(store, product, tags)
+        if tags_added > 0:
+            tagged_count += 1
+            total_tags_added += tags_added
+        
+        # Progress commits the session, so tags written so far survive a crash
+        if len(processed_products) % TAG_WRITE_BATCH_SIZE == 0 or len(processed_products) == len(products):
+            ctx.progress(len(processed_products), len(products), errors=error_count,
+                         message=f"Tagged {len(processed_products)} of {len(products)} products")
+    
+    if use_batch:
+        # Results are applied as they are streamed back once the batch ends
+        ctx.progress(0, len(products), message='Submitting a Claude batch')
+        try:
+            for product, tags in run_claude_batch(ctx.claude, 'tags', products, store=store, progress=ctx.progress):
+                write_tags(product, tags)
+        except BatchPending as e:
+            # Cached tags are kept; the rest are applied when the job runs again after the batch ends
+            db.session.commit()
+            return resume_when_ended(e.batch, 'auto_tag', product_ids=product_ids, use_batch=True)
+    else:
+        # Tags are written as each product's results complete, not after every call has finished
+        ctx.progress(0, len(products), message='Generating tags with Claude')
+        
+        async def generate_and_write():
+            async for product, tags in ctx.claude.iter_generate_tags(products):
+                write_tags(product, tags)
+        
+        asyncio.run(generate_and_write())
+    
+    db.session.commit()
+    
+    result = {'tagged': tagged_count, 'tags_added': total_tags_added}
+    
+    # Export tagged products to Shopify
+    if Config.SHOPIFY_ACCESS_TOKEN and Config.SHOPIFY_STORE_URL:
+        # Only export products that have tags, many per GraphQL request
+        tagged_products = [product for product in processed_products if product.tags]
+        ctx.progress(0, len(tagged_products), errors=0, message=f'Exporting {len(tagged_products)} tagged products to Shopify')
+        export_result = ctx.shopify.export_products_to_shopify(tagged_products, progress=ctx.progress)
+        
+        # Save Shopify IDs and sync snapshots recorded during export
+        db.session.commit()
+        
+        if 'error' in export_result:
+            result['error'] = f'Error exporting products to Shopify: {export_result["error"]}'
+        else:
+            result.update(
+                exported=export_result['exported'],
+                unchanged=export_result['unchanged'],
+                export_failed=export_result['failed']
+            )
+    else:
+        result['message'] = 'Shopify integration not configured, skipped export'
+    
+    return result
+
+@task('import_products')
+def import_products(ctx):
+    """Import products from Shopify."""
+    ctx.progress(0, message='Importing products from Shopify')
+    
+    # Large catalogs can be pulled with a GraphQL bulk operation instead of REST pages
+    if ctx.store and ctx.store.import_mode == 'bulk':
+        return ctx.shopify.import_products_from_shopify_bulk(db, current_store=ctx.store, progress=ctx.progress)
+    return ctx.shopify.import_products_from_shopify(db, current_store=ctx.store, progress=ctx.progress)
+
+@task('import_collections')
+def import_collections(ctx):
+    """Import collections and their products from Shopify."""
+    ctx.progress(0, message='Importing collections from Shopify')
+    return ctx.shopify.import_collections_from_shopify(db, current_store=ctx.store, progress=ctx.progress)
+
+@task('sync_products')
+def sync_products(ctx, full=False):
+    """Sync products changed in Shopify since the last sync, or fully reconcile.
+    
+    Without a sync watermark the incremental sync falls back to a full reconcile.
+    """
+    ctx.progress(0, message='Reconciling products with Shopify' if full else 'Syncing products changed in Shopify')
+    if full:
+        return ctx.shopify.reconcile_products(db, current_store=ctx.store)
+    return ctx.shopify.sync_products_incremental(db, current_store=ctx.store)
+
+@task('push_changes')
+def push_changes(ctx):
+    """Push products and collections changed locally since the last push."""
+    ctx.progress(0, message='Pushing local changes to Shopify')
+    return drain_outbox(ctx.shopify, store=ctx.store)
+
+def unique_slug(base_slug):
+    """Find a slug no collection uses yet, checked across all stores."""
+    slug = base_slug
+    counter = 1
+    while Collection.query.filter_by(slug=slug).first():
+        slug = f"{base_slug}-{counter}"
+        counter += 1
+    return slug
+
+@task('create_collections_from_tags')
+def create_collections_from_tags(ctx, exclude_imported_tags=False, use_batch=False):
+    """Create collections from tags, then from Claude's categories for untagged products.
+    
+    With use_batch, the categories come from a Message Batches API batch.
+    """
+    store = ctx.store
+    
+    if exclude_imported_tags:
+        print("Only using tags generated by Claude (excluding imported tags)")
+    
+    created_count = 0
+    skipped_count = 0
+    
+    # Get tags with product counts (filtered by store)
+    tag_query = db.session.query(
+        Tag, func.count(product_tags.c.product_id).label('product_count')
+    ).outerjoin(product_tags).group_by(Tag.id)
+    
+    if store:
+        tag_query = tag_query.filter(Tag.store_id == store.id)
+    
+    tag_counts = tag_query.all()
+    ctx.progress(0, len(tag_counts), message='Creating collections from tags')
+    
+    # First, create collections from existing tags
+    for tag, product_count in tag_counts:
+        # Skip tags with no products or only one product
+        if product_count <= 1:
+            print(f"Skipping tag '{tag.name}' with only {product_count} product(s)")
+            skipped_count += 1
+            continue
+        
+        # Skip tags that don't have at least 2 words
+        if len(tag.name.split()) < 2:
+            print(f"Skipping single-word tag: {tag.name}")
+            skipped_count += 1
+            continue
+        
+        # Skip tags that contain underscores
+        if '_' in tag.name:
+            print(f"Skipping tag with underscore: {tag.name}")
+            skipped_count += 1
+            continue
+        
+        # If exclude_imported_tags is True, skip tags that were imported from Shopify
+        if exclude_imported_tags and ('imported' in tag.name.lower() or 'shopify' in tag.name.lower()):
+            print(f"Skipping imported tag: {tag.name}")
+            skipped_count += 1
+            continue
+        
+        # Check if a collection already exists for this tag (filtered by store)
+        collection_query = Collection.query.filter_by(tag_id=tag.id)
+        if store:
+            collection_query = collection_query.filter_by(store_id=store.id)
+        
+        existing_collection = collection_query.first()
+        if not existing_collection:
+            # Generate SEO-friendly title
+            title = f"{tag.name.title()} Collection | Premium {tag.name.title()} Products"
+            
+            # Generate SEO-friendly slug
+            slug = unique_slug(tag.name.lower().replace(' ', '-'))
+            
+            # Get product titles for meta description
+            product_titles = [p.title for p in tag.products[:5]]
+            product_titles_text = ", ".join(product_titles)
+            if len(product_titles) < len(tag.products):
+                product_titles_text += f", and {len(tag.products) - len(product_titles)} more"
+            
+            meta_description = f"Explore our {tag.name} collection featuring {product_titles_text}. Find the perfect {tag.name} for your needs."
+            
+            description = f"""
+            <p>Welcome to our curated collection of {tag.name} products. We've carefully selected {product_count} items that represent the best in quality and value.</p>
+            <p>Whether you're looking for {tag.name} for personal use or as a gift, our collection offers a variety of options to suit your needs.</p>
+            <h2>Why Choose Our {tag.name.title()} Products?</h2>
+            <ul>
+                <li>Premium quality materials and craftsmanship</li>
+                <li>Carefully selected for durability and performance</li>
+                <li>Perfect for both everyday use and special occasions</li>
+                <li>Backed by our satisfaction guarantee</li>
+            </ul>
+            <p>Browse our complete {tag.name} collection below and find the perfect item for you today!</p>
+            """
+            
+            collection = Collection(
+                name=title,
+                slug=slug,
+                meta_description=meta_description,
+                description=description,
+                tag=tag
+            )
+            
+            # Associate with current store
+            if store:
+                collection.store_id = store.id
+            
+            # We don't need to manually add products to the collection
+            # since it's a smart collection based on the tag
+            # The tag relationship will automatically include all products with this tag
+            
+            db.session.add(collection)
+            created_count += 1
+            print(f"Created collection for tag: {tag.name} with {product_count} products")
+    
+    db.session.commit()
+    ctx.progress(len(tag_counts), message=f'Created {created_count} collections from tags')
+    
+    # Now, analyze products without tags to create new collections (filtered by store)
+    untagged_query = Product.query.filter(~Product.tags.any())
+    if store:
+        untagged_query = untagged_query.filter_by(store_id=store.id)
+    
+    untagged_products = untagged_query.all()
+    if untagged_products:
+        ctx.progress(0, len(untagged_products), message=f'Analyzing {len(untagged_products)} untagged products for collections')
+        
+        if use_batch:
+            try:
+                results = list(run_claude_batch(
+                    ctx.claude, 'collection_category', untagged_products, store=store, progress=ctx.progress
+                ))
+            except BatchPending as e:
+                # Collections for tags already exist, so running again only adds the category collections
+                result = resume_when_ended(
+                    e.batch, 'create_collections_from_tags', exclude_imported_tags=exclude_imported_tags, use_batch=True
+                )
+                result.update(created=created_count, skipped=skipped_count)
+                return result
+        else:
+            # Process products in batches asynchronously
+            results = asyncio.run(ctx.claude.batch_analyze_products_for_collections(
+                untagged_products, batch_size=CLAUDE_BATCH_SIZE, progress=ctx.progress
+            ))
+        
+        # Group products by category
+        categories = {}
+        for product, category in results:
+            if category:
+                if category not in categories:
+                    categories[category] = []
+                categories[category].append(product)
+        
+        # Create collections for each category
+        for category, products in categories.items():
+            if len(products) > 0:
+                # Check if a collection already exists for this category (filtered by store)
+                collection_query = Collection.query.filter_by(name=f"{category.capitalize()} Collection")
+                if store:
+                    collection_query = collection_query.filter_by(store_id=store.id)
+                
+                existing_collection = collection_query.first()
+                if not existing_collection:
+                    collection = Collection(
+                        name=f"{category.capitalize()} Collection",
+                        slug=unique_slug(category.lower().replace(' ', '-')),
+                        description=f"Collection of {len(products)} products categorized as '{category}'",
+                    )
+                    
+                    # Associate with current store
+                    if store:
+                        collection.store_id = store.id
+                    
+                    # Add all products with this category
+                    for product in products:
+                        collection.products.append(product)
+                    
+                    db.session.add(collection)
+                    created_count += 1
+        
+        db.session.commit()
+    
+    return {'created': created_count, 'skipped': skipped_count}
+
+@task('export_collections')
+def export_collections(ctx):
+    """Create or resume the store's collection export job and run it."""
+    export_job = get_or_create_export_job(ctx.store)
+    if not export_job:
+        return {'message': 'No collections to export'}
+    
+    ctx.progress(0, message=f'Running collection export job {export_job.id}')
+    return run_export_job(
+        current_app._get_current_object(),
+        export_job.id,
+        ctx.shopify,
+        progress=ctx.progress
+    )
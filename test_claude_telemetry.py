@@ -0,0 +1,20 @@
+from claude_telemetry import percentile
+
+def test_percentile_nearest_rank_odd_length():
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+    assert percentile([5, 3, 1, 4, 2], 50) == 3
+    assert percentile([1, 2, 3], 50) == 2
+    assert percentile([1, 2, 3, 4, 5], 90) == 5
+    assert percentile([1, 2, 3, 4, 5], 20) == 1
+
+def test_percentile_nearest_rank_even_length():
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 75) == 3
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile(list(range(1, 101)), 100) == 100
+
+def test_percentile_edge_cases():
+    assert percentile([], 50) is None
+    assert percentile([7], 50) == 7
+    assert percentile([7], 1) == 7
+    assert percentile([1, 2, 3], 0) == 1
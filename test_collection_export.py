@@ -0,0 +1,64 @@
+from models import db, Collection, Tag, ExportJobItem
+from collection_export import get_or_create_export_job, run_export_job
+
+def add_collections(store):
+    tag = Tag(name='export tag', store_id=store.id)
+    db.session.add(tag)
+    db.session.flush()
+    
+    db.session.add_all([Collection(name=f'Export Collection {i}', store_id=store.id) for i in range(4)])
+    db.session.add(Collection(name='Export Tag Collection', slug='export-tag-collection', store_id=store.id, tag_id=tag.id))
+    db.session.commit()
+
+def remote_counts(server):
+    return len(server.state['custom_collections']), len(server.state['smart_collections'])
+
+def test_rerunning_an_export_job_creates_no_duplicates(app, shopify, shopify_server, store):
+    server, _ = shopify_server
+    add_collections(store)
+    
+    job = get_or_create_export_job(store)
+    result = run_export_job(app, job.id, shopify)
+    assert result['status'] == 'completed'
+    assert remote_counts(server) == (4, 1)
+    
+    # Every collection, smart ones included, has its Shopify id recorded
+    db.session.expire_all()
+    assert Collection.query.filter(Collection.shopify_id.is_(None)).count() == 0
+    assert get_or_create_export_job(store) is None
+    
+    # Running the finished job again exports nothing
+    run_export_job(app, job.id, shopify)
+    assert remote_counts(server) == (4, 1)
+
+def test_interrupted_export_resumes_without_duplicates(app, shopify, shopify_server, store):
+    server, _ = shopify_server
+    add_collections(store)
+    job = get_or_create_export_job(store)
+    
+    # An earlier run created this collection in Shopify but stopped before recording its id
+    collection = Collection.query.filter_by(name='Export Collection 1').one()
+    shopify.export_collection_to_shopify(collection)
+    item = ExportJobItem.query.filter_by(job_id=job.id, collection_id=collection.id).one()
+    item.state = 'in_flight'
+    item.attempts = 1
+    db.session.commit()
+    
+    result = run_export_job(app, job.id, shopify)
+    assert result['status'] == 'completed'
+    assert remote_counts(server) == (4, 1)
+
+def test_collection_already_in_shopify_is_linked_on_first_attempt(app, shopify, shopify_server, store):
+    server, _ = shopify_server
+    add_collections(store)
+    
+    # Exported some other way, so it is in Shopify but has no local shopify_id
+    collection = Collection.query.filter_by(name='Export Tag Collection').one()
+    remote_id = shopify.export_collection_to_shopify(collection)['smart_collection']['id']
+    
+    job = get_or_create_export_job(store)
+    run_export_job(app, job.id, shopify)
+    
+    assert remote_counts(server) == (4, 1)
+    db.session.expire_all()
+    assert Collection.query.filter_by(name='Export Tag Collection').one().shopify_id == str(remote_id)
@@ -0,0 +1,35 @@
+from models import db, Product, Tag, product_tags
+
+def catalog_counts():
+    return (
+        Product.query.count(),
+        Tag.query.count(),
+        db.session.query(product_tags).count()
+    )
+
+def test_import_twice_is_idempotent(shopify, store):
+    first = shopify.import_products_from_shopify(db, current_store=store)
+    assert first['imported'] == 20
+    assert first['failed'] == 0
+    counts = catalog_counts()
+    
+    second = shopify.import_products_from_shopify(db, current_store=store)
+    assert second['imported'] == 0
+    assert second['failed'] == 0
+    assert catalog_counts() == counts
+
+def test_import_updates_changed_products_in_place(shopify, shopify_server, store):
+    server, _ = shopify_server
+    shopify.import_products_from_shopify(db, current_store=store)
+    
+    changed = server.state['products'][0]
+    changed['title'] = 'Renamed in Shopify'
+    changed['tags'] = 'brand new tag'
+    
+    result = shopify.import_products_from_shopify(db, current_store=store)
+    assert result['imported'] == 0
+    
+    product = Product.query.filter_by(shopify_id=str(changed['id'])).one()
+    assert product.title == 'Renamed in Shopify'
+    assert [tag.name for tag in product.tags] == ['brand new tag']
+    assert Product.query.count() == 20
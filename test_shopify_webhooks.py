@@ -0,0 +1,39 @@
+from models import Product, WebhookEvent
+from shopify_webhooks import WebhookProcessor, enqueue_webhook
+
+def product_payload(shopify_id, title, **fields):
+    payload = {'id': shopify_id, 'title': title, 'body_html': '', 'tags': 'webhook tag', 'variants': [{'price': '9.99'}]}
+    payload.update(fields)
+    return payload
+
+def test_bad_event_does_not_block_its_batch(app, store):
+    for i in range(5):
+        enqueue_webhook(store, 'products/update', product_payload(100 + i, f'Product {i}'))
+    # A product's price is required, so this event can never be applied
+    bad = enqueue_webhook(store, 'products/update', product_payload(200, 'Bad', variants=[{'price': None}]))
+    
+    processor = WebhookProcessor(app)
+    assert processor.process_batch() == 6
+    
+    assert sorted(product.shopify_id for product in Product.query) == ['100', '101', '102', '103', '104']
+    assert bad.processed_at is None
+    assert bad.attempts == 1
+    assert bad.error
+    assert WebhookEvent.query.filter(WebhookEvent.processed_at.isnot(None)).count() == 5
+
+def test_failing_event_stops_being_retried(app, store, monkeypatch):
+    monkeypatch.setattr('config.Config.WEBHOOK_MAX_ATTEMPTS', 3)
+    enqueue_webhook(store, 'products/update', product_payload(200, 'Bad', variants=[{'price': None}]))
+    
+    processor = WebhookProcessor(app)
+    for _ in range(3):
+        assert processor.process_batch() == 1
+    assert processor.process_batch() == 0
+
+def test_newest_change_wins_when_events_arrive_out_of_order(app, store):
+    enqueue_webhook(store, 'products/update', product_payload(300, 'Newest', updated_at='2024-01-02T10:00:00Z'))
+    enqueue_webhook(store, 'products/update', product_payload(300, 'Older', updated_at='2024-01-01T10:00:00Z'))
+    
+    WebhookProcessor(app).process_batch()
+    
+    assert [product.title for product in Product.query] == ['Newest']
@@ -0,0 +1,61 @@
+from models import db, Product, Tag, Collection, SyncOutbox
+from sync_outbox import drain_outbox, pending_entries
+from collection_export import export_collection
+
+def pending_keys(store):
+    return sorted((entry.entity_type, entry.entity_id) for entry in pending_entries(store))
+
+def test_imports_are_not_recorded(shopify, store):
+    shopify.import_products_from_shopify(db, current_store=store)
+    assert pending_keys(store) == []
+
+def test_tag_rename_records_every_product_carrying_it(shopify, store):
+    shopify.import_products_from_shopify(db, current_store=store)
+    tag = Tag.query.filter_by(name='shared mock tag').one()
+    product_ids = sorted(product.id for product in tag.products)
+    
+    tag.name = 'renamed shared tag'
+    db.session.commit()
+    
+    assert pending_keys(store) == [('product', product_id) for product_id in product_ids]
+
+def test_tag_delete_records_its_products(shopify, store):
+    shopify.import_products_from_shopify(db, current_store=store)
+    tag = Tag.query.filter_by(name='mock tag 3').one()
+    product_ids = sorted(product.id for product in tag.products)
+    assert product_ids
+    
+    db.session.delete(tag)
+    db.session.commit()
+    
+    assert pending_keys(store) == [('product', product_id) for product_id in product_ids]
+
+def test_drain_pushes_each_product_once(shopify, shopify_server, store):
+    server, _ = shopify_server
+    shopify.import_products_from_shopify(db, current_store=store)
+    product = Product.query.filter_by(store_id=store.id).order_by(Product.id).first()
+    
+    # Several edits to one product are coalesced into a single push
+    for title in ('First edit', 'Second edit', 'Final title'):
+        product.title = title
+        db.session.commit()
+    assert SyncOutbox.query.count() == 3
+    
+    result = drain_outbox(shopify, store)
+    assert result['pushed'] == 1
+    assert result['failed'] == 0
+    assert pending_keys(store) == []
+    assert server.state['products_by_id'][int(product.shopify_id)]['title'] == 'Final title'
+
+def test_exported_collection_is_not_pushed_again(shopify, store):
+    collection = Collection(name='Outbox Collection', store_id=store.id)
+    db.session.add(collection)
+    db.session.commit()
+    assert pending_keys(store) == [('collection', collection.id)]
+    
+    error, note = export_collection(shopify, collection)
+    db.session.commit()
+    
+    assert error is None
+    assert collection.shopify_id
+    assert pending_keys(store) == []